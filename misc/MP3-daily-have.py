@@ -5,6 +5,7 @@ fd -td -d3 -x basename | rg MP3-daily | sort > ~/MP3-daily-have.txt
 """
 
 import json
+import shlex
 import subprocess
 
 from pathlib import Path
@@ -31,8 +32,10 @@ def main():
 
         parsed_json = json.loads(output)
         tid = parsed_json[0]["id"]
+        data_path = Path(parsed_json[0]["location"]) / parsed_json[0]["name"]
 
-        cmd = f"transmission-remote -t {tid} --remove-and-delete"
+        # Deleting the data is left to `tsmu trashd`, rather than transmission-daemon
+        cmd = f"transmission-remote -t {tid} --remove && ~xjjk/tsmu.py trash {shlex.quote(str(data_path))}"
         print(f"Already have {line}")
         print(cmd)
         subprocess.run(cmd, shell=True)
@@ -128,6 +128,8 @@ except ImportError:
 import transmissionrpc
 import shutil
 
+from tsmu.util import MoveTorrentsData
+
 
 def ConnectToTransmission() -> transmissionrpc.Client:
     """Connect to transmission using current user's settings."""
@@ -242,6 +244,7 @@ def main(root_path: Path = Path(".")):
         locationsByTorrentName[name] = locations
 
     count, err_count = 0, 0
+    moves = []
     for name, locations in locationsByTorrentName.items():
         if len(locations) == 1:
             l = locations[0]
@@ -296,9 +299,10 @@ def main(root_path: Path = Path(".")):
                 ti = torrentsByName[(name, l)]
                 hash = ti['hash']
                 logger.info(f"Moving {name=} {hash=} from {l}")
-                tc.move_torrent_data(hash, str(MOVE_PATH))
+                moves.append((hash, MOVE_PATH))
                 shutil.move(xxh, str(MOVE_PATH))
                 count += count
+    MoveTorrentsData(moves, tc=tc, statusCb=logger.info)
     logger.info(f"{count=} {err_count=}")
 
     return
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+asyncio client for transmission-daemon's RPC protocol, for bulk operations.
+
+transmissionrpc.Client makes one blocking request at a time. Re-adding
+thousands of torrents is then thousands of sequential round-trips, each
+waiting on the daemon. AsyncTransmissionClient keeps a small pool of
+keep-alive HTTP connections and allows up to `concurrency` requests in
+flight, so independent calls (e.g. re-adding different torrents) overlap.
+
+Only the standard library is used; the HTTP/1.1 needed for the RPC protocol
+is a POST with a JSON body.
+
+    async with ConnectToTransmissionAsync(concurrency=8) as client:
+        torrents = await client.TorrentGet(["id", "hashString", "error"])
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable
+
+from tsmu.rpctrace import Tracer
+from tsmu.util import LoadTransmissionSettings, TransmissionId
+
+RpcIds = TransmissionId | int | Iterable[TransmissionId | int] | None
+
+
+class TransmissionRpcError(Exception):
+    """transmission-daemon didn't respond with success."""
+
+
+def _Ids(ids: RpcIds) -> list[int | str] | None:
+    """Normalize ids: numeric ids as ints, infohashes as strings.
+
+    >>> _Ids("12")
+    [12]
+    >>> _Ids(["12", "0123456789abcdef0123456789abcdef01234567", 3])
+    [12, '0123456789abcdef0123456789abcdef01234567', 3]
+    """
+    if ids is None:
+        return None
+    if isinstance(ids, (str, int)):
+        ids = [ids]
+    return [int(i) if isinstance(i, int) or i.isdigit() else i for i in ids]
+
+
+class AsyncTransmissionClient:
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 9091,
+        path: str = "/transmission/rpc",
+        concurrency: int = 8,
+        timeout: float = 90,
+    ):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.timeout = timeout
+        self.session_id = ""
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.idle_connections: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.tag = 0
+        self.tracer = Tracer()
+
+    async def __aenter__(self) -> AsyncTransmissionClient:
+        return self
+
+    async def __aexit__(self, *excinfo) -> None:
+        await self.Close()
+
+    async def Close(self) -> None:
+        while self.idle_connections:
+            _, writer = self.idle_connections.pop()
+            writer.close()
+
+    async def _Post(self, body: bytes) -> tuple[int, dict[str, str], bytes]:
+        """POST body on a pooled connection, returns (status, headers, response body)."""
+        if self.idle_connections:
+            reader, writer = self.idle_connections.pop()
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+
+        try:
+            request = (
+                f"POST {self.path} HTTP/1.1\r\n"
+                f"Host: {self.host}:{self.port}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"X-Transmission-Session-Id: {self.session_id}\r\n"
+                "\r\n"
+            )
+            writer.write(request.encode("ascii") + body)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError("transmission-daemon closed the connection")
+            status = int(status_line.split()[1])
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                chunks = []
+                while (size := int((await reader.readline()).split(b";")[0], 16)) > 0:
+                    chunks.append(await reader.readexactly(size))
+                    await reader.readline()
+                await reader.readline()
+                response_body = b"".join(chunks)
+            else:
+                response_body = await reader.readexactly(int(headers.get("content-length", 0)))
+        except BaseException:
+            writer.close()
+            raise
+
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self.idle_connections.append((reader, writer))
+        return status, headers, response_body
+
+    async def Call(self, method: str, arguments: dict[str, Any] | None = None) -> dict[str, Any]:
+        """Make an RPC call, returning the response's arguments."""
+        self.tag += 1
+        body = json.dumps({"method": method, "arguments": arguments or {}, "tag": self.tag}).encode(
+            "utf-8"
+        )
+
+        async with self.semaphore:
+            started_at = time.monotonic()
+            # First attempt may be rejected w/ a 409 giving us the session id; or a pooled
+            # connection may have been closed by the daemon
+            for attempt in range(3):
+                try:
+                    status, headers, response_body = await asyncio.wait_for(
+                        self._Post(body), self.timeout
+                    )
+                except (ConnectionResetError, asyncio.IncompleteReadError):
+                    if attempt == 2:
+                        raise
+                    continue
+                if status == 409:
+                    self.session_id = headers.get("x-transmission-session-id", "")
+                    continue
+                break
+
+        if self.tracer:
+            self.tracer.Record(body, len(response_body), time.monotonic() - started_at)
+        if status != 200:
+            raise TransmissionRpcError(f"{method} failed with HTTP {status}")
+        response = json.loads(response_body)
+        if response.get("result") != "success":
+            raise TransmissionRpcError(f"{method} failed: {response.get('result')}")
+        return response.get("arguments", {})
+
+    async def TorrentGet(self, fields: list[str], ids: RpcIds = None) -> list[dict[str, Any]]:
+        arguments: dict[str, Any] = {"fields": fields}
+        if ids is not None:
+            arguments["ids"] = _Ids(ids)
+        return (await self.Call("torrent-get", arguments))["torrents"]
+
+    async def TorrentAdd(
+        self, filename: str | Path, download_dir: str | Path | None = None, paused: bool = False
+    ) -> dict[str, Any]:
+        """Add a torrent from a .torrent file (readable by transmission-daemon) or magnet link."""
+        arguments: dict[str, Any] = {"filename": str(filename), "paused": paused}
+        if download_dir is not None:
+            arguments["download-dir"] = str(download_dir)
+        result = await self.Call("torrent-add", arguments)
+        return result.get("torrent-added") or result.get("torrent-duplicate") or {}
+
+    async def TorrentRemove(self, ids: RpcIds, delete_local_data: bool = False) -> None:
+        await self.Call(
+            "torrent-remove", {"ids": _Ids(ids), "delete-local-data": delete_local_data}
+        )
+
+    async def TorrentSetLocation(self, ids: RpcIds, location: str | Path, move: bool) -> None:
+        await self.Call(
+            "torrent-set-location", {"ids": _Ids(ids), "location": str(location), "move": move}
+        )
+
+    async def TorrentVerify(self, ids: RpcIds) -> None:
+        await self.Call("torrent-verify", {"ids": _Ids(ids)})
+
+    async def TorrentStart(self, ids: RpcIds) -> None:
+        await self.Call("torrent-start", {"ids": _Ids(ids)})
+
+    async def TorrentStop(self, ids: RpcIds) -> None:
+        await self.Call("torrent-stop", {"ids": _Ids(ids)})
+
+
+def ConnectToTransmissionAsync(concurrency: int = 8) -> AsyncTransmissionClient:
+    """Async client for transmission using current user's settings."""
+    settings = LoadTransmissionSettings()
+    return AsyncTransmissionClient(
+        "localhost",
+        settings["rpc-port"],
+        path=settings.get("rpc-url", "/transmission/") + "rpc",
+        concurrency=concurrency,
+    )
+
+
+async def ReAddTorrents(
+    client: AsyncTransmissionClient,
+    readds: Iterable[tuple[TransmissionId, Path, Path]],
+    admit: Callable[[], Awaitable[None]] | None = None,
+    statusCb=lambda x: x,
+) -> list[BaseException | None]:
+    """Remove and re-add torrents, given as (hash, .torrent file, download dir).
+
+    Each torrent is removed before it's re-added, but different torrents are
+    re-added concurrently, up to the client's concurrency. At most that many
+    are ever removed but not yet re-added, e.g. if we're interrupted. If given,
+    admit is awaited before each re-add, to hold off while the system is busy.
+
+    Returns, in order, None or the exception re-adding each torrent failed with.
+    """
+    # Around the remove and add both, as the client's own only limits each call
+    semaphore = asyncio.Semaphore(client.concurrency)
+
+    async def ReAdd(torrent_hash: TransmissionId, torrent_file: Path, download_dir: Path):
+        async with semaphore:
+            if admit:
+                await admit()
+            await client.TorrentRemove(torrent_hash)
+            await client.TorrentAdd(torrent_file, download_dir=download_dir)
+        statusCb(f'Readded hash={torrent_hash} downloadDir="{str(download_dir)}"')
+
+    return await asyncio.gather(*(ReAdd(*r) for r in readds), return_exceptions=True)
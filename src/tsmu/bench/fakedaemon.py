@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+A stand-in for transmission-daemon's RPC server, for benchmarks and tests.
+
+Implements the part of the RPC protocol tsmu uses: the session-id handshake,
+session-get, torrent-get (fields and ids), torrent-verify, torrent-start,
+torrent-stop, torrent-set-location, torrent-add and torrent-remove. Only
+torrent-set-location with move touches data, if there is any; there is none
+for synthetic torrents. Verification is simulated: torrents are checked
+one at a time, at verify_rate bytes/s, and a corrupt_fraction of them come
+out of it incomplete.
+
+    python -m tsmu.bench.fakedaemon --torrents 20000 --config-home /tmp/fake-config
+
+serves 20000 synthetic torrents, and writes a transmission-daemon/settings.json
+under --config-home, so with XDG_CONFIG_HOME=/tmp/fake-config `tsmu`, the
+workers and tsmu-dupes all talk to it. From Python:
+
+    daemon = FakeTransmissionDaemon(SyntheticTorrents(1000))
+    daemon.Start()
+    daemon.WriteSettings(Path("/tmp/fake-config"))
+    …
+    daemon.Stop()
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import http.server
+import json
+import random
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Final, Iterable
+
+import click
+
+SESSION_ID_HEADER: Final[str] = "X-Transmission-Session-Id"
+
+# tr_torrent_activity, RPC version >= 14
+STATUS_STOPPED: Final[int] = 0
+STATUS_CHECK_WAIT: Final[int] = 1
+STATUS_CHECK: Final[int] = 2
+STATUS_SEED: Final[int] = 6
+
+
+@dataclass
+class FakeTorrent:
+    id: int
+    hashString: str
+    name: str
+    downloadDir: str
+    totalSize: int
+    status: int = STATUS_SEED
+    percentDone: float = 1.0
+    recheckProgress: float = 0.0
+    torrentFile: str = ""
+    addedDate: int = 0
+    errorString: str = ""
+    # What it goes back to after a verify
+    status_before_verify: int = STATUS_SEED
+
+    @property
+    def magnetLink(self) -> str:
+        return f"magnet:?xt=urn:btih:{self.hashString}&dn={self.name}"
+
+    def Fields(self, fields: Iterable[str]) -> dict[str, Any]:
+        values = dataclasses.asdict(self)
+        values.update(
+            magnetLink=self.magnetLink,
+            error=0,
+            isFinished=False,
+            sizeWhenDone=self.totalSize,
+            leftUntilDone=int(self.totalSize * (1.0 - self.percentDone)),
+            haveValid=int(self.totalSize * self.percentDone),
+            haveUnchecked=0,
+            files=[
+                {
+                    "name": self.name,
+                    "length": self.totalSize,
+                    "bytesCompleted": int(self.totalSize * self.percentDone),
+                }
+            ],
+            priorities=[0],
+            wanted=[1],
+        )
+        # Anything we don't simulate is zero, which is what transmission reports for most
+        return {f: values.get(f, 0) for f in fields}
+
+
+def _Bencode(value: Any) -> bytes:
+    """
+    >>> _Bencode({"name": "a", "length": 3, "pieces": b"x"})
+    b'd6:lengthi3e4:name1:a6:pieces1:xe'
+    """
+    if isinstance(value, int):
+        return b"i%de" % value
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    if isinstance(value, bytes):
+        return b"%d:%s" % (len(value), value)
+    if isinstance(value, list):
+        return b"l" + b"".join(_Bencode(v) for v in value) + b"e"
+    items = sorted((k.encode("utf-8"), v) for k, v in value.items())
+    return b"d" + b"".join(_Bencode(k) + _Bencode(v) for k, v in items) + b"e"
+
+
+def _Bdecode(data: bytes, offset: int = 0) -> tuple[Any, int]:
+    """Decode the value at offset, returning it and the offset after it."""
+    c = data[offset : offset + 1]
+    if c == b"i":
+        end = data.index(b"e", offset)
+        return int(data[offset + 1 : end]), end + 1
+    if c == b"l":
+        values, offset = [], offset + 1
+        while data[offset : offset + 1] != b"e":
+            value, offset = _Bdecode(data, offset)
+            values.append(value)
+        return values, offset + 1
+    if c == b"d":
+        values, offset = {}, offset + 1
+        while data[offset : offset + 1] != b"e":
+            key, offset = _Bdecode(data, offset)
+            value_start = offset
+            value, offset = _Bdecode(data, offset)
+            values[key] = value
+            # The raw info dict, for the infohash
+            if key == b"info":
+                values[b"_info_raw"] = data[value_start:offset]
+        return values, offset + 1
+    colon = data.index(b":", offset)
+    length = int(data[offset:colon])
+    return data[colon + 1 : colon + 1 + length], colon + 1 + length
+
+
+def SyntheticTorrentFile(name: str, size: int) -> bytes:
+    """A .torrent for a single file, with made-up piece hashes."""
+    piece_length = 16 * 1024 * 1024
+    pieces = hashlib.sha1(name.encode("utf-8")).digest() * (-(-size // piece_length))
+    info = {"name": name, "length": size, "piece length": piece_length, "pieces": pieces}
+    return _Bencode({"announce": "http://tracker.invalid/announce", "info": info})
+
+
+def SyntheticTorrents(
+    count: int,
+    download_dir: str = "/archive/torrents/02-baked",
+    torrent_dir: Path | None = None,
+    seed: int = 0,
+) -> list[FakeTorrent]:
+    """count torrents of 100MB-10GB, with .torrent files in torrent_dir if given."""
+    rng = random.Random(seed)
+    torrents = []
+    for i in range(1, count + 1):
+        name = f"Synthetic.Torrent.{i:06}-TSMU"
+        size = rng.randint(100 * 1000**2, 10 * 1000**3)
+        metainfo = SyntheticTorrentFile(name, size)
+        infohash = hashlib.sha1(_Bdecode(metainfo)[0][b"_info_raw"]).hexdigest()
+        torrent_file = ""
+        if torrent_dir:
+            torrent_path = torrent_dir / f"{infohash}.torrent"
+            torrent_path.write_bytes(metainfo)
+            torrent_file = str(torrent_path)
+        torrents.append(
+            FakeTorrent(i, infohash, name, download_dir, size, torrentFile=torrent_file)
+        )
+    return torrents
+
+
+class RPCError(Exception):
+    """Reported to the client as the response's result."""
+
+
+@dataclass
+class FakeTransmissionState:
+    torrents: dict[int, FakeTorrent] = field(default_factory=dict)
+    verify_rate: float = 200 * 1000**2  # bytes/s
+    corrupt_fraction: float = 0.0
+    latency: float = 0.0  # added to every call, like a busy daemon
+    next_id: int = 1
+    verify_queue: list[int] = field(default_factory=list)
+    advanced_at: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    rng: random.Random = field(default_factory=lambda: random.Random(0))
+    calls: dict[str, int] = field(default_factory=dict)
+
+    def _Advance(self) -> None:
+        """Progress the verify queue to now."""
+        now = time.monotonic()
+        budget = (now - self.advanced_at) * self.verify_rate
+        self.advanced_at = now
+        while self.verify_queue and budget > 0:
+            t = self.torrents.get(self.verify_queue[0])
+            if t is None:
+                self.verify_queue.pop(0)
+                continue
+            t.status = STATUS_CHECK
+            remaining = (1.0 - t.recheckProgress) * t.totalSize
+            if budget < remaining:
+                t.recheckProgress += budget / t.totalSize
+                return
+            budget -= remaining
+            self.verify_queue.pop(0)
+            t.recheckProgress = 0.0
+            if self.rng.random() < self.corrupt_fraction:
+                t.percentDone = 0.99
+                t.status = STATUS_STOPPED
+            else:
+                t.status = t.status_before_verify
+            if self.verify_queue:
+                self.torrents[self.verify_queue[0]].status = STATUS_CHECK
+
+    def _Select(self, ids: Any) -> list[FakeTorrent]:
+        if ids is None:
+            return list(self.torrents.values())
+        if not isinstance(ids, list):
+            ids = [ids]
+        by_hash = {t.hashString: t for t in self.torrents.values()}
+        selected = []
+        for i in ids:
+            t = self.torrents.get(i) if isinstance(i, int) else by_hash.get(str(i).lower())
+            if t is not None:
+                selected.append(t)
+        return selected
+
+    def _AddTorrent(self, arguments: dict[str, Any]) -> dict[str, Any]:
+        if "filename" in arguments:
+            metainfo = Path(arguments["filename"]).read_bytes()
+        elif "metainfo" in arguments:
+            import base64
+
+            metainfo = base64.b64decode(arguments["metainfo"])
+        else:
+            raise RPCError("no filename or metainfo specified")
+        try:
+            decoded = _Bdecode(metainfo)[0]
+            info = decoded[b"info"]
+            infohash = hashlib.sha1(decoded[b"_info_raw"]).hexdigest()
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise RPCError("invalid or corrupt torrent file")
+        for t in self.torrents.values():
+            if t.hashString == infohash:
+                return {"torrent-duplicate": {"id": t.id, "name": t.name, "hashString": infohash}}
+        size = info.get(b"length") or sum(f[b"length"] for f in info.get(b"files", []))
+        t = FakeTorrent(
+            self.next_id,
+            infohash,
+            info[b"name"].decode("utf-8"),
+            arguments.get("download-dir", "/archive/torrents/01-hot"),
+            size,
+            status=STATUS_STOPPED if arguments.get("paused") else STATUS_SEED,
+            torrentFile=arguments.get("filename", ""),
+            addedDate=int(time.time()),
+        )
+        self.torrents[t.id] = t
+        self.next_id += 1
+        return {"torrent-added": {"id": t.id, "name": t.name, "hashString": infohash}}
+
+    def Call(self, method: str, arguments: dict[str, Any]) -> dict[str, Any]:
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self._Advance()
+            ids = arguments.get("ids")
+            if method == "session-get":
+                return {
+                    "version": "3.00 (fake)",
+                    "rpc-version": 16,
+                    "rpc-version-minimum": 1,
+                    "download-dir": "/archive/torrents/01-hot",
+                }
+            if method == "torrent-get":
+                fields = arguments.get("fields", ["id"])
+                return {"torrents": [t.Fields(fields) for t in self._Select(ids)]}
+            if method == "torrent-verify":
+                for t in self._Select(ids):
+                    if t.id not in self.verify_queue:
+                        if t.status not in (STATUS_CHECK_WAIT, STATUS_CHECK):
+                            t.status_before_verify = t.status
+                        t.status = STATUS_CHECK_WAIT
+                        self.verify_queue.append(t.id)
+                return {}
+            if method in ("torrent-start", "torrent-start-now"):
+                for t in self._Select(ids):
+                    if t.status == STATUS_STOPPED:
+                        t.status = STATUS_SEED
+                return {}
+            if method == "torrent-stop":
+                for t in self._Select(ids):
+                    if t.id in self.verify_queue:
+                        self.verify_queue.remove(t.id)
+                        t.recheckProgress = 0.0
+                    t.status = STATUS_STOPPED
+                return {}
+            if method == "torrent-set-location":
+                for t in self._Select(ids):
+                    source = Path(t.downloadDir) / t.name
+                    # Only for data a benchmark made; synthetic torrents have none
+                    if arguments.get("move") and source.exists():
+                        Path(arguments["location"]).mkdir(parents=True, exist_ok=True)
+                        shutil.move(source, Path(arguments["location"]) / t.name)
+                    t.downloadDir = arguments["location"]
+                return {}
+            if method == "torrent-add":
+                return self._AddTorrent(arguments)
+            if method == "torrent-remove":
+                for t in self._Select(ids):
+                    del self.torrents[t.id]
+                return {}
+            raise RPCError("method name not recognized")
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    # Keep-alive, as transmission-daemon
+    protocol_version = "HTTP/1.1"
+    server: _Server
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _Respond(self, code: int, body: bytes, headers: dict[str, str] = {}) -> None:
+        self.send_response(code)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        session_id = self.server.session_id
+        if self.headers.get(SESSION_ID_HEADER) != session_id:
+            self._Respond(409, b"<h1>409: Conflict</h1>", {SESSION_ID_HEADER: session_id})
+            return
+
+        request = json.loads(body)
+        state = self.server.state
+        if state.latency:
+            time.sleep(state.latency)
+        try:
+            arguments = state.Call(request.get("method", ""), request.get("arguments", {}))
+            response = {"result": "success", "arguments": arguments}
+        except RPCError as e:
+            response = {"result": str(e), "arguments": {}}
+        if "tag" in request:
+            response["tag"] = request["tag"]
+        self._Respond(
+            200,
+            json.dumps(response).encode("utf-8"),
+            {"Content-Type": "application/json; charset=UTF-8", SESSION_ID_HEADER: session_id},
+        )
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    state: FakeTransmissionState
+    session_id: str
+
+
+class FakeTransmissionDaemon:
+    def __init__(
+        self,
+        torrents: Iterable[FakeTorrent] = (),
+        port: int = 0,
+        verify_rate: float = 200 * 1000**2,
+        corrupt_fraction: float = 0.0,
+        latency: float = 0.0,
+    ):
+        """port 0 picks a free port; see .port once started."""
+        self.state = FakeTransmissionState(
+            verify_rate=verify_rate, corrupt_fraction=corrupt_fraction, latency=latency
+        )
+        for t in torrents:
+            self.state.torrents[t.id] = t
+        self.state.next_id = max(self.state.torrents, default=0) + 1
+        self.server = _Server(("localhost", port), _RequestHandler)
+        self.server.state = self.state
+        self.server.session_id = hashlib.sha1(str(time.time()).encode()).hexdigest()[:48]
+        self._thread: threading.Thread | None = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def WriteSettings(self, config_home: Path) -> Path:
+        """settings.json pointing at us, to use with XDG_CONFIG_HOME=config_home."""
+        settings_path = config_home / "transmission-daemon" / "settings.json"
+        settings_path.parent.mkdir(parents=True, exist_ok=True)
+        settings_path.write_text(json.dumps({"rpc-port": self.port, "rpc-url": "/transmission/"}))
+        return settings_path
+
+    def Start(self) -> None:
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def Stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@click.command()
+@click.option("--torrents", "torrent_count", default=1000, show_default=True)
+@click.option("--port", default=9091, show_default=True, help="0 for any free port")
+@click.option(
+    "--config-home",
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Write transmission-daemon/settings.json here, for XDG_CONFIG_HOME",
+)
+@click.option(
+    "--torrent-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Write the synthetic torrents' .torrent files here",
+)
+@click.option("--download-dir", default="/archive/torrents/02-baked", show_default=True)
+@click.option("--verify-rate", default=200.0, show_default=True, help="Simulated MB/s")
+@click.option("--corrupt-fraction", default=0.0, show_default=True)
+@click.option("--latency", default=0.0, show_default=True, help="Seconds added to every call")
+def cli(
+    torrent_count: int = 1000,
+    port: int = 9091,
+    config_home: Path | None = None,
+    torrent_dir: Path | None = None,
+    download_dir: str = "/archive/torrents/02-baked",
+    verify_rate: float = 200.0,
+    corrupt_fraction: float = 0.0,
+    latency: float = 0.0,
+) -> None:
+    """Serve synthetic torrents over transmission's RPC protocol, until killed."""
+    if torrent_dir:
+        torrent_dir.mkdir(parents=True, exist_ok=True)
+    daemon = FakeTransmissionDaemon(
+        SyntheticTorrents(torrent_count, download_dir, torrent_dir),
+        port=port,
+        verify_rate=verify_rate * 1000**2,
+        corrupt_fraction=corrupt_fraction,
+        latency=latency,
+    )
+    if config_home:
+        click.echo(f"Wrote {daemon.WriteSettings(config_home)}")
+    click.echo(f"Serving {torrent_count} torrents on localhost:{daemon.port}")
+    try:
+        daemon.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server.server_close()
+        click.echo(json.dumps(daemon.state.calls))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Hashing throughput benchmark, to choose how ComputeXxh should hash.
+
+Hashes generated file sets with each engine:
+
+    xxhsum-H0/H1/H2          the xxhsum CLI (XXH32/XXH64/XXH128), batched like HashFiles
+    xxh64/xxh3_64/xxh3_128   in-process, with the xxhash package, at each --buffer-size
+
+at each --threads (parallel xxhsum processes, or hashing threads), and
+reports GB/s, CPU seconds, and read syscalls per file from /proc/<pid>/io.
+
+File sets, under --directory and reused between runs if unchanged:
+
+    sparse   one 50 GB sparse file: hashing speed without the disk
+    small    10k 5 MB files: per-file overhead
+    mixed    a bit of both, like a torrent with a sample and some .nfos
+
+    python -m tsmu.bench.hashing --directory /archive/bench --scale 0.01
+    python -m tsmu.bench.hashing --directory /archive/bench --json hashing-0.4.json
+    python -m tsmu.bench.hashing --directory /archive/bench --compare hashing-0.4.json
+
+Files just written are in the page cache; pass --drop-caches, as root, to
+measure the disk too. Syscalls of xxhsum are sampled while it runs, so are a
+slight undercount.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Final
+
+import click
+import more_itertools
+
+from tsmu.util import XXHSUM_ALGORITHM_FLAGS, XXHSUM_MAX_FILES_PER_CALL
+
+# name -> [(count, size)], at --scale 1
+FILE_SETS: Final[dict[str, list[tuple[int, int]]]] = {
+    "sparse": [(1, 50 * 1000**3)],
+    "small": [(10_000, 5 * 1000**2)],
+    "mixed": [(2, 4 * 1000**3), (20, 50 * 1000**2), (500, 20 * 1000)],
+}
+
+XXHSUM_ENGINES: Final[dict[str, str]] = {
+    f"xxhsum{flag}": flag for flag in XXHSUM_ALGORITHM_FLAGS.values()
+}
+INPROCESS_ENGINES: Final[list[str]] = ["xxh64", "xxh3_64", "xxh3_128"]
+
+
+@dataclass
+class Result:
+    engine: str
+    file_set: str
+    buffer_size: int | None  # None for xxhsum, which has its own
+    threads: int
+    files: int
+    bytes: int
+    seconds: float
+    cpu_seconds: float
+    read_syscalls: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.engine}/{self.file_set}/{self.buffer_size}/{self.threads}"
+
+    @property
+    def gb_per_s(self) -> float:
+        return self.bytes / 1000**3 / self.seconds
+
+
+def GenerateFileSet(directory: Path, name: str, scale: float, seed: int = 0) -> list[Path]:
+    """Files of a set, generated unless an earlier run left the same ones."""
+    set_dir = directory / name
+    shapes = [
+        (max(1, int(count * scale)), max(1, int(size * scale))) for count, size in FILE_SETS[name]
+    ]
+    manifest_path = set_dir / "manifest.json"
+    manifest = {"shapes": shapes, "seed": seed}
+    paths = [
+        set_dir / f"{s}" / f"{i:06}.bin"
+        for s, (count, _) in enumerate(shapes)
+        for i in range(count)
+    ]
+    if manifest_path.exists() and json.loads(manifest_path.read_text()) == manifest:
+        return paths
+
+    shutil.rmtree(set_dir, ignore_errors=True)
+    rng = random.Random(seed)
+    block = rng.randbytes(1024 * 1024)
+    for s, (count, size) in enumerate(shapes):
+        (set_dir / f"{s}").mkdir(parents=True)
+        for i in range(count):
+            path = set_dir / f"{s}" / f"{i:06}.bin"
+            with path.open("wb") as fp:
+                if name == "sparse":
+                    fp.truncate(size)
+                    continue
+                fp.write(rng.randbytes(16))
+                remaining = size - fp.tell()
+                while remaining > 0:
+                    remaining -= fp.write(block[:remaining])
+    manifest_path.write_text(json.dumps(manifest))
+    return paths
+
+
+def DropCaches() -> None:
+    os.sync()
+    Path("/proc/sys/vm/drop_caches").write_text("3\n")
+
+
+def _ReadSyscalls(pid: int | str = "self") -> int:
+    """
+    >>> _ReadSyscalls() > 0
+    True
+    """
+    for line in Path(f"/proc/{pid}/io").read_text().splitlines():
+        if line.startswith("syscr:"):
+            return int(line.split()[1])
+    return 0
+
+
+def _CpuSeconds(who: int) -> float:
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _RunXxhsum(flag: str, batch: list[str]) -> int:
+    """Hash a batch with xxhsum, returning its read syscalls, sampled until it exits."""
+    process = subprocess.Popen(["xxhsum", flag] + batch, stdout=subprocess.DEVNULL)
+    syscalls = 0
+    while process.poll() is None:
+        try:
+            syscalls = _ReadSyscalls(process.pid)
+        except OSError:
+            break
+        time.sleep(0.01)
+    return syscalls
+
+
+def _HashInProcess(new_hasher: Callable, buffer_size: int, path: Path) -> str:
+    hasher = new_hasher()
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with path.open("rb", buffering=0) as fp:
+        while n := fp.readinto(buffer):
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+def Measure(
+    engine: str, file_set: str, paths: list[Path], buffer_size: int | None, threads: int
+) -> Result:
+    total_bytes = sum(p.stat().st_size for p in paths)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        syscalls_before = _ReadSyscalls()
+        cpu_before = _CpuSeconds(resource.RUSAGE_SELF) + _CpuSeconds(resource.RUSAGE_CHILDREN)
+        started_at = time.monotonic()
+        if engine in XXHSUM_ENGINES:
+            # Smaller batches than HashFiles, so there's one for every thread
+            batch_size = max(1, min(XXHSUM_MAX_FILES_PER_CALL, -(-len(paths) // threads)))
+            batches = [[str(p) for p in b] for b in more_itertools.chunked(paths, batch_size)]
+            flag = XXHSUM_ENGINES[engine]
+            syscalls = sum(executor.map(lambda b: _RunXxhsum(flag, b), batches))
+        else:
+            import xxhash
+
+            new_hasher = getattr(xxhash, engine)
+            list(executor.map(lambda p: _HashInProcess(new_hasher, buffer_size, p), paths))
+            syscalls = _ReadSyscalls() - syscalls_before
+        seconds = time.monotonic() - started_at
+        cpu_after = _CpuSeconds(resource.RUSAGE_SELF) + _CpuSeconds(resource.RUSAGE_CHILDREN)
+    return Result(
+        engine,
+        file_set,
+        buffer_size,
+        threads,
+        len(paths),
+        total_bytes,
+        seconds,
+        cpu_after - cpu_before,
+        syscalls,
+    )
+
+
+def Environment() -> dict[str, Any]:
+    """What the results depend on, besides tsmu."""
+    environment: dict[str, Any] = {
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "kernel": platform.release(),
+        "cpus": os.cpu_count(),
+    }
+    if shutil.which("xxhsum"):
+        cp = subprocess.run(["xxhsum", "--version"], capture_output=True, universal_newlines=True)
+        environment["xxhsum"] = (cp.stdout or cp.stderr).strip()
+    try:
+        import xxhash
+
+        environment["xxhash"] = xxhash.VERSION
+    except ImportError:
+        pass
+    return environment
+
+
+def _ParseList(value: str) -> list[int]:
+    """
+    >>> _ParseList("1,4, 8")
+    [1, 4, 8]
+    """
+    return [int(v) for v in value.split(",")]
+
+
+@click.command()
+@click.option(
+    "--directory",
+    required=True,
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Where to generate files; on the disk to measure",
+)
+@click.option(
+    "--file-set", "file_sets", multiple=True, type=click.Choice(list(FILE_SETS)), help="Default all"
+)
+@click.option("--engine", "engines", multiple=True, help="Default all available")
+@click.option("--buffer-size", "buffer_sizes", default="65536,1048576,8388608", show_default=True)
+@click.option("--threads", "thread_counts", default="1,4", show_default=True)
+@click.option("--scale", default=1.0, show_default=True, help="Scale file counts and sizes")
+@click.option("--drop-caches", is_flag=True, help="Before each run; needs root")
+@click.option("--json", "json_path", type=click.Path(path_type=Path), help="Write results here")
+@click.option("--compare", type=click.Path(exists=True, path_type=Path), help="Earlier --json")
+def cli(
+    directory: Path,
+    file_sets: tuple[str, ...] = (),
+    engines: tuple[str, ...] = (),
+    buffer_sizes: str = "65536,1048576,8388608",
+    thread_counts: str = "1,4",
+    scale: float = 1.0,
+    drop_caches: bool = False,
+    json_path: Path | None = None,
+    compare: Path | None = None,
+) -> None:
+    """Measure hashing throughput of every engine over generated file sets."""
+    available = []
+    if shutil.which("xxhsum"):
+        available += list(XXHSUM_ENGINES)
+    try:
+        import xxhash  # NOQA
+
+        available += INPROCESS_ENGINES
+    except ImportError:
+        pass
+    engines = engines if engines else tuple(available)
+    for engine in engines:
+        if engine not in available:
+            raise click.ClickException(f"{engine} isn't available; can use {', '.join(available)}")
+
+    baseline = {}
+    if compare:
+        baseline = {
+            Result(**r).key: Result(**r) for r in json.loads(compare.read_text())["results"]
+        }
+
+    results = []
+    for file_set in file_sets if file_sets else FILE_SETS:
+        paths = GenerateFileSet(directory, file_set, scale)
+        for engine in engines:
+            for buffer_size in [None] if engine in XXHSUM_ENGINES else _ParseList(buffer_sizes):
+                for threads in _ParseList(thread_counts):
+                    if drop_caches:
+                        DropCaches()
+                    r = Measure(engine, file_set, paths, buffer_size, threads)
+                    results.append(r)
+                    line = (
+                        f"{r.engine:12} {r.file_set:7} buffer={str(r.buffer_size):8}"
+                        f" threads={r.threads:<3} {r.gb_per_s:6.2f} GB/s"
+                        f" cpu={r.cpu_seconds:7.2f}s syscalls/file={r.read_syscalls / r.files:8.1f}"
+                    )
+                    if r.key in baseline:
+                        line += f" ({r.gb_per_s / baseline[r.key].gb_per_s:.2f}x before)"
+                    click.echo(line)
+
+    if json_path:
+        json_path.write_text(
+            json.dumps(
+                {"environment": Environment(), "results": [asdict(r) for r in results]}, indent=2
+            )
+        )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for tsmu's console entry points.
+
+Our scripts call e.g. `tsmu fn` in tight loops, so the cost of importing an
+entry point's module is paid over and over. This runs each entry point's
+module under `python -X importtime` a few times and reports the median
+cumulative import time, and the modules that contribute most to it.
+
+    python -m tsmu.bench.importtime
+    python -m tsmu.bench.importtime --json importtime.json
+    python -m tsmu.bench.importtime --baseline importtime.json
+
+With --baseline, exits non-zero if any entry point got slower than the
+baseline by more than --tolerance.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+import click
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+
+def EntryPointModules() -> dict[str, str]:
+    """console script name -> module, for all of tsmu's entry points."""
+    from importlib.metadata import entry_points
+
+    modules = {
+        ep.name: ep.value.split(":")[0]
+        for ep in entry_points(group="console_scripts")
+        if ep.value.startswith("tsmu.")
+    }
+    if modules:
+        return modules
+
+    # Not installed, e.g. running from a checkout
+    pyproject_path = Path(__file__).resolve().parents[3] / "pyproject.toml"
+    with pyproject_path.open("rb") as fp:
+        scripts = tomllib.load(fp)["tool"]["poetry"]["scripts"]
+    return {name: value.split(":")[0] for name, value in scripts.items()}
+
+
+def ParseImportTime(stderr: str) -> list[tuple[str, int, int]]:
+    """Parse -X importtime output into (module, self µs, cumulative µs).
+
+    >>> ParseImportTime('''import time: self [us] | cumulative | imported package
+    ... import time:       120 |        120 |   _io
+    ... import time:       300 |        420 | tsmu.util''')
+    [('_io', 120, 120), ('tsmu.util', 300, 420)]
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def MeasureModule(module: str, repeat: int = 5, top: int = 5) -> dict[str, Any]:
+    # Don't need a tsmu.toml or Redis to import tsmu.workers
+    env = dict(os.environ, TSMU_BROKER="stub")
+    cumulative_runs = []
+    self_times: dict[str, list[int]] = {}
+    # First run warms the page cache and .pyc files, don't count it
+    for i in range(repeat + 1):
+        cp = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            universal_newlines=True,
+            env=env,
+        )
+        if cp.returncode != 0:
+            raise click.ClickException(f"Unable to import {module}:\n{cp.stderr[-2000:]}")
+        if i == 0:
+            continue
+        rows = ParseImportTime(cp.stderr)
+        cumulative_runs.append(next(c for m, _, c in reversed(rows) if m == module))
+        for m, self_us, _ in rows:
+            self_times.setdefault(m, []).append(self_us)
+
+    slowest = sorted(
+        ((m, statistics.median(times)) for m, times in self_times.items()),
+        key=lambda mt: mt[1],
+        reverse=True,
+    )[:top]
+    return {
+        "module": module,
+        "cumulative_us": statistics.median(cumulative_runs),
+        "min_us": min(cumulative_runs),
+        "max_us": max(cumulative_runs),
+        "slowest": [{"module": m, "self_us": t} for m, t in slowest],
+    }
+
+
+@click.command()
+@click.option("--repeat", default=5, show_default=True)
+@click.option("--top", default=5, show_default=True, help="Slowest modules to show")
+@click.option("--json", "json_path", type=click.Path(path_type=Path), help="Write results here")
+@click.option("--baseline", type=click.Path(exists=True, path_type=Path))
+@click.option("--tolerance", default=0.2, show_default=True, help="Allowed slowdown vs baseline")
+def cli(
+    repeat: int = 5,
+    top: int = 5,
+    json_path: Path | None = None,
+    baseline: Path | None = None,
+    tolerance: float = 0.2,
+) -> None:
+    """Measure import time of every tsmu console entry point."""
+    results = {}
+    for name, module in sorted(EntryPointModules().items()):
+        results[name] = MeasureModule(module, repeat=repeat, top=top)
+        r = results[name]
+        slowest = ", ".join(f"{s['module']}={s['self_us'] / 1000:.1f}ms" for s in r["slowest"])
+        click.echo(f"{name:32} {r['cumulative_us'] / 1000:8.1f}ms  ({slowest})")
+
+    if json_path:
+        json_path.write_text(json.dumps(results, indent=2))
+
+    if baseline:
+        baseline_results = json.loads(baseline.read_text())
+        regressions = []
+        for name, r in results.items():
+            if name not in baseline_results:
+                continue
+            before, after = baseline_results[name]["cumulative_us"], r["cumulative_us"]
+            if after > before * (1 + tolerance):
+                regressions.append(f"{name}: {before / 1000:.1f}ms -> {after / 1000:.1f}ms")
+        if regressions:
+            raise click.ClickException("Import time regressions:\n" + "\n".join(regressions))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the verify → hash → move pipeline.
+
+Creates a burst of completed torrents, with real data on tmpfs, served by
+tsmu.bench.fakedaemon. Then runs TransmissionVerify, ComputeXxh and
+MoveTorrent on them, under dramatiq's StubBroker with an in-process worker,
+until every torrent is archived into 02-baked or has been given up on.
+Reports throughput, and percentiles of the latency from completion
+(TransmissionVerify being enqueued) to archived (its last message
+finishing, with its data in 02-baked).
+
+    python -m tsmu.bench.pipeline --shape large --torrents 16
+    python -m tsmu.bench.pipeline --shape mp3 --torrents 64 --json pipeline.json
+    python -m tsmu.bench.pipeline --shape mp3 --baseline pipeline.json
+
+Shapes are a few large files, like a film, or many small files, like an
+MP3-daily album. Needs xxhsum. With --baseline, exits non-zero if the p50
+latency or the throughput got worse than the baseline's by more than
+--tolerance.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Final
+
+import click
+
+# (files per torrent, bytes per file)
+SHAPES: Final[dict[str, tuple[int, int]]] = {
+    "large": (4, 16 * 1024 * 1024),
+    "mp3": (200, 256 * 1024),
+}
+
+
+@dataclass
+class Latencies:
+    enqueued_at: dict[str, float]
+    archived_at: dict[str, float]
+    failed: dict[str, str]
+
+
+def DefaultRoot() -> Path:
+    """Somewhere on tmpfs, so we measure tsmu rather than the disk."""
+    shm = Path("/dev/shm")
+    return Path(tempfile.mkdtemp(prefix="tsmu-bench-", dir=shm if shm.is_dir() else None))
+
+
+def CreateTorrentData(hot_dir: Path, name: str, file_count: int, file_size: int) -> int:
+    """Write a torrent's files under hot_dir/name, returning its size."""
+    block = os.urandom(min(file_size, 1024 * 1024))
+    for i in range(file_count):
+        path = hot_dir / name / f"{i:03} - Track.mp3"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as fp:
+            # Make each file different, so checksums are too
+            fp.write(f"{name}/{i}".encode("utf-8"))
+            remaining = file_size - fp.tell()
+            while remaining > 0:
+                remaining -= fp.write(block[:remaining])
+    return file_count * file_size
+
+
+def Percentile(values: list[float], p: int) -> float:
+    """
+    >>> Percentile([1.0, 2.0, 3.0, 4.0], 50)
+    2.5
+    """
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+def RunPipeline(
+    root: Path,
+    torrent_count: int,
+    file_count: int,
+    file_size: int,
+    worker_threads: int = 8,
+    verify_rate: float = 1000 * 1000**2,
+    timeout: float = 600.0,
+) -> dict[str, Any]:
+    # Before tsmu.workers is imported: no Redis, and the daemon is ours
+    os.environ["TSMU_BROKER"] = "stub"
+    os.environ["XDG_CONFIG_HOME"] = str(root / "config")
+
+    import dramatiq
+    from dramatiq.middleware import Middleware
+
+    import tsmu.workers
+    from tsmu.bench.fakedaemon import FakeTorrent, FakeTransmissionDaemon
+
+    hot_dir = root / "torrents" / "01-hot"
+    torrents, total_size = [], 0
+    for i in range(1, torrent_count + 1):
+        name = f"Bench.Torrent.{i:04}-TSMU"
+        size = CreateTorrentData(hot_dir, name, file_count, file_size)
+        total_size += size
+        torrents.append(FakeTorrent(i, f"{i:040x}", name, str(hot_dir), size))
+
+    daemon = FakeTransmissionDaemon(torrents, verify_rate=verify_rate)
+    daemon.Start()
+    daemon.WriteSettings(root / "config")
+
+    latencies = Latencies({}, {}, {})
+    finished = threading.Event()
+
+    baked_dir = hot_dir.parent / "02-baked"
+    done: set[str] = set()
+
+    class ArchivedMiddleware(Middleware):
+        """Records a torrent once none of its messages are left, archived only if it's baked."""
+
+        def __init__(self) -> None:
+            self.lock = threading.Lock()
+            self.in_flight: dict[str, set[str]] = {}
+
+        def after_enqueue(self, broker, message, delay):
+            with self.lock:
+                self.in_flight.setdefault(message.args[1], set()).add(message.message_id)
+
+        def after_skip_message(self, broker, message):
+            self.after_process_message(broker, message)
+
+        def after_process_message(self, broker, message, *, result=None, exception=None):
+            name = message.args[1]
+            with self.lock:
+                messages = self.in_flight.setdefault(name, set())
+                messages.discard(message.message_id)
+                if name in done:
+                    return
+                if exception is not None:
+                    latencies.failed[name] = f"{message.actor_name}: {exception!r}"
+                elif messages:
+                    return
+                elif any(baked_dir.glob(f"*/{name}")):
+                    latencies.archived_at[name] = time.monotonic()
+                else:
+                    latencies.failed[name] = f"{message.actor_name}: left it unarchived"
+                done.add(name)
+                if len(done) >= torrent_count:
+                    finished.set()
+
+    broker = dramatiq.get_broker()
+    broker.add_middleware(ArchivedMiddleware())
+    worker = dramatiq.Worker(broker, worker_threads=worker_threads, worker_timeout=100)
+    worker.start()
+
+    started_at = time.monotonic()
+    for t in torrents:
+        latencies.enqueued_at[t.name] = time.monotonic()
+        tsmu.workers.TransmissionVerify.send(t.id, t.name, t.downloadDir)
+    finished.wait(timeout)
+    elapsed = time.monotonic() - started_at
+
+    worker.stop()
+    daemon.Stop()
+
+    # Torrents that didn't finish would otherwise be silently left out
+    unarchived = [t.name for t in torrents if t.name not in latencies.archived_at]
+    archived = list((root / "torrents" / "02-baked").glob("*/*.auto.xxh"))
+    seconds = sorted(
+        latencies.archived_at[n] - latencies.enqueued_at[n] for n in latencies.archived_at
+    )
+    return {
+        "torrents": torrent_count,
+        "files_per_torrent": file_count,
+        "file_size": file_size,
+        "archived": len(archived),
+        "unarchived": unarchived,
+        "failed": latencies.failed,
+        "elapsed_s": elapsed,
+        "torrents_per_s": len(seconds) / elapsed,
+        "mb_per_s": total_size / 1000**2 / elapsed,
+        "latency_s": {
+            "p50": Percentile(seconds, 50),
+            "p90": Percentile(seconds, 90),
+            "p99": Percentile(seconds, 99),
+            "max": max(seconds, default=0.0),
+        },
+    }
+
+
+@click.command()
+@click.option("--shape", type=click.Choice(list(SHAPES)), default="large", show_default=True)
+@click.option("--torrents", "torrent_count", default=16, show_default=True)
+@click.option("--file-count", type=int, help="Files per torrent, instead of the shape's")
+@click.option("--file-size", type=int, help="Bytes per file, instead of the shape's")
+@click.option("--worker-threads", default=8, show_default=True)
+@click.option("--verify-rate", default=1000.0, show_default=True, help="Simulated MB/s")
+@click.option("--root", type=click.Path(file_okay=False, path_type=Path), help="Default tmpfs")
+@click.option("--keep", is_flag=True, help="Don't remove the data afterwards")
+@click.option("--json", "json_path", type=click.Path(path_type=Path), help="Write results here")
+@click.option("--baseline", type=click.Path(exists=True, path_type=Path))
+@click.option("--tolerance", default=0.2, show_default=True, help="Allowed slowdown vs baseline")
+def cli(
+    shape: str = "large",
+    torrent_count: int = 16,
+    file_count: int | None = None,
+    file_size: int | None = None,
+    worker_threads: int = 8,
+    verify_rate: float = 1000.0,
+    root: Path | None = None,
+    keep: bool = False,
+    json_path: Path | None = None,
+    baseline: Path | None = None,
+    tolerance: float = 0.2,
+) -> None:
+    """Benchmark draining a burst of completed torrents through the workers."""
+    if not shutil.which("xxhsum"):
+        raise click.ClickException("xxhsum is needed, e.g. apt install xxhash")
+    shape_file_count, shape_file_size = SHAPES[shape]
+    root = root if root else DefaultRoot()
+    root.mkdir(parents=True, exist_ok=True)
+    try:
+        r = RunPipeline(
+            root,
+            torrent_count,
+            file_count or shape_file_count,
+            file_size or shape_file_size,
+            worker_threads=worker_threads,
+            verify_rate=verify_rate * 1000**2,
+        )
+    finally:
+        if not keep:
+            shutil.rmtree(root)
+
+    latency = r["latency_s"]
+    click.echo(
+        f"{r['archived']}/{r['torrents']} archived in {r['elapsed_s']:.2f}s:"
+        f" {r['torrents_per_s']:.2f} torrents/s, {r['mb_per_s']:.1f} MB/s;"
+        f" latency p50={latency['p50']:.2f}s p90={latency['p90']:.2f}s"
+        f" p99={latency['p99']:.2f}s max={latency['max']:.2f}s"
+    )
+    for name, error in r["failed"].items():
+        click.echo(f"Failed {name}: {error}", err=True)
+
+    if json_path:
+        json_path.write_text(json.dumps(r, indent=2))
+
+    if r["unarchived"]:
+        raise click.ClickException(f"{len(r['unarchived'])} torrents weren't archived")
+
+    if baseline:
+        b = json.loads(baseline.read_text())
+        regressions = []
+        if latency["p50"] > b["latency_s"]["p50"] * (1 + tolerance):
+            regressions.append(
+                f"p50 latency: {b['latency_s']['p50']:.2f}s -> {latency['p50']:.2f}s"
+            )
+        if r["torrents_per_s"] < b["torrents_per_s"] / (1 + tolerance):
+            regressions.append(
+                f"throughput: {b['torrents_per_s']:.2f} -> {r['torrents_per_s']:.2f} torrents/s"
+            )
+        if regressions:
+            raise click.ClickException("Pipeline regressions:\n" + "\n".join(regressions))
+
+
+if __name__ == "__main__":
+    cli()
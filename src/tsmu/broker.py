@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+dramatiq broker for tsmu-workers.
+
+Kept apart from tsmu.workers so that commands that only talk to the queues
+(tsmu-workers, tsmu-workers-flush) don't import the actors, transmissionrpc
+et al.
+
+Set TSMU_BROKER=stub to use dramatiq's in-memory StubBroker, e.g. for
+benchmarks; no configuration or Redis is needed then.
+"""
+
+import functools
+import os
+from typing import Final
+
+import dramatiq
+from dramatiq.broker import Broker
+
+from tsmu.config import LoadConfiguration
+
+# Queues of tsmu.workers' actors, all on dramatiq's default
+QUEUE_NAMES: Final[list[str]] = ["default"]
+
+
+def SetupBroker() -> Broker:
+    if os.getenv("TSMU_BROKER") == "stub":
+        from dramatiq.brokers.stub import StubBroker
+        from dramatiq.middleware import default_middleware
+
+        # Prometheus only works in a forked worker process, and we'd have none
+        middleware = [m() for m in default_middleware if m.__name__ != "Prometheus"]
+        broker = StubBroker(middleware=middleware)
+        dramatiq.set_broker(broker)
+        return broker
+
+    from dramatiq.brokers.redis import RedisBroker
+
+    redis_password = LoadConfiguration().get("redis", {}).get("password")
+    credentials = f"default:{redis_password}@" if redis_password else ""
+    # See https://github.com/redis/redis-py/blob/f704281cf4c1f735c06a13946fcea42fa939e3a5/redis/client.py#L855 for connecton string syntax
+    rb = RedisBroker(url=f"unix://{credentials}/run/redis/redis-server.sock?db=0")
+    dramatiq.set_broker(rb)
+    return rb
+
+
+def FlushAll(broker: Broker) -> None:
+    """Drop all messages from tsmu-workers' queues, and their delay queues.
+
+    A broker only flushes queues it has declared, which it otherwise only does
+    when the actors are imported.
+    """
+    for queue_name in QUEUE_NAMES:
+        broker.declare_queue(queue_name)
+    broker.flush_all()
+
+
+def EnqueueMany(broker: Broker, messages: list[dramatiq.Message]) -> None:
+    """Enqueue messages, in one round-trip to Redis rather than one each.
+
+    dramatiq only enqueues a message at a time, so a RedisBroker's enqueue
+    script is run on a pipeline instead. Not safe with other threads enqueuing
+    on the same broker at once.
+    """
+    client = getattr(broker, "client", None)
+    if client is None:
+        for message in messages:
+            broker.enqueue(message)
+        return
+
+    pipe = client.pipeline(transaction=False)
+    dispatch = broker.scripts["dispatch"]
+    broker.scripts["dispatch"] = functools.partial(dispatch, client=pipe)
+    try:
+        for message in messages:
+            broker.enqueue(message)
+    finally:
+        broker.scripts["dispatch"] = dispatch
+    pipe.execute()
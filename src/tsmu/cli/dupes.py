@@ -1,108 +1,53 @@
 #!/usr/bin/env python3
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+import filecmp
+import functools
 import json
+import logging
 import os
 import re
-import shlex
+import shutil
 import subprocess
-
-# Logging
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Iterable, Optional
 
 import click
-import typer
-
-# Logging
-import tsmu.log
-
-logger = tsmu.log.SetupInteractiveScriptLogging()
 
-## chdir context manager (in Python 3.11?)
+from tsmu.util import CopyFileData, HashFiles, ReadXxhFile, ReflinkFile
 
-try:
-    from contextlib import chdir as contextlib_chdir
-except ImportError:
-    import os
-    from contextlib import AbstractContextManager
+if TYPE_CHECKING:
+    import transmissionrpc
 
-    class contextlib_chdir(AbstractContextManager):
-        """Non thread-safe context manager to change the current working directory."""
+    from tsmu.metastore import TorrentStore
 
-        def __init__(self, path):
-            self.path = path
-            self._old_cwd = []
-
-        def __enter__(self):
-            self._old_cwd.append(os.getcwd())
-            os.chdir(self.path)
-
-        def __exit__(self, *excinfo):
-            os.chdir(self._old_cwd.pop())
-
-
-## end chdir context manager
+logger = logging.getLogger(__name__)
 
 ## from tsmu.py
 
-import shutil
-
-import transmissionrpc
-
 
 def ConnectToTransmission() -> transmissionrpc.Client:
     """Connect to transmission using current user's settings."""
+    from tsmu.rpctrace import NewTransmissionClient
+
     settings_file_path = (
         Path(click.get_app_dir("transmission-daemon"), "settings.json").expanduser().resolve()
     )
     settings = json.load(open(settings_file_path))
 
     host, port, username, password = "localhost", settings["rpc-port"], None, None
-    tc = transmissionrpc.Client(host, port, username, password)
+    tc = NewTransmissionClient(host, port, username, password)
     return tc
 
 
 TorrentInformation = dict[str, Any]
 
 
-def DumpTorrentMetadata(
-    torrent_info: TorrentInformation, output_path: Path, use_name: bool = False
-) -> Path:
-    assert "torrentFile" in torrent_info
-    ti = torrent_info.copy()
-
-    for unnecessary_attr in {"id", "downloadDir", "percentDone"}:
-        if "id" in ti:
-            del ti[unnecessary_attr]
-
-    name = torrent_info["name"]
-    transmission_torrent_file = ti["torrentFile"]
-    hash = ti["hash"]
-
-    # TODO: make sure name is filesystem-safe
-    if use_name:
-        filename_base = name
-    else:
-        filename_base = hash
-
-    dest_torrent_filename = filename_base + ".torrent"
-    metadata_filename = filename_base + ".json"
-
-    # Fix filename
-    ti["torrentFile"] = dest_torrent_filename
-
-    # TODO: permissions may be too restrictive
-    dest_torrent_full_path = Path(
-        shutil.copy2(transmission_torrent_file, output_path / dest_torrent_filename)
-    )
-
-    with Path(output_path / metadata_filename).open("a") as fp:
-        fp.write(json.dumps(ti))
-
-    return dest_torrent_full_path
-
-
 # end from tsmu.py
-import functools
 
 
 @functools.cache
@@ -125,19 +70,169 @@ def CacheTransmissionTorrents(
     return out
 
 
-def ReAddTorrent(tc: transmissionrpc.Client, torrent_info: TorrentInformation, readd_path: Path):
-    """Readd a torrent given by torrent_info to a path given by readd_path."""
-    READD_FOLDER = Path("~/readded-torrents/").expanduser()
-    READD_FOLDER.mkdir(exist_ok=True)
-
-    backup_up_torrent_file = DumpTorrentMetadata(torrent_info, READD_FOLDER)
+def PrepareReAdd(
+    store: TorrentStore, torrent_info: TorrentInformation, readd_path: Path
+) -> tuple[str, Path, Path]:
+    """Back up torrent_info's .torrent, returning a (hash, .torrent, path) re-add for ReAddTorrents."""
+    backup_up_torrent_file = store.Put(torrent_info)
 
     logger.info(
         f"Readd name={torrent_info['name']}\n      hash={torrent_info['hash']}\n      from={torrent_info.get('downloadDir')}\n        to={readd_path}"
     )
+    return torrent_info["hash"], backup_up_torrent_file, readd_path
+
+
+# Dupes found before their torrents are re-added and they're removed
+READD_BATCH_SIZE = 32
+
+
+@dataclass
+class PendingRemoval:
+    dupe: Path
+    dupe_xxh: Path
+    readd: tuple[str, Path, Path] | None
 
-    tc.remove_torrent(torrent_info["hash"])
-    tc.add_torrent(str(backup_up_torrent_file), download_dir=readd_path)
+
+def RemoveDupes(pending: list[PendingRemoval]) -> list[Path]:
+    """Re-add the pending dupes' torrents concurrently, then remove the dupes.
+
+    A dupe whose torrent couldn't be re-added is left in place, as its torrent
+    may still point at it. Returns the dupes removed.
+    """
+    from tsmu.trash import Trash
+
+    readds = [p.readd for p in pending if p.readd]
+    if readds:
+
+        import asyncio
+
+        from tsmu.aiorpc import ConnectToTransmissionAsync, ReAddTorrents
+
+        async def ReAddAll():
+            async with ConnectToTransmissionAsync() as client:
+                return await ReAddTorrents(client, readds)
+
+        failures = {
+            readd[0]: result
+            for readd, result in zip(readds, asyncio.run(ReAddAll()))
+            if result is not None
+        }
+    else:
+        failures = {}
+
+    removed = []
+    for p in pending:
+        if p.readd and p.readd[0] in failures:
+            logger.error(
+                f"Unable to readd {p.readd[0]}, not removing {p.dupe}: {failures[p.readd[0]]!r}"
+            )
+            continue
+        rm_target = "%s{,%s}" % (p.dupe.name, p.dupe_xxh.name.replace(p.dupe.name, ""))
+        logger.info(f"Removing {p.dupe.parent}/{rm_target}")
+        # Deleted by tsmu trashd, so a big dupe doesn't hold up the sweep
+        Trash(p.dupe)
+        p.dupe_xxh.unlink()
+        removed.append(p.dupe)
+    return removed
+
+
+def RepairFromOtherCopy(xxh: Path, cwd: Path, name: str, paths: list[str]) -> bool:
+    """Copy paths, relative to cwd, from the copy xxh is for, if they're corrupt here.
+
+    Only files name's own checksum file has the same checksum for, that are
+    missing or don't match it, are copied; the others legitimately differ, e.g.
+    a PROPER's .nfo. Files are reflinked or copied with copy_file_range, and
+    must match xxh in the other copy. Returns True if every file was repaired.
+    """
+    expected = ReadXxhFile(xxh)
+    own_xxh = FindXXH(cwd / name)
+    own_expected = ReadXxhFile(own_xxh) if own_xxh else {}
+    if not expected or any(expected.get(p) is None for p in paths):
+        return False
+    differing = [p for p in paths if own_expected.get(p) != expected[p]]
+    if differing:
+        logger.error(f"{name} is meant to differ from {xxh.parent}, per {own_xxh}: {differing}")
+        return False
+
+    source_dir = xxh.parent
+    checksum_length = len(next(iter(expected.values())))
+    source_checksums = HashFiles(source_dir, paths, checksum_length=checksum_length)
+
+    repaired = 0
+    for path in paths:
+        if source_checksums.get(path) != expected[path]:
+            logger.error(f"{source_dir / path} does not match {xxh} either, not copying it")
+            continue
+        dst = cwd / path
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dst = dst.with_name(f".{dst.name}.tsmu-repair")
+        method = CopyFileData(source_dir / path, tmp_dst)
+        os.replace(tmp_dst, dst)
+        logger.info(f"Repaired {dst} from {source_dir / path} w/ {method}")
+        repaired += 1
+    return repaired == len(paths)
+
+
+def LinkFile(src: Path, dst: Path) -> str:
+    """Replace dst with a reflink of src, or a hardlink if the filesystem can't reflink.
+
+    Reflinks are copy-on-write, so are preferred; dst keeps its own times. Returns which one.
+    """
+    tmp_dst = dst.with_name(f".{dst.name}.tsmu-link")
+    try:
+        ReflinkFile(src, tmp_dst)
+        shutil.copystat(dst, tmp_dst)
+        method = "reflink"
+    except OSError:
+        os.link(src, tmp_dst)
+        method = "hardlink"
+    os.replace(tmp_dst, dst)
+    return method
+
+
+def LinkIdenticalFiles(dupe: Path, non_dupe: Path) -> tuple[int, int]:
+    """Replace files in dupe that are byte-identical to those in non_dupe with links to them.
+
+    Files are matched by their path in the torrent, then by size and, if both copies have
+    checksum files, by checksum. Files that are already the same inode aren't read. Returns
+    (files linked, bytes reclaimed).
+    """
+    if dupe.stat().st_dev != non_dupe.stat().st_dev:
+        logger.warning(f"Not linking {dupe} to {non_dupe}, they're on different filesystems")
+        return 0, 0
+
+    dupe_checksums, non_dupe_checksums = {}, {}
+    if (dupe_xxh := FindXXH(dupe)) and (non_dupe_xxh := FindXXH(non_dupe)):
+        dupe_checksums, non_dupe_checksums = ReadXxhFile(dupe_xxh), ReadXxhFile(non_dupe_xxh)
+
+    linked, reclaimed = 0, 0
+    for dirpath, _, filenames in os.walk(dupe):
+        for filename in filenames:
+            dupe_file = Path(dirpath) / filename
+            path = str(dupe_file.relative_to(dupe.parent))
+            non_dupe_file = non_dupe.parent / path
+            try:
+                dupe_stat, non_dupe_stat = dupe_file.stat(), non_dupe_file.stat()
+            except FileNotFoundError:
+                continue
+            if (dupe_stat.st_dev, dupe_stat.st_ino) == (non_dupe_stat.st_dev, non_dupe_stat.st_ino):
+                continue
+            if dupe_stat.st_size != non_dupe_stat.st_size:
+                continue
+            if dupe_checksums.get(path, "") != non_dupe_checksums.get(path, ""):
+                continue
+            if not filecmp.cmp(dupe_file, non_dupe_file, shallow=False):
+                logger.warning(f"{dupe_file} differs from {non_dupe_file}, not linking")
+                continue
+            try:
+                method = LinkFile(non_dupe_file, dupe_file)
+            except OSError as e:
+                logger.error(f"Unable to link {dupe_file} to {non_dupe_file}: {e}")
+                continue
+            logger.info(f"Linked {dupe_file} to {non_dupe_file} w/ {method}")
+            linked += 1
+            reclaimed += dupe_stat.st_size
+    return linked, reclaimed
 
 
 def FindXXH(path: Path) -> Optional[Path]:
@@ -153,9 +248,221 @@ def FindXXH(path: Path) -> Optional[Path]:
     return False
 
 
+# Journal states of a dupe
+VERIFIED = "verified"  # both copies match, waiting to be removed
+REMOVED = "removed"
+LINKED = "linked"
+MISMATCH = "mismatch"
+SKIPPED = "skipped"  # no other copy, or no checksums; looked at again next time
+
+
+def DefaultJournalPath() -> Path:
+    import xdg.BaseDirectory
+
+    return Path(xdg.BaseDirectory.save_data_path("tsmu")) / "dupes.json"
+
+
+# Bumped when what the states mean changes, so earlier journals are started over
+JOURNAL_VERSION = 2
+
+
+class DupesJournal:
+    """State of every dupe looked at, by path, so an interrupted sweep can resume.
+
+    States are kept per mode, "link" or "remove", as e.g. a dupe that's been
+    linked hasn't been checked for removal.
+    """
+
+    def __init__(self, journal_path: Path, mode: str):
+        self.journal_path = journal_path
+        self.journal: dict[str, Any] = {"version": JOURNAL_VERSION, "modes": {}}
+        if journal_path.exists():
+            journal = json.loads(journal_path.read_text())
+            if journal.get("version") == JOURNAL_VERSION:
+                self.journal = journal
+            else:
+                logger.warning(f"Starting over, {journal_path} is from an older tsmu-dupes")
+        self.states: dict[str, str] = self.journal["modes"].setdefault(mode, {})
+
+    def Get(self, dupe: Path) -> str | None:
+        return self.states.get(str(dupe))
+
+    def Set(self, dupes: list[Path], state: str) -> None:
+        for dupe in dupes:
+            self.states[str(dupe)] = state
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.journal_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.journal))
+        os.replace(tmp_path, self.journal_path)
+
+
+def CheckXXHAgainstDirectory(xxh: Path, cwd: Path, name: str) -> bool:
+    if not cwd.is_dir():
+        return False
+    if not xxh.is_file():
+        return False
+
+    cmd = ["ionice", "-c", "3", "xxhsum", "-c", str(xxh)]
+    cp = subprocess.run(cmd, cwd=cwd, capture_output=True, universal_newlines=True)
+    if cp.returncode == 0:
+        return True
+    else:
+        stdout = cp.stdout
+        logger.error(f"{name} does not match")
+        bad_lines = []
+        missing_files = re.findall(
+            "Could not open or read '(.*?)': No such file or directory", stdout
+        )
+        mismatched_files = re.findall(r"^(.*): FAILED$", stdout, re.MULTILINE)
+
+        # Copy just those files over from the other copy, if they're good there
+        if missing_files or mismatched_files:
+            logger.info(f"Found {missing_files=} {mismatched_files=}")
+            if RepairFromOtherCopy(xxh, cwd, name, missing_files + mismatched_files):
+                return True
+        for line in stdout.splitlines():
+            # Just handled this above
+            if "No such file or directory" in line:
+                continue
+            if ": OK" not in line:
+                bad_lines.append(line.strip())
+        for line in bad_lines:
+            logger.error(line)
+        return False
+
+
+@dataclass
+class DupeCandidate:
+    dupe: Path
+    non_dupe: Path
+    dupe_xxh: Path | None
+    non_dupe_xxh: Path | None
+
+
+class DeviceLimits:
+    """At most per_device jobs reading from any one device at once."""
+
+    def __init__(self, per_device: int):
+        self.per_device = per_device
+        self.lock = threading.Lock()
+        self.semaphores: dict[int, threading.Semaphore] = {}
+
+    @contextlib.contextmanager
+    def Acquire(self, paths: Iterable[Path]):
+        # Always in the same order, so two jobs can't each hold what the other waits for
+        devices = sorted({os.stat(p).st_dev for p in paths})
+        with self.lock:
+            semaphores = [
+                self.semaphores.setdefault(d, threading.Semaphore(self.per_device)) for d in devices
+            ]
+        with contextlib.ExitStack() as stack:
+            for semaphore in semaphores:
+                stack.enter_context(semaphore)
+            yield
+
+
+def CheckCandidate(candidate: DupeCandidate, link: bool, limits: DeviceLimits) -> str:
+    """Verify, or link, one dupe against its other copy. Runs in a worker thread."""
+    dupe, non_dupe = candidate.dupe, candidate.non_dupe
+    with limits.Acquire([dupe, non_dupe]):
+        # Both torrents keep seeding from their own paths, sharing the data that's the same
+        if link:
+            linked, reclaimed = LinkIdenticalFiles(dupe, non_dupe)
+            logger.info(f"Linked {linked} files of {dupe.name}, reclaiming {reclaimed} bytes")
+            return LINKED
+
+        if CheckXXHAgainstDirectory(
+            candidate.non_dupe_xxh, dupe.parent, dupe.name
+        ) and CheckXXHAgainstDirectory(candidate.dupe_xxh, non_dupe.parent, dupe.name):
+            return VERIFIED
+        return MISMATCH
+
+
+def FindCandidate(de: os.DirEntry, candidate_path: Path | None, link: bool) -> DupeCandidate | None:
+    dupe = Path(de.path).absolute().resolve()
+
+    candidate_paths = [
+        Path("../../../") / de.name,
+        Path("../../") / de.name,
+        Path("../") / de.name,
+    ]
+    if candidate_path:
+        candidate_paths.insert(0, candidate_path / de.name)
+
+    non_dupe = None
+    for c in candidate_paths:
+        c = c.absolute().resolve()
+        # logger.info(f"Checking {str(c)}")
+        if c.exists():
+            non_dupe = c
+            break
+    if not non_dupe:
+        logger.warning(f'Unable to find candidate dupe for "{de.name}"')
+        return None
+
+    non_dupe = non_dupe.absolute().resolve()
+    # logger.info(f"Found {dupe}, candidate dupe at {non_dupe}")
+    # TODO: throw exception rather than relying on assert
+    assert dupe.resolve() != non_dupe.resolve()
+
+    # check dupe w/ non_dupe xxh
+    non_dupe_xxh = FindXXH(non_dupe)
+    dupe_xxh = FindXXH(dupe)
+    if not link:
+        if not non_dupe_xxh:
+            logger.warning(f'Unable to find non-dupe checksums for "{de.name}"')
+            return None
+        if not dupe_xxh:
+            logger.warning(f'Unable to find dupe checksums for "{de.name}"')
+            return None
+    return DupeCandidate(dupe, non_dupe, dupe_xxh, non_dupe_xxh)
+
+
+@click.command()
+@click.option("--root-path", type=click.Path(path_type=Path), default=Path("."), show_default=True)
+@click.option("--transmission/--no-transmission", default=True, show_default=True)
+@click.option("--candidate-path", type=click.Path(path_type=Path))
+@click.option(
+    "--link/--no-link",
+    default=False,
+    show_default=True,
+    help="Link identical files to the other copy, rather than removing dupes",
+)
+@click.option("--workers", default=8, show_default=True, help="Dupes checked at once")
+@click.option(
+    "--per-device",
+    default=2,
+    show_default=True,
+    help="Dupes checked at once reading from any one device",
+)
+@click.option(
+    "--journal",
+    type=click.Path(path_type=Path),
+    help="Where to record progress, to resume from [default: XDG data dir]",
+)
+@click.option(
+    "--profile",
+    type=click.Path(path_type=Path),
+    help="Profile, writing pstats here, or stacks if *.collapsed; - for a summary only",
+)
 def main(
-    root_path: Path = Path("."), transmission: bool = True, candidate_path: Path | None = None
+    root_path: Path = Path("."),
+    transmission: bool = True,
+    candidate_path: Path | None = None,
+    link: bool = False,
+    workers: int = 8,
+    per_device: int = 2,
+    journal: Path | None = None,
+    profile: Path | None = None,
 ):
+    if profile:
+        from tsmu.profiling import StartProfiling
+
+        StartProfiling(None if str(profile) == "-" else profile)
+    import tsmu.log
+    from tsmu.metastore import TorrentStore
+
+    tsmu.log.SetupInteractiveScriptLogging()
     root_path = root_path.absolute().resolve()
     logger.info(f"Scanning path={root_path.absolute()}")
     if candidate_path:
@@ -168,161 +475,71 @@ def main(
     else:
         tc, torrentsByName = None, dict()
 
-    for de in os.scandir(root_path):
+    store = TorrentStore()
+    dupes_journal = DupesJournal(
+        journal if journal else DefaultJournalPath(), "link" if link else "remove"
+    )
+    pending: list[PendingRemoval] = []
+
+    def QueueRemoval(candidate: DupeCandidate) -> None:
+        dupe, non_dupe = candidate.dupe, candidate.non_dupe
+        logger.info(f"Safe to remove {dupe}")
+
+        readd = None
+        if transmission:
+            # this is wrong, we don't want by name, we want by name and downloadDir
+            ti: TorrentInformation | None = None
+            try:
+                ti = torrentsByName[(dupe.name, dupe.parent)]
+            except KeyError as e:
+                logger.warning(f"Unable to find dupe torrent in client: {e}. Removing anyway")
+            if ti:
+                readd = PrepareReAdd(store, ti, non_dupe.parent)
+
+        pending.append(PendingRemoval(dupe, candidate.dupe_xxh, readd))
+        if len(pending) >= READD_BATCH_SIZE:
+            dupes_journal.Set(RemoveDupes(pending), REMOVED)
+            pending.clear()
+
+    # Finding candidates is cheap, so done up front; checking them is what's concurrent
+    candidates = []
+    for de in sorted(os.scandir(root_path), key=lambda de: de.name):
         if not de.is_dir():
             continue
-
-        dupe = Path(de.path).absolute().resolve()
-
-        candidate_paths = [
-            Path("../../../") / de.name,
-            Path("../../") / de.name,
-            Path("../") / de.name,
-        ]
-        if candidate_path:
-            candidate_paths.insert(0, candidate_path / de.name)
-
-        non_dupe = None
-        for c in candidate_paths:
-            c = c.absolute().resolve()
-            # logger.info(f"Checking {str(c)}")
-            if c.exists():
-                non_dupe = c
-                break
-        if not non_dupe:
-            logger.warning(f'Unable to find candidate dupe for "{de.name}"')
+        state = dupes_journal.Get(Path(de.path).resolve())
+        if state in (REMOVED, LINKED, MISMATCH):
             continue
-
-        non_dupe = non_dupe.absolute().resolve()
-        # logger.info(f"Found {dupe}, candidate dupe at {non_dupe}")
-
-        # check dupe w/ non_dupe xxh
-        non_dupe_xxh = FindXXH(non_dupe)
-        if not non_dupe_xxh:
-            logger.warning(f'Unable to find non-dupe checksums for "{de.name}"')
+        candidate = FindCandidate(de, candidate_path, link)
+        if candidate is None:
+            dupes_journal.Set([Path(de.path).resolve()], SKIPPED)
             continue
-        dupe_xxh = FindXXH(dupe)
-        if not dupe_xxh:
-            logger.warning(f'Unable to find dupe checksums for "{de.name}"')
+        # Checked before we were interrupted
+        if state == VERIFIED and not link:
+            QueueRemoval(candidate)
             continue
-
-        def CheckXXHAgainstDirectory(xxh: Path, cwd: Path, name: str) -> bool:
-            if not cwd.is_dir():
-                return False
-            if not xxh.is_file():
-                return False
-
-            with contextlib_chdir(cwd):
-                cmd = ["ionice", "-c", "3", "xxhsum", "-c", str(xxh)]
-                cp = subprocess.run(cmd, capture_output=True, universal_newlines=True)
-                if cp.returncode == 0:
-                    return True
-                else:
-                    stdout = cp.stdout
-                    logger.error(f"{name} does not match")
-                    bad_lines = []
-                    missing_files = re.findall(
-                        "Could not open or read '(.*?)': No such file or directory", stdout
-                    )
-                    for mf in missing_files:
-                        logger.info(f"We could copy {xxh.parent / mf} to {cwd / name} to fix this")
-
-                    # We fixed missing files… so let's recompute checksums and try again
-                    if len(missing_files) > 0:
-                        logger.info(f"Found missing files: {missing_files=}")
-
-                        rsync_src = str(xxh.parent / name) + "/"
-                        rsync_dst = str(cwd / name) + "/"
-                        assert Path(rsync_src).exists()
-                        assert Path(rsync_dst).exists()
-                        rsync_src, rsync_dst = shlex.quote(rsync_src), shlex.quote(rsync_dst)
-                        rsync_cmd = f"rsync -aPv -c --ignore-existing {rsync_src} {rsync_dst}"
-                        subprocess.run(rsync_cmd, shell=True)
-                        release_name = shlex.quote(dupe.name)
-                        xxhsum_recompute_cmd = f"(cd {cwd} && ionice -c 3 find {release_name} -type f -exec xxhsum {{}} \; > {cwd}/{release_name}.auto.xxh) &"
-                        subprocess.run(xxhsum_recompute_cmd, shell=True)
-                        logger.info(f"Rechecking {name=}")
-                        return CheckXXHAgainstDirectory(xxh, cwd, name)
-                    for line in stdout.splitlines():
-                        # Just handled this above
-                        if "No such file or directory" in line:
-                            continue
-                        if ": OK" not in line:
-                            bad_lines.append(line.strip())
-                    for line in bad_lines:
-                        logger.error(line)
-                    return False
-
-        #        with contextlib_chdir(dupe.parent):
-        #            cmd = ['ionice', '-c', '3', 'xxhsum', '-c', str(non_dupe_xxh)]
-        #            cp = subprocess.run(cmd, capture_output=True, universal_newlines=True)
-        #            if cp.returncode == 0:
-        #                ok = True
-        #            else:
-        #                stdout = cp.stdout
-        #                logger.error(f"{dupe} does not match")
-        #                bad_lines = []
-        #                missing_files = re.findall("Could not open or read '(.*?)': No such file or directory", stdout)
-        #                for mf in missing_files:
-        #                    logger.info(f"We could copy {non_dupe_xxh.parent / mf} to {dupe} to fix this")
-        #                for line in stdout.splitlines():
-        #                    if ': OK' not in line:
-        #                        bad_lines.append(line.strip())
-        #                for line in bad_lines:
-        #                    logger.error(line)
-        #                continue
-        #
-        #        with contextlib_chdir(non_dupe.parent):
-        #            cmd = ['xxhsum', '-c', str(dupe_xxh)]
-        #            cp = subprocess.run(cmd, capture_output=True, universal_newlines=True)
-        #            if cp.returncode == 0:
-        #                ok = True
-        #            else:
-        #                stdout = cp.stdout
-        #                logger.error(f"{dupe} does not match")
-        #                bad_lines = []
-        #                missing_files = re.findall("Could not open or read '(.*?)': No such file or directory", stdout)
-        #                for mf in missing_files:
-        #                    logger.info(f"We could copy {dupe_xxh.parent / mf} to {non_dupe} to fix this")
-        #                for line in stdout.splitlines():
-        #                    if ': OK' not in line:
-        #                        bad_lines.append(line.strip())
-        #                for line in bad_lines:
-        #                    logger.error(line)
-        #                continue
-
-        # if ok:
-        if CheckXXHAgainstDirectory(
-            non_dupe_xxh, dupe.parent, dupe.name
-        ) and CheckXXHAgainstDirectory(dupe_xxh, non_dupe.parent, dupe.name):
-            logger.info(f"Safe to remove {dupe}")
-
-            if transmission:
-                # this is wrong, we don't want by name, we want by name and downloadDir
-                ti: TorrentInformation | None = None
-                try:
-                    ti = torrentsByName[(dupe.name, dupe.parent)]
-                except KeyError as e:
-                    logger.warning(f"Unable to find dupe torrent in client: {e}. Removing anyway")
-                if ti:
-                    ReAddTorrent(tc, ti, non_dupe.parent)
-
-            # logger.info(f"Removing {dupe} and {dupe_xxh}")
-            rm_target = "%s{,%s}" % (dupe.name, dupe_xxh.name.replace(dupe.name, ""))
-            logger.info(f"Removing {dupe.parent}/{rm_target}")
-            # TODO: throw exception rather than relying on assert
-            assert dupe.resolve() != non_dupe.resolve()
-            shutil.rmtree(dupe)
-            dupe_xxh.unlink()
-        else:
-            pass
-            # logger.info(f"Not the same: {str(dupe_xxh)} and {str(non_dupe_xxh)}")
-
+        candidates.append(candidate)
+
+    limits = DeviceLimits(per_device)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(CheckCandidate, c, link, limits): c for c in candidates}
+        for done_count, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            candidate = futures[future]
+            try:
+                state = future.result()
+            except Exception:
+                logger.exception(f"Unable to check {candidate.dupe}")
+                continue
+            dupes_journal.Set([candidate.dupe], state)
+            logger.info(f"Checked {done_count}/{len(futures)} {candidate.dupe.name}: {state}")
+            if state == VERIFIED:
+                QueueRemoval(candidate)
+
+    dupes_journal.Set(RemoveDupes(pending), REMOVED)
     return
 
 
 def run():
-    typer.run(main)
+    main()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Hand a torrent completed in transmission-daemon to `tsmu hookd`, which enqueues
+it for tsmu-workers. Falls back to enqueueing directly, like
+transmission-done-dramatiq, if the daemon isn't running.
+
+Setup this script w/:
+
+    transmission-remote --torrent-done-script $(which transmission-done-client)
+"""
+
+import json
+import os
+import socket
+import sys
+
+from tsmu.hookd import CLIENT_TIMEOUT, TRANSMISSION_ENV_VARIABLES, SocketPath
+
+
+def SendToDaemon(event: dict[str, str | None]) -> str:
+    """Send event to the daemon, returning its reply.
+
+    Raises FileNotFoundError or ConnectionRefusedError if it isn't running.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(CLIENT_TIMEOUT)
+        s.connect(str(SocketPath()))
+        s.sendall(json.dumps(event).encode("utf-8") + b"\n")
+        return s.makefile("rb").readline().decode("utf-8").strip()
+
+
+def main():
+    event = {e: os.getenv(e) for e in TRANSMISSION_ENV_VARIABLES}
+    try:
+        reply = SendToDaemon(event)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # Not running, so it can't have enqueued this
+        from tsmu.cli import transmission_done_dramatiq
+
+        transmission_done_dramatiq.main()
+        return
+    except OSError as e:
+        # e.g. timed out, but it may yet enqueue this, so we mustn't as well
+        sys.exit(f"tsmu hookd didn't reply for {event['TR_TORRENT_HASH']}: {e}")
+    if reply != "ok":
+        sys.exit(f"tsmu hookd couldn't enqueue {event['TR_TORRENT_HASH']}: {reply}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,10 @@ Setup this script w/:
     transmission-remote --torrent-done-script $(which transmission-done-dramatiq)
 """
 
+import json
 import os
-from typing import FrozenSet
-
 from pathlib import Path
-import json
-
-from tsmu.workers import TransmissionVerify
+from typing import FrozenSet
 
 transmission_env_variables: FrozenSet[str] = frozenset(
     {
@@ -33,6 +30,8 @@ if tr_torrent_id := output_dict.get("TR_TORRENT_ID"):
 
 
 def main():
+    from tsmu.workers import TransmissionVerify
+
     with Path("~/transmission-done-testing.log.json").expanduser().open("a") as fp:
         fp.write(json.dumps(output_dict))
         fp.write("\n")
@@ -11,18 +11,21 @@ OR
 
     transmission-remote --torrent-done-script $(which transmission-done-standalone)
 """
+
 import datetime
-import functools
 import json
 import os
-import shlex
-import subprocess
-import sys
 import time
 from pathlib import Path
 from typing import FrozenSet
 
-import click
+from tsmu.util import (
+    ComputeXxhFile,
+    ConnectToTransmission,
+    MoveTorrentsData,
+    VerifyTorrent,
+    WaitForTorrentMove,
+)
 
 transmission_env_variables: FrozenSet[str] = frozenset(
     {
@@ -42,16 +45,6 @@ if tr_torrent_id := output_dict.get("TR_TORRENT_ID"):
 #    output_dict['TR_TORRENT_ID'] = int(output_dict['TR_TORRENT_ID'])
 
 
-@functools.cache
-def DetermineTransmissionPort() -> int:
-    settings_file_path = (
-        Path(click.get_app_dir("transmission-daemon"), "settings.json").expanduser().resolve()
-    )
-    settings = json.load(settings_file_path.open())
-    port = int(settings["rpc-port"])
-    return port
-
-
 def main():
     """Main entrypoint."""
     if current_download_path := Path(output_dict.get("TR_TORRENT_DIR")):
@@ -59,9 +52,13 @@ def main():
         # current_download_path = Path(output_dict['TR_TORRENT_DIR'])
 
         target_name = output_dict["TR_TORRENT_NAME"]
-        target_name = shlex.quote(target_name)
+        # hash is specifically used so we're safe across transmission-daemon restarts
+        tid = output_dict["TR_TORRENT_HASH"] or str(output_dict["TR_TORRENT_ID"])
+        tc = ConnectToTransmission()
+        started_at = time.monotonic()
 
         should_move = True
+        moved_download_path = current_download_path
 
         if (
             "02-baked" in current_download_path.parts
@@ -89,46 +86,41 @@ def main():
                     str(current_download_path.name) + ".done"
                 )
 
-            target_dir = moved_download_path / output_dict["TR_TORRENT_NAME"]
+            target_dir = moved_download_path / target_name
 
             # If we already have downloaded a torrent of this name, put into "dupes" folder
             while target_dir.exists():
                 moved_download_path = moved_download_path / "dupes"
-                target_dir = moved_download_path / output_dict["TR_TORRENT_NAME"]
+                target_dir = moved_download_path / target_name
 
             # output_dict['MovedDirectory'] = str(moved_download_path)
             moved_download_path.mkdir(parents=True, exist_ok=True)
 
-            move_torrent_cmd = [
-                "transmission-remote",
-                str(DetermineTransmissionPort()),
-                "-t",
-                str(output_dict["TR_TORRENT_ID"]),
-                "--move",
-                str(moved_download_path),
-            ]
-            subprocess.run(move_torrent_cmd)
-            time.sleep(15)
-
-        verify_cmd = [
-            "transmission-remote",
-            str(DetermineTransmissionPort()),
-            "-t",
-            str(output_dict["TR_TORRENT_ID"]),
-            "--verify",
-        ]
-        subprocess.run(verify_cmd)
-
-        if target_dir.is_dir():
-            xxh_cmd = f"(cd {moved_download_path} && ionice -c 3 find {target_name} -type f -exec xxhsum {{}} \; > {moved_download_path}/{target_name}.auto.xxh) &"
-        else:
-            xxh_cmd = f"(cd {moved_download_path} && ionice -c 3 xxhsum {target_name} > {target_name}.auto.xxh) &"
-        output_dict["xxh"] = xxh_cmd
-
-        subprocess.run(xxh_cmd, shell=True)
-
-        # output_dict['MoveTorrent'] = ' '.join(move_torrent_cmd)
+            MoveTorrentsData([(tid, moved_download_path)], tc=tc)
+            moved = WaitForTorrentMove(tid, moved_download_path, tc=tc)
+            output_dict["move_seconds"] = time.monotonic() - started_at
+            if not moved:
+                output_dict["error"] = f"move to {moved_download_path} did not complete"
+                WriteLog()
+                return
+
+        verify_started_at = time.monotonic()
+        verified = VerifyTorrent(tid, tc=tc)
+        output_dict["verify_seconds"] = time.monotonic() - verify_started_at
+        if not verified:
+            output_dict["error"] = "verify failed"
+            WriteLog()
+            return
+
+        xxh_started_at = time.monotonic()
+        output_dict["xxh"] = str(ComputeXxhFile(moved_download_path, target_name).path)
+        output_dict["xxh_seconds"] = time.monotonic() - xxh_started_at
+        output_dict["total_seconds"] = time.monotonic() - started_at
+
+    WriteLog()
+
 
+def WriteLog():
     # Not safe at all! Multiple processes of this script may be running
     # But, most of the time, it's fine…
     with Path("~/transmission-done.log.json").expanduser().open("a") as fp:
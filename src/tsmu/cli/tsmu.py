@@ -9,32 +9,43 @@ import json
 import os
 import pathlib
 import shlex
-import shutil
-import subprocess
 import sys
 import time
 from pathlib import Path
 from pprint import pprint  # NOQA
 from shlex import quote as shquote
-from typing import Any, Callable, Dict, Final, Generator, List, Optional, Set
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Final,
+    Generator,
+    List,
+    Optional,
+    Set,
+)
 
 import click
-import pygments
-import pygments.formatters.terminal
-import pygments.lexers
-import transmissionrpc
-import transmissionrpc.utils
+
+from tsmu.util import MoveTorrentsData, ParseRanges, RenameTorrentsData
+
+if TYPE_CHECKING:
+    import transmissionrpc
 
 
 def ConnectToTransmission() -> transmissionrpc.Client:
     """Connect to transmission using current user's settings."""
+    from tsmu.rpctrace import NewTransmissionClient
+
     settings_file_path = (
         Path(click.get_app_dir("transmission-daemon"), "settings.json").expanduser().resolve()
     )
     settings = json.load(open(settings_file_path))
 
     host, port, username, password = "localhost", settings["rpc-port"], None, None
-    tc = transmissionrpc.Client(host, port, username, password)
+    tc = NewTransmissionClient(host, port, username, password)
     tc.timeout = 90  # Increase timeout to 90s
     return tc
 
@@ -303,6 +314,10 @@ def _filter(
         ids_str = [str(t["id"]) for t in merged]
         click.echo(",".join(ids_str))
     else:  # full JSON
+        import pygments
+        import pygments.formatters.terminal
+        import pygments.lexers
+
         jd = prettyjson(merged, indent=2)
         click.echo(
             pygments.highlight(
@@ -311,9 +326,29 @@ def _filter(
         )
 
 
-@click.group()
-def cli() -> None:
-    pass
+class Group(click.Group):
+    def parse_args(self, ctx: click.Context, args: List[str]) -> List[str]:
+        # --profile's PATH is optional, so in `tsmu --profile fpd` fpd isn't a PATH
+        if len(args) >= 2 and args[0] == "--profile" and args[1] in self.commands:
+            args = ["--profile="] + args[1:]
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=Group)
+@click.option(
+    "--profile",
+    "profile_path",
+    is_flag=False,
+    flag_value="",
+    default=None,
+    metavar="[PATH]",
+    help="Profile the command, writing pstats, or stacks if PATH is *.collapsed",
+)
+def cli(profile_path: str | None = None) -> None:
+    if profile_path is not None:
+        from tsmu.profiling import StartProfiling
+
+        StartProfiling(Path(profile_path) if profile_path else None)
 
 
 @cli.command("dump")
@@ -436,6 +471,7 @@ def fp(
     default=True,
     help="Dump torrents and metadata using torrent names, otherwise info hash",
 )
+@click.option("--archive", is_flag=True, help="Dump into a single .dump.tar instead")
 @click.option(
     "-c",
     "--complete",
@@ -449,9 +485,12 @@ def fpd(
     ids: bool = False,
     include_files: bool = False,
     names: bool = True,
+    archive: bool = False,
     complete: InterpretedPercentDone = InterpretedPercentDone.unspecified,
 ) -> None:
-    """Filter by path, dump torrent information. Case sensitive. Path should be absolute."""
+    """Filter by path, dump torrent information. Case sensitive. Path should be absolute.
+
+    Torrents are also kept in the torrent store, ~/readded-torrents."""
 
     def TorrentPathFilterPredicate(
         s: str,
@@ -492,49 +531,23 @@ def fpd(
     fp = functools.partial(TorrentPathFilterPredicate, filter_string, pd=complete)
     _filter(fp, include_files, field_names=field_names, action=DumpAction)
 
-    dump_directory = filter_string_path / f"{filter_string_path.name}.dump"
-    dump_directory.mkdir(parents=True, exist_ok=True)
-    print(f"Dumping into {dump_directory}")
-
-    for ti in dumped:
-        DumpTorrentMetadata(ti, dump_directory, use_name=names)
-        print(ti["name"])
+    from tsmu.metastore import TorrentStore
 
+    store = TorrentStore()
+    store.PutMany(dumped)
+    infohashes = [ti["hash"] for ti in dumped]
 
-def DumpTorrentMetadata(
-    torrent_info: TorrentInformation, output_path: Path, use_name: bool = False
-) -> Path:
-    assert "torrentFile" in torrent_info
-    ti = torrent_info.copy()
-
-    for unnecessary_attr in {"id", "downloadDir", "percentDone"}:
-        del ti[unnecessary_attr]
-
-    name = ti["name"]
-    transmission_torrent_file = ti["torrentFile"]
-    hash = ti["hash"]
-
-    # TODO: make sure name is filesystem-safe
-    if use_name:
-        filename_base = name
+    if archive:
+        archive_path = filter_string_path / f"{filter_string_path.name}.dump.tar"
+        print(f"Dumping into {archive_path}")
+        store.Export(infohashes, archive_path, use_name=names)
     else:
-        filename_base = hash
-
-    dest_torrent_filename = filename_base + ".torrent"
-    metadata_filename = filename_base + ".json"
+        dump_directory = filter_string_path / f"{filter_string_path.name}.dump"
+        print(f"Dumping into {dump_directory}")
+        store.Checkout(infohashes, dump_directory, use_name=names)
 
-    # Fix filename
-    ti["torrentFile"] = dest_torrent_filename
-
-    # TODO: permissions may be too restrictive
-    dest_torrent_full_path = Path(
-        shutil.copy2(transmission_torrent_file, output_path / dest_torrent_filename)
-    )
-
-    with Path(output_path / metadata_filename).open("w") as fp:
-        fp.write(json.dumps(ti))
-
-    return dest_torrent_full_path
+    for ti in dumped:
+        print(ti["name"])
 
 
 @cli.command("ffl")
@@ -593,14 +606,353 @@ def incomplete_files_cli(torrent_id: int, parents: bool) -> None:
         print("rm -rf " + str(p))
 
 
+@cli.command("move")
+@click.argument("location", required=False)
+@click.option("-t", "--torrent", "tids", help="transmission torrent ids, ranges or infohashes")
+@click.option(
+    "--stdin",
+    "from_stdin",
+    is_flag=True,
+    help='Read "<id> <location>" pairs, one per line, from stdin',
+)
+@click.option("--batch-size", default=50, show_default=True, help="Max torrents per RPC call")
+@click.option("--pause", default=1.0, show_default=True, help="Seconds to wait between calls")
+@click.option(
+    "--rename/--no-rename",
+    default=False,
+    help="Rename data ourselves rather than having transmission move it, same device only",
+)
+@click.option("--dry-run/--no-dry-run", default=True)
+def move_cli(
+    location: str | None,
+    tids: str | None = None,
+    from_stdin: bool = False,
+    batch_size: int = 50,
+    pause: float = 1.0,
+    rename: bool = False,
+    dry_run: bool = True,
+) -> None:
+    """Move torrent data, batching torrents headed to the same directory.
+
+    Either pass -t with a LOCATION to move those torrents there, or --stdin
+    to read per-torrent locations (e.g. from misc/fix-hot.sh). With --rename,
+    torrents are stopped, renamed into place and started again, without a
+    recheck.
+
+    This command will not do anything unless --no-dry-run is passed."""
+    moves: List[tuple[str, Path]] = []
+    if tids:
+        if not location:
+            raise click.UsageError("LOCATION is required with -t")
+        moves += [(tid, Path(location).absolute()) for tid in ParseRanges(tids)]
+    if from_stdin:
+        for line in sys.stdin.readlines():
+            line = line.strip()
+            if not line or line[0] == "#":
+                continue
+            # e.g. "1,2 <location>", from `tsmu fn --ids`
+            tid, tid_location = line.split(maxsplit=1)
+            moves += [(t, Path(tid_location)) for t in ParseRanges(tid)]
+
+    for tid, tid_location in moves:
+        print(f"{tid} -> {tid_location}")
+
+    if dry_run:
+        print("In dry-run mode, not doing anything. Re-run w/ --no-dry-run to take action.")
+        return
+
+    tc = ConnectToTransmission()
+    if rename:
+        renamed_count = RenameTorrentsData(
+            moves, tc=tc, batch_size=batch_size, pause=pause, statusCb=print
+        )
+        print(f"Renamed {renamed_count} of {len(moves)} torrents")
+        return
+    call_count = MoveTorrentsData(moves, tc=tc, batch_size=batch_size, pause=pause)
+    print(f"Moved {len(moves)} torrents in {call_count} calls")
+
+
+@cli.command("locate")
+@click.argument("roots", nargs=-1, required=True, type=click.Path(exists=True, path_type=Path))
+@click.option("-t", "--type", "entry_type", type=click.Choice(["f", "d"]), help="Files or dirs")
+@click.option(
+    "--inventory",
+    "use_inventory",
+    is_flag=True,
+    help="Use the archive inventory, as kept current by `tsmu inventory --watch`",
+)
+@click.option("--rescan", is_flag=True, help="With --inventory, rescan ROOTS first")
+def locate_cli(
+    roots: tuple[Path, ...],
+    entry_type: str | None = None,
+    use_inventory: bool = False,
+    rescan: bool = False,
+) -> None:
+    """Find where names read from stdin live under ROOTS.
+
+    Prints "<name>\\t<parent directory>" for each name found exactly once;
+    names not found, or found more than once, are reported on stderr."""
+    from tsmu.fileindex import FilenameIndex
+
+    names = [line.rstrip("\n") for line in sys.stdin if line.strip()]
+    if use_inventory:
+        from tsmu.inventory import CurrentInventory
+
+        index = CurrentInventory(roots, rescan=rescan).FilenameIndex(roots)
+    else:
+        index = FilenameIndex.Build(roots)
+    is_dir = None if entry_type is None else entry_type == "d"
+    for name, paths in index.Resolve(names, is_dir=is_dir).items():
+        if len(paths) == 1:
+            print(f"{name}\t{paths[0].parent.absolute()}")
+        elif not paths:
+            print(f"Unable to find {name}", file=sys.stderr)
+        else:
+            print(f"Found more than 1 location for {name}", file=sys.stderr)
+
+
+@cli.command("inventory")
+@click.argument("roots", nargs=-1, type=click.Path(exists=True, path_type=Path))
+@click.option("--full", is_flag=True, help="List every directory, even if unchanged")
+@click.option("--watch", is_flag=True, help="Then keep it current with inotify, until killed")
+@click.option("--batch-window", default=1.0, show_default=True, help="Seconds to gather events")
+@click.option(
+    "--export",
+    "export_fp",
+    type=click.File("wb"),
+    help="Then write a file index of ROOTS here, - for stdout, e.g. for copy-from",
+)
+def inventory_cli(
+    roots: tuple[Path, ...],
+    full: bool = False,
+    watch: bool = False,
+    batch_window: float = 1.0,
+    export_fp: BinaryIO | None = None,
+) -> None:
+    """Refresh the archive inventory of ROOTS, by default [inventory] roots in tsmu.toml."""
+    from tsmu.inventory import DefaultRoots, Inventory, InventoryWatcher
+
+    roots = roots if roots else tuple(DefaultRoots())
+    inventory = Inventory()
+    start = time.monotonic()
+    statistics = inventory.Scan(roots, full=full)
+    click.echo(
+        f"Listed {statistics.listed} directories ({statistics.entries} entries),"
+        f" skipped {statistics.skipped} unchanged, in {time.monotonic() - start:.1f}s",
+        err=export_fp is not None,
+    )
+
+    if export_fp:
+        inventory.FilenameIndex(roots).Write(export_fp)
+
+    if watch:
+        import tsmu.log
+
+        tsmu.log.SetupInteractiveScriptLogging()
+        InventoryWatcher(inventory, roots, batch_window=batch_window).Run()
+
+
+@cli.command("trash")
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True, path_type=Path))
+def trash_cli(paths: tuple[Path, ...]) -> None:
+    """Move PATHS to their volume's trash, for `tsmu trashd` to delete."""
+    from tsmu.trash import Trash
+
+    for path in paths:
+        print(f"{path} -> {Trash(path)}")
+
+
+@cli.command("trashd")
+@click.argument("volumes", nargs=-1, type=click.Path(exists=True, path_type=Path))
+@click.option("--bytes-per-second", type=int, help="I/O budget for freeing data")
+@click.option("--unlinks-per-second", type=int, help="I/O budget for unlinks")
+@click.option("--once", is_flag=True, help="Empty the trash once and exit")
+def trashd_cli(
+    volumes: tuple[Path, ...],
+    bytes_per_second: int | None = None,
+    unlinks_per_second: int | None = None,
+    once: bool = False,
+) -> None:
+    """Empty the trash of VOLUMES, by default [trash] volumes in tsmu.toml, in the background."""
+    import tsmu.log
+    from tsmu.config import LoadConfiguration
+    from tsmu.trash import ConfiguredTrashDirectories, TrashDirectory, TrashEmptier
+
+    tsmu.log.SetupInteractiveScriptLogging()
+    config = LoadConfiguration().get("trash", {})
+    trash_dirs = [TrashDirectory(v) for v in volumes] if volumes else ConfiguredTrashDirectories()
+    if not trash_dirs:
+        raise click.UsageError("Pass VOLUMES, or set [trash] volumes in tsmu.toml")
+    emptier = TrashEmptier(
+        trash_dirs,
+        bytes_per_second=bytes_per_second or config.get("bytes-per-second", 256 * 1024 * 1024),
+        unlinks_per_second=unlinks_per_second or config.get("unlinks-per-second", 200),
+    )
+    if once:
+        print(f"Freed {emptier.EmptyOnce()} bytes")
+        return
+    emptier.Run()
+
+
+@cli.command("rpc-trace")
+@click.argument(
+    "trace_paths", nargs=-1, required=True, type=click.Path(exists=True, path_type=Path)
+)
+@click.option(
+    "--command", "command_filter", help="Only calls made by this command, e.g. 'tsmu fpd'"
+)
+def rpc_trace_cli(trace_paths: tuple[Path, ...], command_filter: str | None = None) -> None:
+    """Summarize RPC trace files written with TSMU_RPC_TRACE=path."""
+    from tsmu.rpctrace import PrintSummary, ReadTrace
+
+    calls = [c for p in trace_paths for c in ReadTrace(p)]
+    if command_filter:
+        calls = [c for c in calls if c.command == command_filter]
+    PrintSummary(calls, sys.stdout)
+
+
+@cli.command("copy-from")
+@click.option(
+    "--location",
+    "location_specs",
+    multiple=True,
+    help="host:/path, or local /path, to look in, in order; by default [copy-from] locations",
+)
+@click.option(
+    "--index",
+    "index_specs",
+    multiple=True,
+    help="host=file, read host's index from a file made by inventory --export; =file if local",
+)
+@click.option("--per-device", default=2, show_default=True, help="Copies per source/dest device")
+@click.option("--parallel", default=4, show_default=True, help="Copies at once, in total")
+@click.option("--bwlimit", type=int, help="KiB/s for all copies together")
+@click.option("--dry-run/--no-dry-run", default=True)
+def copy_from_cli(
+    location_specs: tuple[str, ...],
+    index_specs: tuple[str, ...],
+    per_device: int = 2,
+    parallel: int = 4,
+    bwlimit: int | None = None,
+    dry_run: bool = True,
+) -> None:
+    """Copy data for incomplete torrents from other hosts that have it.
+
+    Each host's file index is fetched once, then every incomplete torrent is
+    looked for in it. Torrents are stopped, copied, then verified and started;
+    copies run in parallel. Interrupted runs are resumed by the next one.
+
+    This command will not do anything unless --no-dry-run is passed."""
+    import tsmu.log
+    from tsmu.remote import (
+        ConfiguredLocations,
+        RemoteLocation,
+        RemoteLocator,
+        RsyncSource,
+    )
+    from tsmu.transfers import TransferJob, TransferScheduler
+
+    tsmu.log.SetupInteractiveScriptLogging()
+    locations = (
+        [RemoteLocation.Parse(spec) for spec in location_specs]
+        if location_specs
+        else ConfiguredLocations()
+    )
+    index_files = {}
+    for spec in index_specs:
+        host, _, index_path = spec.partition("=")
+        index_files[host] = Path(index_path)
+
+    tc = ConnectToTransmission()
+    incomplete = [
+        t
+        for t in tc.get_torrents(
+            arguments=["id", "name", "hashString", "downloadDir", "percentDone"]
+        )
+        if t.percentDone != 1
+    ]
+    locator = RemoteLocator(locations, index_files)
+    locator.Fetch()
+
+    def VerifyAndStart(job: TransferJob) -> None:
+        tc.verify_torrent(job.job_id)
+        tc.start_torrent(job.job_id)
+
+    scheduler = TransferScheduler(
+        per_device=per_device,
+        max_parallel=parallel,
+        bwlimit=bwlimit,
+        before_copy=lambda job: tc.stop_torrent(job.job_id),
+        after_copy=VerifyAndStart,
+    )
+    for t in incomplete:
+        found = locator.Locate(t.name)
+        if not found:
+            print(f"Cannot find {t.name}")
+            continue
+        host, path_on_remote = found
+        job = TransferJob(
+            t.hashString, RsyncSource(host, path_on_remote), f"{Path(t.downloadDir) / t.name}/"
+        )
+        print(f"{job.source} -> {job.destination}")
+        if not dry_run:
+            scheduler.Add(job)
+
+    if dry_run:
+        print("In dry-run mode, not doing anything. Re-run w/ --no-dry-run to take action.")
+        return
+
+    counts = scheduler.Run()
+    print(" ".join(f"{state}={count}" for state, count in sorted(counts.items())))
+
+
+@cli.command("hookd")
+@click.option("--socket", "socket_path", type=click.Path(path_type=Path), help="Unix socket path")
+@click.option("--batch-window", default=0.25, show_default=True, help="Seconds to gather events")
+@click.option("--batch-size", default=100, show_default=True)
+def hookd_cli(
+    socket_path: Path | None = None, batch_window: float = 0.25, batch_size: int = 100
+) -> None:
+    """Run the daemon behind transmission-done-client."""
+    import tsmu.hookd
+    import tsmu.log
+
+    tsmu.log.SetupInteractiveScriptLogging()
+    socket_path = socket_path if socket_path else tsmu.hookd.SocketPath()
+    tsmu.hookd.HookDaemon(socket_path, batch_window=batch_window, batch_size=batch_size).Run()
+
+
+def PrintReAddFailures(
+    readds: List[tuple[str, Path, Path]], results: List[BaseException | None]
+) -> None:
+    for (hash, _, download_dir), result in zip(readds, results):
+        if result is not None:
+            print(f"Failed to readd hash={hash} downloadDir={download_dir}: {result!r}")
+    failed_count = sum(1 for r in results if r is not None)
+    print(f"Readded {len(readds) - failed_count} of {len(readds)} torrents")
+
+
 @cli.command("readd-stopped")
 @click.argument("filter_string")
 @click.option("--dry-run/--no-dry-run", default=True)
 @click.option("--rsync-from")
+@click.option("--concurrency", default=8, show_default=True, help="Re-adds in flight at once")
+@click.option(
+    "--verify-queue", default=4, show_default=True, help="Torrents to keep checking/check-pending"
+)
+@click.option(
+    "--max-io-pressure",
+    default=40.0,
+    show_default=True,
+    help="Hold off while /proc/pressure/io's avg10 is above this",
+)
 def readd_stopped_cli(
     filter_string: str,
     dry_run: bool = True,
     rsync_from: Path | None = None,
+    concurrency: int = 8,
+    verify_queue: int = 4,
+    max_io_pressure: float = 40.0,
 ) -> None:
     """Readd all torrents that have been stopped because disk was full.
 
@@ -611,10 +963,13 @@ def readd_stopped_cli(
     --rsync-from will print an rsync command attempting to copy the same
     files from a specified directory
 
+    Re-adds are paced to keep --verify-queue torrents verifying, backing off
+    while I/O pressure is high.
+
     This command will not do anything unless --no-dry-run is passed."""
-    READD_FOLDER = Path("~/readded-torrents/").expanduser()
-    READD_FOLDER.mkdir(exist_ok=True)
+    from tsmu.metastore import TorrentStore
 
+    store = TorrentStore()
     tc = ConnectToTransmission()
     rows = []
     for t in tc.get_torrents():
@@ -639,6 +994,7 @@ def readd_stopped_cli(
                 }
             )
 
+    readds: List[tuple[str, Path, Path]] = []
     for row in rows:
         name, hash, download_dir, magnet_link, transmission_torrent_file = (
             row["name"],
@@ -656,7 +1012,7 @@ def readd_stopped_cli(
         # if '202112.51' not in download_dir:
         if filter_string != "all" and filter_string not in download_dir:
             continue
-        backed_up_torrent_file = DumpTorrentMetadata(row, READD_FOLDER)
+        backed_up_torrent_file = store.Put(row)
         # copied_file = shutil.copy2(transmission_torrent_file, READD_FOLDER)
         # metadata_file = READD_FOLDER / (hash + ".json")
         # with open(metadata_file, 'w') as fp:
@@ -675,20 +1031,25 @@ Readding hash={hash},
          torrentFile={backed_up_torrent_file}""".strip()
             print(out)
 
-        if not dry_run:
-            while True:
-                if os.getloadavg()[0] > 3.0:
-                    print("Load is too high, waiting…")
-                    time.sleep(5)
-                    continue
-                tc.remove_torrent(hash)
-                tc.add_torrent(str(backed_up_torrent_file), download_dir=download_dir)
-                break
+        readds.append((hash, backed_up_torrent_file, Path(download_dir)))
 
     if dry_run:
         print("In dry-run mode, not doing anything. Re-run w/ --no-dry-run to take action.")
+        return
 
-        # print(name, download_dir, backed_up_torrent_file)
+    import asyncio
+
+    from tsmu.aiorpc import ConnectToTransmissionAsync, ReAddTorrents
+    from tsmu.pacing import PacingController
+
+    async def ReAddAll():
+        async with ConnectToTransmissionAsync(concurrency=concurrency) as client:
+            pacing = PacingController(
+                client, verify_queue=verify_queue, max_io_pressure=max_io_pressure, statusCb=print
+            )
+            return await ReAddTorrents(client, readds, admit=pacing.Admit)
+
+    PrintReAddFailures(readds, asyncio.run(ReAddAll()))
 
 
 @cli.command("rarbg-trackers")
@@ -720,14 +1081,19 @@ def rarbg_trackers_cli() -> None:
 
 @cli.command()
 @click.option("--dry-run/--no-dry-run", default=True)
-def fix_fa_corruption(dry_run: bool = True) -> None:
+@click.option("--concurrency", default=8, show_default=True, help="Re-adds in flight at once")
+@click.option("--rescan", is_flag=True, help="Rescan the archive inventory first")
+def fix_fa_corruption(dry_run: bool = True, concurrency: int = 8, rescan: bool = False) -> None:
     tc = ConnectToTransmission()
+    readds: List[tuple[str, Path, Path]] = []
     rows = []
     downloadDirs = set()
     screwed_up_torrents = []
 
-    READD_FOLDER = Path("~/readded-torrents/").expanduser()
-    READD_FOLDER.mkdir(exist_ok=True)
+    from tsmu.inventory import CurrentInventory
+    from tsmu.metastore import TorrentStore
+
+    store = TorrentStore()
 
     fields = ["torrentFile", "magnetLink", "hashString"]
     fields += BASE_FIELD_NAMES
@@ -738,25 +1104,20 @@ def fix_fa_corruption(dry_run: bool = True) -> None:
             if t.downloadDir == "/archive/torrents/rarbg-1080p/202201.02.incomplete":
                 screwed_up_torrents.append(t)
 
+    # The inventory, rather than an fdfind for every torrent
+    search_root = Path("/archive/torrents/revtt-1080p")
+    index = CurrentInventory([search_root], rescan=rescan).FilenameIndex([search_root])
+
     max_count = 25
     count = 0
     for t in screwed_up_torrents:
         if count > max_count:
-            return
+            break
 
         name = shlex.quote(t.name)
-        if name.endswith(".mkv"):
-            cmd = f"cd /archive/torrents/revtt-1080p/ && fdfind -F {name}"
-        else:
-            cmd = f"cd /archive/torrents/revtt-1080p/ && fdfind -F -td {name}"
-        rv = subprocess.run(
-            cmd,
-            capture_output=True,
-            shell=True,
-            universal_newlines=True,
-        )
-        if not rv or not rv.stdout:
-            print(f"Skipping {name} ,{cmd=}")
+        locations = index.Lookup(t.name, is_dir=None if t.name.endswith(".mkv") else True)
+        if not locations:
+            print(f"Skipping {name}, not found under {search_root}")
             continue
 
         skip_revtt = False
@@ -765,21 +1126,18 @@ def fix_fa_corruption(dry_run: bool = True) -> None:
 
         count = count + 1
 
-        locations = [line.strip() for line in rv.stdout.splitlines()]
-
         if len(locations) == 1:
 
-            loc = Path("/archive/torrents/revtt-1080p") / locations[0]
-            loc = loc.parent
+            loc = locations[0].parent
             # print(name, loc, t.downloadDir)
             if loc == t.downloadDir:
                 print(name)
 
         actual_location = None
         for loc in locations:
-            if "02.incomplete" in loc:
+            if "02.incomplete" in str(loc):
                 continue
-            if skip_revtt and "revtt" in loc:
+            if skip_revtt and "revtt" in str(loc):
                 continue
             actual_location = loc
 
@@ -788,7 +1146,6 @@ def fix_fa_corruption(dry_run: bool = True) -> None:
             print()
             continue
 
-        actual_location = Path("/archive/torrents/revtt-1080p") / actual_location
         actual_location = actual_location.parent
 
         print(
@@ -809,15 +1166,24 @@ def fix_fa_corruption(dry_run: bool = True) -> None:
             "percentDone": t.percentDone,
             "torrentFile": t.torrentFile,
         }
-        backed_up_torrent_file = DumpTorrentMetadata(torrent_info, READD_FOLDER)
+        backed_up_torrent_file = store.Put(torrent_info)
 
-        if not dry_run:
-            tc.remove_torrent(t.hashString)
-            tc.add_torrent(str(backed_up_torrent_file), download_dir=actual_location)
+        readds.append((t.hashString, backed_up_torrent_file, actual_location))
 
         with Path("~/fix-fa-corruption.sh").expanduser().open("a") as fp:
             fp.write(f"trash {t.downloadDir}/{name}\n")
 
+    if not dry_run:
+        import asyncio
+
+        from tsmu.aiorpc import ConnectToTransmissionAsync, ReAddTorrents
+
+        async def ReAddAll():
+            async with ConnectToTransmissionAsync(concurrency=concurrency) as client:
+                return await ReAddTorrents(client, readds)
+
+        PrintReAddFailures(readds, asyncio.run(ReAddAll()))
+
     # pprint(downloadDirs)
 
 
@@ -6,25 +6,42 @@ from pprint import pprint  # NOQA
 
 import click
 
-# Logging
-import tsmu.log
 from tsmu.util import ConnectToTransmission, ParseRanges, TransmissionId, VerifyTorrent
 
-logger = tsmu.log.SetupInteractiveScriptLogging()
-
 
 @click.command()
 @click.option("-t", "--torrent", "tid", help="transmission torrent id or infohash", required=True)
 @click.option("-v", "--verbose", default=False, is_flag=True)
-def cli(tid: str, verbose: bool = False):
+@click.option(
+    "--profile",
+    "profile_path",
+    is_flag=False,
+    flag_value="",
+    default=None,
+    metavar="[PATH]",
+    help="Profile, writing pstats, or stacks if PATH is *.collapsed",
+)
+def cli(tid: str, verbose: bool = False, profile_path: str | None = None):
     """Verify a torrent in transmission, waiting until verification is complete."""
+    if profile_path is not None:
+        from tsmu.profiling import StartProfiling
+
+        StartProfiling(Path(profile_path) if profile_path else None)
+
+    if verbose:
+        # Logging, only needed when verbose
+        import tsmu.log
+
+        logger = tsmu.log.SetupInteractiveScriptLogging()
+
+    tc = ConnectToTransmission()
     any_fail = False
     for r in ParseRanges(tid):
         if verbose:
-            rv = VerifyTorrent(r, statusCb=logger.info)
+            rv = VerifyTorrent(r, tc=tc, statusCb=logger.info)
             print()  # print explicit newline
         else:
-            rv = VerifyTorrent(r)
+            rv = VerifyTorrent(r, tc=tc)
         if not rv:
             any_fail = True
     sys.exit(0) if not any_fail else sys.exit(1)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Inspect and prune the tsmu-workers job queues, reading Redis directly.
+
+dramatiq's RedisBroker keeps, per queue:
+
+    dramatiq:<queue>         list of message ids waiting to be fetched
+    dramatiq:<queue>.msgs    hash of message id -> message, for waiting *and*
+                             fetched-but-unacked messages
+    dramatiq:<queue>.DQ      the same for delayed messages (retries)
+    dramatiq:<queue>.XQ      sorted set of dead-lettered message ids
+"""
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Final
+
+import click
+
+# Upper bounds, in seconds, for the message age histogram
+AGE_BUCKETS: Final[list[tuple[str, float]]] = [
+    ("<1m", 60),
+    ("<10m", 10 * 60),
+    ("<1h", 60 * 60),
+    ("<1d", 24 * 60 * 60),
+    (">=1d", float("inf")),
+]
+
+# Only delete a message if it's still waiting, i.e. a worker hasn't fetched it in the meantime
+PURGE_WAITING_MESSAGE_SCRIPT: Final[str] = """
+if redis.call("lrem", KEYS[1], 0, ARGV[1]) > 0 then
+    redis.call("hdel", KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+@dataclass
+class QueuedMessage:
+    queue_name: str
+    message_id: str
+    waiting: bool  # False if a worker has fetched it and is holding/processing it
+    message: dict[str, Any]
+
+    @property
+    def actor_name(self) -> str:
+        return self.message.get("actor_name", "?")
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.message.get("message_timestamp", 0) / 1000
+
+    @property
+    def torrent(self) -> tuple[str, str]:
+        """(hash or id, name) of the torrent our actors were sent."""
+        args = self.message.get("args", [])
+        tid = str(args[0]) if len(args) > 0 else "?"
+        name = str(args[1]) if len(args) > 1 else "?"
+        return tid, name
+
+
+def GetQueuedMessages(broker) -> list[QueuedMessage]:
+    """All messages in every queue (including delay queues), in two round-trips."""
+    client, namespace = broker.client, broker.namespace
+
+    queue_names = sorted(
+        k.decode()[len(namespace) + 1 : -len(".msgs")]
+        for k in client.scan_iter(match=f"{namespace}:*.msgs")
+        if not k.decode().endswith(".XQ.msgs")
+    )
+
+    pipe = client.pipeline(transaction=False)
+    for queue_name in queue_names:
+        pipe.lrange(f"{namespace}:{queue_name}", 0, -1)
+        pipe.hgetall(f"{namespace}:{queue_name}.msgs")
+    results = pipe.execute()
+
+    messages = []
+    for i, queue_name in enumerate(queue_names):
+        waiting_ids = set(results[2 * i])
+        for message_id, encoded in results[2 * i + 1].items():
+            try:
+                message = json.loads(encoded)
+            except ValueError:
+                message = {}
+            messages.append(
+                QueuedMessage(queue_name, message_id.decode(), message_id in waiting_ids, message)
+            )
+    return messages
+
+
+def GetDeadLetterCounts(broker, queue_names: set[str]) -> dict[str, int]:
+    client, namespace = broker.client, broker.namespace
+    canonical_names = sorted({q.removesuffix(".DQ") for q in queue_names})
+    pipe = client.pipeline(transaction=False)
+    for queue_name in canonical_names:
+        pipe.zcard(f"{namespace}:{queue_name}.XQ")
+    return dict(zip(canonical_names, pipe.execute()))
+
+
+def _FormatAge(seconds: float) -> str:
+    """
+    >>> _FormatAge(42)
+    '42s'
+    >>> _FormatAge(3 * 60 * 60 + 5)
+    '3h0m'
+    """
+    seconds = int(max(seconds, 0))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 60 * 60:
+        return f"{seconds // 60}m{seconds % 60}s"
+    if seconds < 24 * 60 * 60:
+        return f"{seconds // 3600}h{(seconds % 3600) // 60}m"
+    return f"{seconds // 86400}d{(seconds % 86400) // 3600}h"
+
+
+def _SetupBroker():
+    from tsmu.broker import SetupBroker
+
+    return SetupBroker()
+
+
+@click.group()
+def cli() -> None:
+    pass
+
+
+@cli.command("status")
+@click.option("--limit", default=100, show_default=True, help="Messages to list per queue, 0=all")
+def status_cli(limit: int = 100) -> None:
+    """Print backlog, message ages and the torrents pending in each queue."""
+    broker = _SetupBroker()
+    messages = GetQueuedMessages(broker)
+    queue_names = {m.queue_name for m in messages}
+    dead_letter_counts = GetDeadLetterCounts(broker, queue_names)
+
+    for queue_name in sorted(queue_names | set(dead_letter_counts)):
+        in_queue = sorted(
+            (m for m in messages if m.queue_name == queue_name), key=lambda m: m.age, reverse=True
+        )
+        waiting = [m for m in in_queue if m.waiting]
+        click.echo(
+            f"{queue_name}: waiting={len(waiting)} fetched={len(in_queue) - len(waiting)}"
+            f" dead={dead_letter_counts.get(queue_name, 0)}"
+        )
+        if not in_queue:
+            continue
+
+        click.echo(f"  oldest={_FormatAge(in_queue[0].age)}")
+        age_counts = {label: 0 for label, _ in AGE_BUCKETS}
+        for m in in_queue:
+            for label, upper_bound in AGE_BUCKETS:
+                if m.age < upper_bound:
+                    age_counts[label] += 1
+                    break
+        click.echo("  ages: " + " ".join(f"{label}={c}" for label, c in age_counts.items()))
+
+        actor_counts: dict[str, int] = {}
+        for m in in_queue:
+            actor_counts[m.actor_name] = actor_counts.get(m.actor_name, 0) + 1
+        click.echo("  actors: " + " ".join(f"{a}={c}" for a, c in sorted(actor_counts.items())))
+
+        for m in in_queue if limit == 0 else in_queue[:limit]:
+            tid, name = m.torrent
+            state = "waiting" if m.waiting else "fetched"
+            click.echo(f"    {_FormatAge(m.age):>7} {state} {m.actor_name} {tid} {name}")
+        if limit and len(in_queue) > limit:
+            click.echo(f"    … {len(in_queue) - limit} more")
+
+
+@cli.command("purge")
+@click.option("--actor", "actor_name", help="Only messages for this actor, e.g. ComputeXxh")
+@click.option("--hash", "infohash", help="Only messages for this torrent infohash (or id)")
+@click.option("--dry-run/--no-dry-run", default=True)
+def purge_cli(
+    actor_name: str | None = None, infohash: str | None = None, dry_run: bool = True
+) -> None:
+    """Remove waiting messages matching an actor and/or torrent.
+
+    Messages that a worker has already fetched are left alone.
+
+    This command will not do anything unless --no-dry-run is passed."""
+    if not actor_name and not infohash:
+        raise click.UsageError("Pass --actor and/or --hash; use flush to remove everything")
+
+    broker = _SetupBroker()
+    matched = [
+        m
+        for m in GetQueuedMessages(broker)
+        if m.waiting
+        and (not actor_name or m.actor_name == actor_name)
+        and (not infohash or m.torrent[0].lower() == infohash.lower())
+    ]
+    for m in matched:
+        tid, name = m.torrent
+        click.echo(f"{m.queue_name} {m.actor_name} {tid} {name}")
+
+    if dry_run:
+        click.echo("In dry-run mode, not doing anything. Re-run w/ --no-dry-run to take action.")
+        return
+
+    purge_script = broker.client.register_script(PURGE_WAITING_MESSAGE_SCRIPT)
+    pipe = broker.client.pipeline(transaction=False)
+    for m in matched:
+        queue_key = f"{broker.namespace}:{m.queue_name}"
+        purge_script(keys=[queue_key, queue_key + ".msgs"], args=[m.message_id], client=pipe)
+    purged_count = sum(pipe.execute())
+    click.echo(f"Purged {purged_count} of {len(matched)} messages")
+
+
+@cli.command("flush")
+def flush_cli() -> None:
+    """Flush all pending jobs in tsmu-workers job queue."""
+    from tsmu.broker import FlushAll
+
+    FlushAll(_SetupBroker())
+
+
+if __name__ == "__main__":
+    cli()
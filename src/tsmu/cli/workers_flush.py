@@ -1,14 +1,13 @@
 #!/usr/bin/env python3
 
-from tsmu.workers import SetupBroker
+from tsmu.broker import FlushAll, SetupBroker
 
 
 def main() -> None:
     """
     Flush all pending jobs in tsmu-workers job queue.
     """
-    b = SetupBroker()
-    b.flush_all()
+    FlushAll(SetupBroker())
 
 
 if __name__ == "__main__":
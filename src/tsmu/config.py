@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+import functools
+from pathlib import Path
+from typing import Any
+
+import xdg.BaseDirectory
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+
+@functools.cache
+def LoadConfiguration() -> dict[str, Any]:
+    """Load tsmu.toml from the user's XDG config directory, e.g. ~/.config/tsmu/tsmu.toml.
+
+    Returns an empty configuration if there isn't one.
+    """
+    config_dir = xdg.BaseDirectory.load_first_config("tsmu")
+    if not config_dir or not (Path(config_dir) / "tsmu.toml").exists():
+        return {}
+    config_path = Path(config_dir) / "tsmu.toml"
+    with config_path.open("rb") as fp:
+        parsed_toml = tomllib.load(fp)
+    return parsed_toml
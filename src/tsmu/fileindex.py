@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Index of file and directory names under some roots, for finding where a
+torrent's data actually lives.
+
+Searching the tree once per torrent (e.g. with fdfind) walks the whole tree
+again for every lookup. FilenameIndex walks it once, scanning directories in
+parallel with os.scandir, and maps each basename to every path it's found
+at; looking names up is then a dictionary join.
+
+    index = FilenameIndex.Build([Path("/archive/torrents/revtt-1080p")])
+    for name, paths in index.Resolve(t.name for t in torrents).items():
+        ...
+
+An index can be serialized with Write and Read back elsewhere, e.g. to
+locate data on another host without walking its tree over ssh.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import gzip
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable
+
+
+@dataclass(frozen=True)
+class IndexedPath:
+    path: Path
+    is_dir: bool
+
+
+def _ScanDirectory(directory: str) -> tuple[list[tuple[str, str, bool]], list[str]]:
+    """(name, path, is_dir) for every entry in directory, and its subdirectories."""
+    entries, subdirectories = [], []
+    try:
+        with os.scandir(directory) as it:
+            for de in it:
+                is_dir = de.is_dir(follow_symlinks=False)
+                entries.append((de.name, de.path, is_dir))
+                if is_dir:
+                    subdirectories.append(de.path)
+    except OSError:
+        # Vanished, or not readable; same as fdfind, just skip it
+        pass
+    return entries, subdirectories
+
+
+class FilenameIndex:
+    def __init__(self) -> None:
+        self.by_name: dict[str, list[IndexedPath]] = defaultdict(list)
+
+    @classmethod
+    def Build(cls, roots: Iterable[Path], workers: int = 8) -> FilenameIndex:
+        """Walk roots, scanning up to workers directories at once.
+
+        scandir spends most of its time waiting on the filesystem, so threads
+        overlap well despite the GIL.
+        """
+        index = cls()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {executor.submit(_ScanDirectory, str(r)) for r in roots}
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    entries, subdirectories = future.result()
+                    for name, path, is_dir in entries:
+                        index.by_name[name].append(IndexedPath(Path(path), is_dir))
+                    pending.update(executor.submit(_ScanDirectory, d) for d in subdirectories)
+        return index
+
+    def __len__(self) -> int:
+        return sum(len(paths) for paths in self.by_name.values())
+
+    def Lookup(self, name: str, is_dir: bool | None = None) -> list[Path]:
+        """Paths named name; only directories or only files if is_dir is given."""
+        return sorted(
+            ip.path for ip in self.by_name.get(name, []) if is_dir is None or ip.is_dir == is_dir
+        )
+
+    def Resolve(self, names: Iterable[str], is_dir: bool | None = None) -> dict[str, list[Path]]:
+        """Look up many names at once."""
+        return {name: self.Lookup(name, is_dir) for name in names}
+
+    def Write(self, fp: BinaryIO) -> None:
+        """Serialize to fp, gzipped, as NUL-terminated "d<path>" or "f<path>" records."""
+        with gzip.GzipFile(fileobj=fp, mode="wb", compresslevel=1) as gz:
+            for paths in self.by_name.values():
+                gz.write(
+                    b"".join(
+                        (b"d" if ip.is_dir else b"f") + os.fsencode(ip.path) + b"\0" for ip in paths
+                    )
+                )
+
+    @classmethod
+    def Read(cls, fp: BinaryIO) -> FilenameIndex:
+        """Read an index serialized by Write.
+
+        >>> import io
+        >>> index = FilenameIndex()
+        >>> index.by_name["Show.S01"].append(IndexedPath(Path("/a/Show.S01"), True))
+        >>> buffer = io.BytesIO()
+        >>> index.Write(buffer)
+        >>> FilenameIndex.Read(io.BytesIO(buffer.getvalue())).Lookup("Show.S01", is_dir=True)
+        [PosixPath('/a/Show.S01')]
+        """
+        index = cls()
+        with gzip.GzipFile(fileobj=fp, mode="rb") as gz:
+            for record in gz.read().split(b"\0"):
+                if not record:
+                    continue
+                path = Path(os.fsdecode(record[1:]))
+                index.by_name[path.name].append(IndexedPath(path, record[:1] == b"d"))
+        return index
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+A resident daemon for transmission's --torrent-done-script.
+
+transmission-done-dramatiq starts a Python interpreter, imports dramatiq,
+redis et al. and connects to Redis for every completed torrent. Instead, run
+
+    tsmu hookd
+
+once (e.g. as a systemd user service), and configure
+
+    transmission-remote --torrent-done-script $(which transmission-done-client)
+
+The client only sends transmission's TR_* environment variables over a Unix
+socket. The daemon keeps a warm broker connection, and enqueues completions
+in batches, in one round-trip to Redis, coalescing repeats of the same
+torrent.
+
+The socket is at the same path for the transmission user and the one
+running the daemon, /run/tsmu/hookd.sock unless [hookd] socket in tsmu.toml
+says otherwise, and is group read/writable: put both users in its directory's
+group.
+
+This module only imports the standard library at the top level, as it's also
+imported by transmission-done-client.
+"""
+
+import json
+import logging
+import os
+import queue
+import signal
+import socketserver
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Final, FrozenSet
+
+TRANSMISSION_ENV_VARIABLES: Final[FrozenSet[str]] = frozenset(
+    {
+        "TR_APP_VERSION",
+        "TR_TIME_LOCALTIME",
+        "TR_TORRENT_DIR",
+        "TR_TORRENT_HASH",
+        "TR_TORRENT_ID",
+        "TR_TORRENT_NAME",
+    }
+)
+
+# Seconds the client waits for the daemon to enqueue its event
+CLIENT_TIMEOUT: Final[float] = 30.0
+
+DEFAULT_SOCKET_PATH: Final[str] = "/run/tsmu/hookd.sock"
+
+logger = logging.getLogger(__name__)
+
+
+def SocketPath() -> Path:
+    """Where the daemon listens: $TSMU_HOOKD_SOCKET, [hookd] socket in tsmu.toml, or the default.
+
+    Not per user, as transmission-daemon usually runs as a different user than the daemon.
+    """
+    if socket_path := os.getenv("TSMU_HOOKD_SOCKET"):
+        return Path(socket_path)
+    from tsmu.config import LoadConfiguration
+
+    return Path(LoadConfiguration().get("hookd", {}).get("socket", DEFAULT_SOCKET_PATH))
+
+
+@dataclass
+class PendingEvent:
+    event: dict[str, Any]
+    done: threading.Event = field(default_factory=threading.Event)
+    ok: bool = False
+
+
+class HookDaemon:
+    """Accept completion events over a Unix socket, and enqueue them in batches."""
+
+    def __init__(self, socket_path: Path, batch_window: float = 0.25, batch_size: int = 100):
+        self.socket_path = socket_path
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.pending: queue.Queue[PendingEvent | None] = queue.Queue()
+
+    def Submit(self, event: dict[str, Any]) -> PendingEvent:
+        pe = PendingEvent(event)
+        self.pending.put(pe)
+        return pe
+
+    def _NextBatch(self) -> list[PendingEvent] | None:
+        """Block for an event, then gather whatever else arrives within batch_window."""
+        first = self.pending.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pe = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if pe is None:
+                self.pending.put(None)  # let the loop see the shutdown after this batch
+                break
+            batch.append(pe)
+        return batch
+
+    def _Send(self, batch: list[PendingEvent]) -> None:
+        from tsmu.broker import EnqueueMany
+        from tsmu.workers import TransmissionVerify
+
+        messages = {}
+        try:
+            with Path("~/transmission-done-testing.log.json").expanduser().open("a") as fp:
+                for pe in batch:
+                    fp.write(json.dumps(pe.event))
+                    fp.write("\n")
+
+            for pe in batch:
+                # hash is specifically used so we're safe across transmission-daemon restarts
+                torrent_hash = pe.event["TR_TORRENT_HASH"]
+                if torrent_hash not in messages:
+                    messages[torrent_hash] = TransmissionVerify.message(
+                        torrent_hash, pe.event["TR_TORRENT_NAME"], pe.event["TR_TORRENT_DIR"]
+                    )
+            EnqueueMany(TransmissionVerify.broker, list(messages.values()))
+            for pe in batch:
+                pe.ok = True
+            logger.info(f"Enqueued count={len(messages)} from events={len(batch)}")
+        except Exception:
+            logger.exception(f"Unable to enqueue events={len(batch)}")
+        finally:
+            for pe in batch:
+                pe.done.set()
+
+    def _FlushLoop(self) -> None:
+        while (batch := self._NextBatch()) is not None:
+            self._Send(batch)
+
+    def Run(self) -> None:
+        # Set up the broker before accepting anything
+        import tsmu.workers  # NOQA
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    event = json.loads(self.rfile.readline())
+                except ValueError:
+                    self.wfile.write(b"error bad request\n")
+                    return
+                pe = daemon.Submit(event)
+                ok = pe.done.wait(CLIENT_TIMEOUT) and pe.ok
+                self.wfile.write(b"ok\n" if ok else b"error\n")
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True, mode=0o770)
+        self.socket_path.unlink(missing_ok=True)
+        # For transmission-daemon's user too, if it's in the group
+        old_umask = os.umask(0o007)
+        try:
+            server = socketserver.ThreadingUnixStreamServer(str(self.socket_path), Handler)
+        finally:
+            os.umask(old_umask)
+        server.daemon_threads = True
+
+        def StopOnSigterm(signum, frame):
+            raise KeyboardInterrupt
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, StopOnSigterm)
+
+        flusher = threading.Thread(target=self._FlushLoop, name="hookd-flush")
+        flusher.start()
+        logger.info(f"Listening on {self.socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.socket_path.unlink(missing_ok=True)
+            self.pending.put(None)
+            flusher.join()
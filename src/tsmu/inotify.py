@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Minimal inotify(7) binding, with ctypes.
+
+Only what the inventory watcher needs: watch directories and read batches of
+events. Watches aren't recursive; every directory needs its own.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+from dataclasses import dataclass
+from typing import Final
+
+IN_MODIFY: Final[int] = 0x00000002
+IN_ATTRIB: Final[int] = 0x00000004
+IN_CLOSE_WRITE: Final[int] = 0x00000008
+IN_MOVED_FROM: Final[int] = 0x00000040
+IN_MOVED_TO: Final[int] = 0x00000080
+IN_CREATE: Final[int] = 0x00000100
+IN_DELETE: Final[int] = 0x00000200
+IN_DELETE_SELF: Final[int] = 0x00000400
+IN_MOVE_SELF: Final[int] = 0x00000800
+IN_Q_OVERFLOW: Final[int] = 0x00004000
+IN_IGNORED: Final[int] = 0x00008000
+IN_ONLYDIR: Final[int] = 0x01000000
+IN_DONT_FOLLOW: Final[int] = 0x02000000
+IN_ISDIR: Final[int] = 0x40000000
+
+IN_CLOEXEC: Final[int] = os.O_CLOEXEC
+IN_NONBLOCK: Final[int] = os.O_NONBLOCK
+
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+_EVENT_HEADER: Final[struct.Struct] = struct.Struct("iIII")
+
+
+@dataclass(frozen=True)
+class InotifyEvent:
+    wd: int
+    mask: int
+    cookie: int
+    name: str
+
+
+def ParseEvents(buffer: bytes) -> list[InotifyEvent]:
+    """
+    >>> name = b"a.mkv\\0\\0\\0"
+    >>> ParseEvents(_EVENT_HEADER.pack(1, IN_CREATE, 0, len(name)) + name)
+    [InotifyEvent(wd=1, mask=256, cookie=0, name='a.mkv')]
+    """
+    events, offset = [], 0
+    while offset < len(buffer):
+        wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buffer, offset)
+        offset += _EVENT_HEADER.size
+        name = buffer[offset : offset + length].rstrip(b"\0")
+        offset += length
+        events.append(InotifyEvent(wd, mask, cookie, os.fsdecode(name)))
+    return events
+
+
+class Inotify:
+    def __init__(self) -> None:
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def Close(self) -> None:
+        os.close(self.fd)
+
+    def AddWatch(self, path: str, mask: int) -> int:
+        """Watch path, returning its watch descriptor."""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def RemoveWatch(self, wd: int) -> None:
+        # Fails if the watch is already gone, e.g. the directory was deleted; that's fine
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def Read(self, timeout: float | None = None) -> list[InotifyEvent]:
+        """Events that are ready, waiting up to timeout seconds for some."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        events = []
+        while True:
+            try:
+                events += ParseEvents(os.read(self.fd, 64 * 1024))
+            except BlockingIOError:
+                return events
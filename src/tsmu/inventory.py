@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Persistent inventory of the archive: path, size, mtime, inode and device of
+everything under the archive roots, in SQLite.
+
+A directory's mtime changes when entries are added to, removed from or
+renamed within it. Rescans use that to skip listing directories that haven't
+changed since the last scan: their entries are taken from the inventory,
+and only their subdirectories are stat()ed to see if they changed. Most of
+the archive is old 02-baked/<YYYYMM.WW> weeks that never change, so a rescan
+is a stat() per directory rather than per file.
+
+Files modified in place, without a rename, keep their old size and mtime in
+the inventory until a --full scan. Scans commit as they go, so they can run
+alongside a watcher, and readers don't wait for either.
+
+    inventory = CurrentInventory([Path("/archive/torrents")])
+    index = inventory.FilenameIndex([Path("/archive/torrents/revtt-1080p")])
+
+InventoryWatcher keeps the inventory current between scans, by applying
+inotify events for every directory under the roots.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import errno
+import logging
+import os
+import sqlite3
+import stat
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Final, Iterable
+
+import xdg.BaseDirectory
+
+from tsmu import inotify
+from tsmu.config import LoadConfiguration
+from tsmu.fileindex import FilenameIndex, IndexedPath
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOTS: Final[list[str]] = ["/archive/torrents"]
+
+# Directories scanned per transaction, so a watcher can write in between
+SCAN_COMMIT_INTERVAL: Final[int] = 1000
+
+# Seconds to wait for another process, e.g. the watcher, to finish writing
+BUSY_TIMEOUT: Final[float] = 60.0
+
+SCHEMA: Final[str] = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    device INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+CREATE INDEX IF NOT EXISTS entries_name ON entries (name);
+-- Directories whose entries have been listed, and their stat when they were
+CREATE TABLE IF NOT EXISTS listed (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    device INTEGER NOT NULL
+);
+"""
+
+
+@dataclass(frozen=True)
+class Entry:
+    path: str
+    is_dir: bool
+    size: int
+    mtime_ns: int
+    inode: int
+    device: int
+
+    @classmethod
+    def FromStat(cls, path: str, st: os.stat_result) -> Entry:
+        return cls(path, stat.S_ISDIR(st.st_mode), st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+
+
+@dataclass
+class ScanStatistics:
+    listed: int = 0  # directories scandir()ed
+    skipped: int = 0  # unchanged directories, not listed
+    entries: int = 0  # entries written
+
+
+def DefaultInventoryPath() -> Path:
+    return Path(xdg.BaseDirectory.save_cache_path("tsmu")) / "inventory.sqlite3"
+
+
+def DefaultRoots() -> list[Path]:
+    """Archive roots, from [inventory] roots in tsmu.toml."""
+    return [Path(r) for r in LoadConfiguration().get("inventory", {}).get("roots", DEFAULT_ROOTS)]
+
+
+def _SubtreeBounds(path: str) -> tuple[str, str]:
+    """Bounds of the paths under path, for a range query on the primary key.
+
+    >>> _SubtreeBounds("/archive/02-baked")
+    ('/archive/02-baked/', '/archive/02-baked0')
+    >>> _SubtreeBounds("/")
+    ('/', '0')
+    """
+    # "0" sorts right after "/"
+    path = path.rstrip("/")
+    return path + "/", path + "0"
+
+
+def _StatDirectory(path: str, stored: Entry | None, full: bool) -> tuple[Entry | None, list | None]:
+    """stat() path, and list it unless it's unchanged since stored.
+
+    Runs in a worker thread, so only touches the filesystem.
+    """
+    try:
+        entry = Entry.FromStat(path, os.stat(path, follow_symlinks=False))
+    except OSError:
+        return None, None
+    if (
+        not full
+        and stored is not None
+        and (stored.mtime_ns, stored.inode, stored.device)
+        == (entry.mtime_ns, entry.inode, entry.device)
+    ):
+        return entry, None
+
+    children = []
+    try:
+        with os.scandir(path) as it:
+            for de in it:
+                try:
+                    children.append(Entry.FromStat(de.path, de.stat(follow_symlinks=False)))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return entry, children
+
+
+class Inventory:
+    def __init__(self, db_path: Path | None = None):
+        self.db_path = db_path if db_path else DefaultInventoryPath()
+        self.db = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+        # Readers, e.g. tsmu locate, don't wait for the watcher's writes
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+
+    def Close(self) -> None:
+        self.db.close()
+
+    def _GetListed(self, path: str) -> Entry | None:
+        """path as it was when we last listed it."""
+        row = self.db.execute(
+            "SELECT mtime_ns, inode, device FROM listed WHERE path = ?", (path,)
+        ).fetchone()
+        return Entry(path, True, 0, *row) if row else None
+
+    def IsListed(self, root: Path) -> bool:
+        """Whether root has been scanned, so the inventory has what's under it."""
+        return self._GetListed(str(Path(root).absolute())) is not None
+
+    def _StoredSubdirectories(self, path: str) -> list[str]:
+        return [
+            r[0]
+            for r in self.db.execute(
+                "SELECT path FROM entries WHERE parent = ? AND is_dir = 1", (path,)
+            )
+        ]
+
+    def _Put(self, entries: Iterable[Entry]) -> None:
+        self.db.executemany(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (e.path, os.path.dirname(e.path), os.path.basename(e.path), e.is_dir)
+                + (e.size, e.mtime_ns, e.inode, e.device)
+                for e in entries
+            ),
+        )
+
+    def _Remove(self, path: str) -> None:
+        """Forget path and everything under it."""
+        for table in ("entries", "listed"):
+            self.db.execute(f"DELETE FROM {table} WHERE path = ?", (path,))
+            self.db.execute(
+                f"DELETE FROM {table} WHERE path >= ? AND path < ?", _SubtreeBounds(path)
+            )
+
+    def Scan(
+        self,
+        roots: Iterable[Path],
+        full: bool = False,
+        workers: int = 8,
+        force: Iterable[str] = (),
+        descend_unchanged: bool = True,
+    ) -> ScanStatistics:
+        """Bring the inventory of roots up to date.
+
+        Unless full, directories whose mtime hasn't changed aren't listed
+        again, except those in force. Unless descend_unchanged, nothing under
+        an unchanged directory is looked at; for when we know what changed.
+        """
+        statistics = ScanStatistics()
+        force = set(force)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+
+            def Submit(path: str):
+                return executor.submit(
+                    _StatDirectory, path, self._GetListed(path), full or path in force
+                )
+
+            pending = {Submit(str(Path(r).absolute())): str(Path(r).absolute()) for r in roots}
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    path = pending.pop(future)
+                    entry, children = future.result()
+                    if entry is None:
+                        self._Remove(path)
+                        continue
+                    self._Put([entry])
+
+                    if children is None:
+                        statistics.skipped += 1
+                        subdirectories = (
+                            self._StoredSubdirectories(path) if descend_unchanged else []
+                        )
+                    else:
+                        statistics.listed += 1
+                        statistics.entries += len(children)
+                        names = {os.path.basename(c.path) for c in children}
+                        for stored_path in self.db.execute(
+                            "SELECT path FROM entries WHERE parent = ?", (path,)
+                        ).fetchall():
+                            if os.path.basename(stored_path[0]) not in names:
+                                self._Remove(stored_path[0])
+                        self._Put(children)
+                        self.db.execute(
+                            "INSERT OR REPLACE INTO listed VALUES (?, ?, ?, ?)",
+                            (path, entry.mtime_ns, entry.inode, entry.device),
+                        )
+                        subdirectories = [c.path for c in children if c.is_dir]
+
+                    for subdirectory in subdirectories:
+                        pending[Submit(subdirectory)] = subdirectory
+                    if (statistics.listed + statistics.skipped) % SCAN_COMMIT_INTERVAL == 0:
+                        self.db.commit()
+        self.db.commit()
+        return statistics
+
+    def FilenameIndex(self, roots: Iterable[Path]) -> FilenameIndex:
+        """FilenameIndex of everything under roots, from the inventory."""
+        index = FilenameIndex()
+        for root in roots:
+            root_path = str(Path(root).absolute())
+            for path, name, is_dir in self.db.execute(
+                "SELECT path, name, is_dir FROM entries WHERE path >= ? AND path < ?",
+                _SubtreeBounds(root_path),
+            ):
+                index.by_name[name].append(IndexedPath(Path(path), bool(is_dir)))
+        return index
+
+
+def CurrentInventory(roots: Iterable[Path], rescan: bool = False) -> Inventory:
+    """The inventory, as kept current by `tsmu inventory --watch`.
+
+    roots are only scanned if asked to, or they never have been.
+    """
+    inventory = Inventory()
+    unscanned = [r for r in roots if rescan or not inventory.IsListed(r)]
+    if unscanned:
+        inventory.Scan(unscanned)
+    return inventory
+
+
+class InventoryWatcher:
+    """Apply inotify events under roots to an inventory, in batches.
+
+    Each batch re-lists just the directories events were reported for, and
+    anything new under them. If the kernel's event queue overflowed, events
+    were lost, so the roots are rescanned (incrementally) instead.
+    """
+
+    WATCH_MASK: Final[int] = (
+        inotify.IN_CREATE
+        | inotify.IN_DELETE
+        | inotify.IN_MOVED_FROM
+        | inotify.IN_MOVED_TO
+        | inotify.IN_CLOSE_WRITE
+        | inotify.IN_ATTRIB
+        | inotify.IN_MOVE_SELF
+        | inotify.IN_ONLYDIR
+        | inotify.IN_DONT_FOLLOW
+    )
+
+    def __init__(self, inventory: Inventory, roots: Iterable[Path], batch_window: float = 1.0):
+        self.inventory = inventory
+        self.roots = [str(Path(r).absolute()) for r in roots]
+        self.batch_window = batch_window
+        self.inotify = inotify.Inotify()
+        self.paths_by_wd: dict[int, str] = {}
+        self.wds_by_path: dict[str, int] = {}
+
+    def _WatchListed(self, paths: Iterable[str]) -> None:
+        """Watch the listed directories at or under paths that aren't watched yet."""
+        for path in paths:
+            for (directory,) in self.inventory.db.execute(
+                "SELECT path FROM listed WHERE path = ? OR (path >= ? AND path < ?)",
+                (path, *_SubtreeBounds(path)),
+            ).fetchall():
+                if directory in self.wds_by_path:
+                    continue
+                try:
+                    wd = self.inotify.AddWatch(directory, self.WATCH_MASK)
+                except OSError as e:
+                    if e.errno == errno.ENOSPC:
+                        logger.error("Out of inotify watches, raise fs.inotify.max_user_watches")
+                        return
+                    continue
+                # Re-watching an inode, e.g. moved directory, gives back its old wd
+                self.wds_by_path.pop(self.paths_by_wd.get(wd, ""), None)
+                self.paths_by_wd[wd] = directory
+                self.wds_by_path[directory] = wd
+
+    def _Forget(self, wd: int) -> None:
+        path = self.paths_by_wd.pop(wd, None)
+        if path is not None:
+            self.wds_by_path.pop(path, None)
+
+    def Rescan(self) -> ScanStatistics:
+        statistics = self.inventory.Scan(self.roots)
+        self._WatchListed(self.roots)
+        return statistics
+
+    def ApplyEvents(self, events: list[inotify.InotifyEvent]) -> int:
+        """Apply a batch of events; returns the directories re-listed, -1 for a full rescan."""
+        if any(e.mask & inotify.IN_Q_OVERFLOW for e in events):
+            logger.warning("inotify queue overflowed, rescanning")
+            self.Rescan()
+            return -1
+
+        dirty = set()
+        for e in events:
+            path = self.paths_by_wd.get(e.wd)
+            if e.mask & (inotify.IN_IGNORED | inotify.IN_MOVE_SELF):
+                # Gone or moved; its parent's events bring it back in, at its new path
+                if e.mask & inotify.IN_MOVE_SELF:
+                    self.inotify.RemoveWatch(e.wd)
+                self._Forget(e.wd)
+                continue
+            if path is not None:
+                dirty.add(path)
+
+        if dirty:
+            self.inventory.Scan(dirty, force=dirty, descend_unchanged=False)
+            self._WatchListed(dirty)
+        return len(dirty)
+
+    def Run(self) -> None:
+        self.Rescan()
+        logger.info(f"Watching {len(self.wds_by_path)} directories")
+        while True:
+            events = self.inotify.Read()
+            # Let events from e.g. a torrent being moved pile up
+            time.sleep(self.batch_window)
+            events += self.inotify.Read(timeout=0)
+            relisted = self.ApplyEvents(events)
+            logger.info(f"Applied {len(events)} events, re-listed {relisted} directories")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Content-addressed store of .torrent files and their metadata, keyed by infohash.
+
+Backups of torrents we re-add, and dumps made by `tsmu fpd`, used to be a
+.torrent copy plus a .json file per torrent, written again every time. The
+store keeps one .torrent per infohash, fanned out by the first two hex
+digits, and all metadata in a single append-only index:
+
+    ~/readded-torrents/
+        index.jsonl                 one JSON object per line, later lines win
+        torrents/ab/abcd….torrent
+
+.torrent files are hardlinked (or reflinked, or as a last resort copied)
+from transmission's own copies, so storing a torrent again is ~free. Export
+writes torrents and metadata as one tar file, a single sequential write.
+"""
+
+from __future__ import annotations
+
+import filecmp
+import io
+import json
+import os
+import tarfile
+from pathlib import Path
+from typing import Any, Final, Iterable
+
+from tsmu.util import CopyFileData
+
+TorrentInformation = dict[str, Any]
+
+DEFAULT_STORE_DIRECTORY: Final[Path] = Path("~/readded-torrents/")
+
+# Not worth keeping, they change as soon as the torrent is re-added
+UNNECESSARY_ATTRIBUTES: Final[set[str]] = {"id", "downloadDir", "percentDone"}
+
+
+def LinkOrCopy(src: Path, dst: Path) -> None:
+    """Hardlink src to dst, or reflink it if on another filesystem, or copy it."""
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+
+    CopyFileData(src, dst)
+
+
+def _ExportName(ti: TorrentInformation, use_name: bool) -> str:
+    """
+    >>> _ExportName({"hash": "ab12", "name": "Some/Name"}, use_name=True)
+    'Some_Name'
+    >>> _ExportName({"hash": "ab12", "name": "Some/Name"}, use_name=False)
+    'ab12'
+    """
+    return ti["name"].replace("/", "_") if use_name else ti["hash"]
+
+
+def _UniqueExportNames(tis: Iterable[TorrentInformation], use_name: bool) -> list[str]:
+    """Export names, with torrents sharing a name told apart by their infohash.
+
+    >>> tis = [{"hash": "ab12", "name": "A"}, {"hash": "cd34ef5678", "name": "A"}]
+    >>> _UniqueExportNames(tis, use_name=True)
+    ['A', 'A.cd34ef56']
+    """
+    names, taken = [], set()
+    for ti in tis:
+        name = _ExportName(ti, use_name)
+        if name in taken:
+            name = f"{name}.{ti['hash'][:8]}"
+        taken.add(name)
+        names.append(name)
+    return names
+
+
+class TorrentStore:
+    def __init__(self, root: Path = DEFAULT_STORE_DIRECTORY):
+        self.root = root.expanduser()
+        self.index_path = self.root / "index.jsonl"
+        self._index: dict[str, TorrentInformation] | None = None
+
+    @property
+    def index(self) -> dict[str, TorrentInformation]:
+        """infohash -> metadata, for everything in the store."""
+        if self._index is None:
+            self._index = {}
+            if self.index_path.exists():
+                with self.index_path.open() as fp:
+                    for line in fp:
+                        # Tolerate a torn last line, e.g. if we were killed while appending
+                        try:
+                            ti = json.loads(line)
+                        except ValueError:
+                            continue
+                        self._index[ti["hash"]] = ti
+        return self._index
+
+    def TorrentPath(self, infohash: str) -> Path:
+        return self.root / "torrents" / infohash[:2] / f"{infohash}.torrent"
+
+    def Get(self, infohash: str) -> TorrentInformation | None:
+        return self.index.get(infohash)
+
+    def Put(self, torrent_info: TorrentInformation) -> Path:
+        """Store a torrent, given transmission's .torrent as torrentFile. Returns the stored .torrent."""
+        return self.PutMany([torrent_info])[0]
+
+    def PutMany(self, torrent_infos: Iterable[TorrentInformation]) -> list[Path]:
+        """Store torrents, appending new or changed metadata to the index in one write."""
+        paths, lines = [], []
+        for torrent_info in torrent_infos:
+            assert "torrentFile" in torrent_info
+            ti = {k: v for k, v in torrent_info.items() if k not in UNNECESSARY_ATTRIBUTES}
+            infohash = ti["hash"]
+            torrent_path = self.TorrentPath(infohash)
+            if not torrent_path.exists():
+                torrent_path.parent.mkdir(parents=True, exist_ok=True)
+                LinkOrCopy(Path(ti["torrentFile"]), torrent_path)
+            ti["torrentFile"] = str(torrent_path.relative_to(self.root))
+
+            if self.index.get(infohash) != ti:
+                self.index[infohash] = ti
+                lines.append(json.dumps(ti) + "\n")
+            paths.append(torrent_path)
+
+        if lines:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with self.index_path.open("a") as fp:
+                fp.write("".join(lines))
+        return paths
+
+    def Checkout(
+        self, infohashes: Iterable[str], directory: Path, use_name: bool = False
+    ) -> list[Path]:
+        """Link stored torrents into directory, with their metadata as a single index.json."""
+        directory.mkdir(parents=True, exist_ok=True)
+        tis = [self.index[infohash] for infohash in infohashes]
+        paths, metadata = [], []
+        for ti, name in zip(tis, _UniqueExportNames(tis, use_name)):
+            torrent_path, dest_path = self.TorrentPath(ti["hash"]), directory / (name + ".torrent")
+            # Left by an earlier checkout, maybe of another torrent of the same name
+            if dest_path.exists() and not filecmp.cmp(dest_path, torrent_path, shallow=False):
+                dest_path.unlink()
+            if not dest_path.exists():
+                LinkOrCopy(torrent_path, dest_path)
+            metadata.append(dict(ti, torrentFile=dest_path.name))
+            paths.append(dest_path)
+        (directory / "index.json").write_text(json.dumps(metadata))
+        return paths
+
+    def Export(self, infohashes: Iterable[str], archive_path: Path, use_name: bool = False) -> int:
+        """Write stored torrents and an index.json to an uncompressed tar. Returns the count."""
+        metadata = []
+        with tarfile.open(archive_path, "w") as tar:
+            tis = [self.index[infohash] for infohash in infohashes]
+            for ti, name in zip(tis, _UniqueExportNames(tis, use_name)):
+                arcname = name + ".torrent"
+                tar.add(self.TorrentPath(ti["hash"]), arcname=arcname)
+                metadata.append(dict(ti, torrentFile=arcname))
+
+            encoded = json.dumps(metadata).encode("utf-8")
+            info = tarfile.TarInfo("index.json")
+            info.size = len(encoded)
+            tar.addfile(info, io.BytesIO(encoded))
+        return len(metadata)
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Metrics for the tsmu-workers pipeline, exposed in the Prometheus text format.
+
+Every dramatiq worker process keeps its own counters and histograms, and
+periodically writes a snapshot of them as JSON into a shared directory. A
+single exposition process (a dramatiq fork) merges the snapshots and serves
+them on localhost and/or writes them to a textfile for node_exporter's
+textfile collector. Snapshots are removed when their process exits, or is
+found to have died, so counters reset as they would for a single process.
+
+Configure in tsmu.toml:
+
+    [metrics]
+    port = 9464                  # http://127.0.0.1:9464/metrics
+    textfile = "/var/lib/node_exporter/textfile_collector/tsmu.prom"
+    interval = 15                # seconds between snapshots
+"""
+
+import http.server
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Final
+
+Labels = tuple[tuple[str, str], ...]
+
+DEFAULT_INTERVAL: Final[float] = 15.0
+
+# Stages range from a few seconds (MoveTorrent) to hours (verifying/hashing 100s of GB)
+DEFAULT_BUCKETS: Final[tuple[float, ...]] = (
+    1,
+    5,
+    15,
+    30,
+    60,
+    120,
+    300,
+    600,
+    1800,
+    3600,
+    7200,
+    21600,
+    math.inf,
+)
+
+# name -> (type, help)
+METRIC_DESCRIPTIONS: Final[dict[str, tuple[str, str]]] = {
+    "tsmu_actor_duration_seconds": ("histogram", "Time spent processing a message, by actor"),
+    "tsmu_message_latency_seconds": (
+        "histogram",
+        "Time from enqueueing a message to it finishing, by actor",
+    ),
+    "tsmu_messages_total": ("counter", "Messages processed, by actor and device"),
+    "tsmu_failures_total": ("counter", "Messages that raised, by actor and exception type"),
+    "tsmu_hashed_bytes_total": ("counter", "Bytes checksummed by ComputeXxh, by device"),
+    "tsmu_hashed_files_total": ("counter", "Files checksummed by ComputeXxh, by device"),
+    "tsmu_copied_bytes_total": ("counter", "Bytes moved across devices by MoveTorrent"),
+    "tsmu_queue_messages": ("gauge", "Messages waiting in a queue"),
+}
+
+
+def _Labels(labels: dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def DeviceLabel(path: Path | str) -> str:
+    """major:minor of the device holding path, like /proc/self/mountinfo.
+
+    >>> DeviceLabel("/nonexistent/path")
+    'unknown'
+    """
+    try:
+        st_dev = os.stat(path).st_dev
+    except OSError:
+        return "unknown"
+    return f"{os.major(st_dev)}:{os.minor(st_dev)}"
+
+
+class Metrics:
+    """Counters, gauges and histograms for a single process.
+
+    >>> m = Metrics()
+    >>> m.Inc("tsmu_messages_total", {"actor": "MoveTorrent", "device": "8:1"})
+    >>> m.Observe("tsmu_actor_duration_seconds", {"actor": "MoveTorrent"}, 3.0)
+    >>> print(RenderPrometheusText([m.Snapshot()]), end="")  # doctest: +ELLIPSIS
+    # HELP tsmu_actor_duration_seconds Time spent processing a message, by actor
+    # TYPE tsmu_actor_duration_seconds histogram
+    tsmu_actor_duration_seconds_bucket{actor="MoveTorrent",le="1"} 0
+    tsmu_actor_duration_seconds_bucket{actor="MoveTorrent",le="5"} 1
+    ...
+    tsmu_actor_duration_seconds_bucket{actor="MoveTorrent",le="+Inf"} 1
+    tsmu_actor_duration_seconds_sum{actor="MoveTorrent"} 3.0
+    tsmu_actor_duration_seconds_count{actor="MoveTorrent"} 1
+    # HELP tsmu_messages_total Messages processed, by actor and device
+    # TYPE tsmu_messages_total counter
+    tsmu_messages_total{actor="MoveTorrent",device="8:1"} 1.0
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.gauges: dict[tuple[str, Labels], float] = {}
+        # (name, labels) -> (bucket upper bounds, per-bucket counts, sum)
+        self.histograms: dict[tuple[str, Labels], tuple[tuple[float, ...], list[int], float]] = {}
+
+    def Inc(self, name: str, labels: dict[str, str], value: float = 1.0) -> None:
+        key = (name, _Labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def Set(self, name: str, labels: dict[str, str], value: float) -> None:
+        with self.lock:
+            self.gauges[(name, _Labels(labels))] = value
+
+    def Observe(
+        self,
+        name: str,
+        labels: dict[str, str],
+        value: float,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        key = (name, _Labels(labels))
+        with self.lock:
+            bounds, counts, total = self.histograms.get(key, (buckets, [0] * len(buckets), 0.0))
+            for i, upper_bound in enumerate(bounds):
+                if value <= upper_bound:
+                    counts[i] += 1
+                    break
+            self.histograms[key] = (bounds, counts, total + value)
+
+    def Snapshot(self) -> dict[str, Any]:
+        """JSON-serializable copy of everything recorded so far."""
+        with self.lock:
+            return {
+                "time": time.time(),
+                "counters": [[n, list(lb), v] for (n, lb), v in self.counters.items()],
+                "gauges": [[n, list(lb), v] for (n, lb), v in self.gauges.items()],
+                "histograms": [
+                    [n, list(lb), [b if b != math.inf else "+Inf" for b in bounds], counts, total]
+                    for (n, lb), (bounds, counts, total) in self.histograms.items()
+                ],
+            }
+
+
+# Metrics for this process
+METRICS = Metrics()
+
+
+def _FormatLabels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _FormatBound(bound: float | str) -> str:
+    if bound == "+Inf":
+        return bound
+    return f"{bound:g}"
+
+
+def RenderPrometheusText(snapshots: list[dict[str, Any]]) -> str:
+    """Merge per-process snapshots into a Prometheus text exposition.
+
+    Counters and histograms are summed across processes; for gauges the most
+    recent snapshot wins.
+    """
+    counters: dict[tuple[str, Labels], float] = {}
+    gauges: dict[tuple[str, Labels], float] = {}
+    histograms: dict[tuple[str, Labels], tuple[list, list[int], float]] = {}
+
+    for snapshot in sorted(snapshots, key=lambda s: s["time"]):
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(lb) for lb in labels))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, value in snapshot["gauges"]:
+            gauges[(name, tuple(tuple(lb) for lb in labels))] = value
+        for name, labels, bounds, counts, total in snapshot["histograms"]:
+            key = (name, tuple(tuple(lb) for lb in labels))
+            if key in histograms:
+                _, merged_counts, merged_total = histograms[key]
+                counts = [a + b for a, b in zip(merged_counts, counts)]
+                total += merged_total
+            histograms[key] = (bounds, counts, total)
+
+    samples_by_name: dict[str, list[str]] = {}
+    for (name, labels), value in counters.items():
+        samples_by_name.setdefault(name, []).append(f"{name}{_FormatLabels(labels)} {value}")
+    for (name, labels), value in gauges.items():
+        samples_by_name.setdefault(name, []).append(f"{name}{_FormatLabels(labels)} {value}")
+    for (name, labels), (bounds, counts, total) in histograms.items():
+        samples = samples_by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(bounds, counts):
+            cumulative += count
+            bucket_labels = labels + (("le", _FormatBound(bound)),)
+            samples.append(f"{name}_bucket{_FormatLabels(bucket_labels)} {cumulative}")
+        samples.append(f"{name}_sum{_FormatLabels(labels)} {total}")
+        samples.append(f"{name}_count{_FormatLabels(labels)} {cumulative}")
+
+    lines = []
+    for name in sorted(samples_by_name):
+        metric_type, metric_help = METRIC_DESCRIPTIONS.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {metric_help}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(samples_by_name[name])
+    return "\n".join(lines) + "\n"
+
+
+def DefaultMetricsDirectory() -> Path:
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return Path(runtime_dir) / "tsmu-metrics"
+
+
+def _AtomicWrite(path: Path, content: str) -> None:
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(content)
+    os.replace(tmp_path, path)
+
+
+def _ProcessStartTime(pid: int) -> str | None:
+    """When pid started, in clock ticks since boot; None if it isn't running.
+
+    >>> _ProcessStartTime(os.getpid()) is not None
+    True
+    """
+    try:
+        stat_line = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    # Fields after the command, which may have spaces and parentheses in it
+    return stat_line.rpartition(")")[2].split()[19]
+
+
+def WriteSnapshot(directory: Path, metrics: Metrics = METRICS) -> None:
+    """Write this process's metrics to directory/<pid>.json."""
+    directory.mkdir(parents=True, exist_ok=True)
+    snapshot = metrics.Snapshot()
+    snapshot["pid"], snapshot["pid_started"] = os.getpid(), _ProcessStartTime(os.getpid())
+    _AtomicWrite(directory / f"{os.getpid()}.json", json.dumps(snapshot))
+
+
+def RemoveSnapshot(directory: Path) -> None:
+    """Remove this process's snapshot, as it's exiting."""
+    (directory / f"{os.getpid()}.json").unlink(missing_ok=True)
+
+
+def ReadSnapshots(directory: Path) -> list[dict[str, Any]]:
+    """Snapshots of running processes; those left by ones that died are removed."""
+    snapshots = []
+    for snapshot_path in directory.glob("*.json"):
+        try:
+            snapshot = json.loads(snapshot_path.read_text())
+        except (OSError, ValueError):
+            # Being replaced as we read it, we'll pick it up next time
+            continue
+        # A pid that's been reused isn't the process that wrote the snapshot
+        started = _ProcessStartTime(snapshot.get("pid", 0))
+        if started is None or started != snapshot.get("pid_started"):
+            snapshot_path.unlink(missing_ok=True)
+            continue
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def RunExposition(
+    directory: Path,
+    port: int | None = None,
+    textfile: Path | None = None,
+    interval: float = DEFAULT_INTERVAL,
+) -> None:
+    """Serve merged snapshots on 127.0.0.1:port and/or write them to textfile. Never returns."""
+
+    def Render() -> str:
+        return RenderPrometheusText(ReadSnapshots(directory))
+
+    if port:
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = Render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        httpd = http.server.ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    while True:
+        if textfile:
+            _AtomicWrite(textfile, Render())
+        time.sleep(interval)
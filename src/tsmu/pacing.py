@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Pace bulk re-adds by what actually slows the box down.
+
+Every re-added torrent gets verified, i.e. its data is read back in full.
+Load average is a poor proxy for that: what matters is how many torrents
+transmission-daemon is checking (or waiting to check), and how much time
+tasks spend stalled on I/O, which Linux reports in /proc/pressure/io (PSI).
+
+PacingController admits re-adds in batches: enough to keep the verify queue
+at its target, so the disks are always busy, growing the batch by one each
+round that I/O pressure is low and halving it when pressure is high.
+
+    async with ConnectToTransmissionAsync() as client:
+        pacing = PacingController(client)
+        await ReAddTorrents(client, readds, admit=pacing.Admit)
+"""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import TYPE_CHECKING, Final
+
+if TYPE_CHECKING:
+    from tsmu.aiorpc import AsyncTransmissionClient
+
+IO_PRESSURE_PATH: Final[Path] = Path("/proc/pressure/io")
+
+# tr_torrent_activity, see libtransmission/transmission.h
+TR_STATUS_CHECK_WAIT: Final[int] = 1
+TR_STATUS_CHECK: Final[int] = 2
+
+
+def ParsePressure(text: str, kind: str = "some") -> float:
+    """avg10 from PSI output, i.e. % of the last 10s that tasks were stalled.
+
+    >>> ParsePressure('''some avg10=12.50 avg60=3.00 avg300=1.00 total=123
+    ... full avg10=8.25 avg60=2.00 avg300=0.50 total=100''')
+    12.5
+    >>> ParsePressure('full avg10=8.25 avg60=2.00 avg300=0.50 total=100', kind="full")
+    8.25
+    """
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0] != kind:
+            continue
+        for field in fields[1:]:
+            key, _, value = field.partition("=")
+            if key == "avg10":
+                return float(value)
+    raise ValueError(f"No {kind} avg10 in pressure information")
+
+
+def ReadIoPressure() -> float | None:
+    """I/O pressure, None if the kernel doesn't have PSI (CONFIG_PSI) enabled."""
+    try:
+        return ParsePressure(IO_PRESSURE_PATH.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+async def CountVerifying(client: AsyncTransmissionClient) -> int:
+    """Torrents transmission-daemon is checking or waiting to check."""
+    torrents = await client.TorrentGet(["status"])
+    return sum(t["status"] in (TR_STATUS_CHECK_WAIT, TR_STATUS_CHECK) for t in torrents)
+
+
+class PacingController:
+    def __init__(
+        self,
+        client: AsyncTransmissionClient,
+        verify_queue: int = 4,
+        max_io_pressure: float = 40.0,
+        max_batch: int = 16,
+        poll_interval: float = 5.0,
+        statusCb=lambda x: x,
+    ):
+        self.client = client
+        self.verify_queue = verify_queue
+        self.max_io_pressure = max_io_pressure
+        self.max_batch = max_batch
+        self.poll_interval = poll_interval
+        self.statusCb = statusCb
+        self.batch = 1
+        self.admissions = 0
+        self.lock = asyncio.Lock()
+        self.polled = False
+
+    def _NextBatch(self, verifying: int, io_pressure: float | None) -> int:
+        """Adjust the batch size and return how many re-adds to admit now.
+
+        >>> p = PacingController(None, verify_queue=4, max_io_pressure=40.0, max_batch=8)
+        >>> p._NextBatch(verifying=0, io_pressure=5.0), p.batch
+        (2, 2)
+        >>> p._NextBatch(verifying=3, io_pressure=5.0), p.batch
+        (1, 3)
+        >>> p._NextBatch(verifying=0, io_pressure=60.0), p.batch
+        (0, 1)
+        """
+        if io_pressure is not None and io_pressure > self.max_io_pressure:
+            self.batch = max(1, self.batch // 2)
+            return 0
+        if io_pressure is None or io_pressure < self.max_io_pressure / 2:
+            self.batch = min(self.max_batch, self.batch + 1)
+        return max(0, min(self.batch, self.verify_queue - verifying))
+
+    async def Admit(self) -> None:
+        """Wait until another re-add may go ahead."""
+        async with self.lock:
+            while self.admissions == 0:
+                # Give the daemon a moment to pick up what we just admitted
+                if self.polled:
+                    await asyncio.sleep(self.poll_interval)
+                self.polled = True
+                verifying, io_pressure = await CountVerifying(self.client), ReadIoPressure()
+                self.admissions = self._NextBatch(verifying, io_pressure)
+                self.statusCb(
+                    f"Verifying {verifying}, I/O pressure {io_pressure}, admitting {self.admissions}"
+                )
+            self.admissions -= 1
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+--profile for tsmu's commands.
+
+StartProfiling() profiles the rest of the process with cProfile, and when it
+exits prints the top functions by cumulative time to stderr. If given a
+path, it also writes
+
+    *.collapsed, *.folded   stacks sampled every few ms, one "a;b;c count" line
+                            per stack, for flamegraph.pl or speedscope
+    anything else           cProfile's stats, for pstats or snakeviz
+
+    tsmu --profile fpd.pstats fpd …
+    python -m pstats fpd.pstats
+"""
+
+from __future__ import annotations
+
+import atexit
+import collections
+import cProfile
+import pstats
+import sys
+import threading
+from pathlib import Path
+from typing import Final
+
+COLLAPSED_SUFFIXES: Final[set[str]] = {".collapsed", ".folded"}
+
+# Seconds between stack samples for collapsed output
+SAMPLE_INTERVAL: Final[float] = 0.005
+
+
+def _FrameName(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Count the stacks a thread is in, sampled from another thread."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: collections.Counter[str] = collections.Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._Run, daemon=True)
+
+    def _Run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_FrameName(frame))
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def Start(self) -> None:
+        self.thread.start()
+
+    def Stop(self) -> None:
+        self.stop_event.set()
+        self.thread.join()
+
+    def Write(self, path: Path) -> None:
+        with path.open("w") as fp:
+            for stack, count in self.counts.most_common():
+                fp.write(f"{stack} {count}\n")
+
+
+def StartProfiling(output: Path | None = None, top: int = 25) -> None:
+    """Profile until the process exits, then summarize to stderr and write output, if given."""
+    profiler = cProfile.Profile()
+    sampler = None
+    if output and output.suffix in COLLAPSED_SUFFIXES:
+        sampler = StackSampler(threading.get_ident())
+        sampler.Start()
+
+    def Finish() -> None:
+        profiler.disable()
+        if sampler:
+            sampler.Stop()
+            sampler.Write(output)
+        elif output:
+            profiler.dump_stats(output)
+        print(f"\n--profile: top {top} functions by cumulative time", file=sys.stderr)
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+        if output:
+            print(f"--profile: wrote {output}", file=sys.stderr)
+
+    atexit.register(Finish)
+    profiler.enable()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Locate torrent data on other hosts, from their file index.
+
+Rather than an `ssh host fdfind` per torrent per location, each host's index
+is fetched once: over a single ssh connection running `tsmu inventory
+--export -` on the host, or read from an index file exported there and
+reachable through a mount. Every torrent is then matched locally.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import io
+import logging
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Final, Iterable
+
+from tsmu.config import LoadConfiguration
+from tsmu.fileindex import FilenameIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCATIONS: Final[list[str]] = [
+    "fa.local:/archive/torrents/revtt-games/",
+    "fa.local:/archive/torrents/Games.Scene/",
+    "nu.local:/home/xjjk/Mount/ds1817c/torrents/revtt-games/",
+]
+
+
+@dataclass(frozen=True)
+class RemoteLocation:
+    host: str
+    root: Path
+
+    @classmethod
+    def Parse(cls, spec: str) -> RemoteLocation:
+        """host:/path, or a local /path, e.g. to stand in for a host when testing.
+
+        >>> RemoteLocation.Parse("fa.local:/archive/torrents/revtt-games/")
+        RemoteLocation(host='fa.local', root=PosixPath('/archive/torrents/revtt-games'))
+        >>> RemoteLocation.Parse("/tmp/remote")
+        RemoteLocation(host='', root=PosixPath('/tmp/remote'))
+        """
+        if spec.startswith("/"):
+            return cls("", Path(spec))
+        host, sep, root = spec.partition(":")
+        if not sep or not root.startswith("/"):
+            raise ValueError(f"Expected host:/absolute/path or /absolute/path, got {spec!r}")
+        return cls(host, Path(root))
+
+
+def RsyncSource(host: str, path: Path) -> str:
+    """rsync source for the contents of directory path on host, or locally if host is empty.
+
+    >>> RsyncSource("fa.local", Path("/archive/Some.Torrent"))
+    'fa.local:/archive/Some.Torrent/'
+    >>> RsyncSource("", Path("/tmp/remote/Some.Torrent"))
+    '/tmp/remote/Some.Torrent/'
+    """
+    return f"{host}:{path}/" if host else f"{path}/"
+
+
+def ConfiguredLocations() -> list[RemoteLocation]:
+    """Locations from [copy-from] locations in tsmu.toml, in order of preference."""
+    specs = LoadConfiguration().get("copy-from", {}).get("locations", DEFAULT_LOCATIONS)
+    return [RemoteLocation.Parse(s) for s in specs]
+
+
+def IsSampleOrProof(path: Path) -> bool:
+    """
+    >>> IsSampleOrProof(Path("/a/Game-GRP/Sample"))
+    True
+    >>> IsSampleOrProof(Path("/a/Game-GRP"))
+    False
+    """
+    return "sample" in str(path).lower() or "proof" in str(path)
+
+
+def FetchRemoteIndex(host: str, roots: Iterable[Path]) -> FilenameIndex:
+    """Index of roots on host, over one ssh connection, or made here if host is empty."""
+    cmd = ["tsmu", "inventory", "--export", "-"] + [str(r) for r in roots]
+    if host:
+        cmd = ["ssh", host] + cmd
+    cp = subprocess.run(cmd, capture_output=True, check=True)
+    return FilenameIndex.Read(io.BytesIO(cp.stdout))
+
+
+class RemoteLocator:
+    def __init__(self, locations: list[RemoteLocation], index_files: dict[str, Path] | None = None):
+        self.locations = locations
+        self.index_files = index_files if index_files else {}
+        self.indexes: dict[str, FilenameIndex] = {}
+
+    def Fetch(self) -> None:
+        """Get every host's index, fetching from hosts concurrently."""
+        roots_by_host: dict[str, list[Path]] = {}
+        for location in self.locations:
+            roots_by_host.setdefault(location.host, []).append(location.root)
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            futures = {}
+            for host, roots in roots_by_host.items():
+                if host in self.index_files:
+                    with self.index_files[host].open("rb") as fp:
+                        self.indexes[host] = FilenameIndex.Read(fp)
+                else:
+                    futures[host] = executor.submit(FetchRemoteIndex, host, roots)
+            for host, future in futures.items():
+                try:
+                    self.indexes[host] = future.result()
+                except subprocess.CalledProcessError as e:
+                    logger.error(f"Unable to get index from {host}: {e.stderr.decode().strip()}")
+            for host, index in self.indexes.items():
+                logger.info(f"Got index of {len(index)} paths from {host}")
+
+    def Locate(self, name: str) -> tuple[str, Path] | None:
+        """(host, path) of directory name, from the first location it's found in exactly once."""
+        for location in self.locations:
+            index = self.indexes.get(location.host)
+            if index is None:
+                continue
+            found = [
+                p
+                for p in index.Lookup(name, is_dir=True)
+                if p.is_relative_to(location.root) and not IsSampleOrProof(p)
+            ]
+            if len(found) > 1:
+                logger.error(f"Too many found locations for {name=}, {found=}")
+                continue
+            if found:
+                logger.info(f"Found {name=} on {location.host}:{found[0]}")
+                return location.host, found[0]
+        return None
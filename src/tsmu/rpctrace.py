@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Tracing of RPC calls to transmission-daemon, to find who's loading it.
+
+Set TSMU_RPC_TRACE to trace every call made by ConnectToTransmission()'s
+client and AsyncTransmissionClient:
+
+    TSMU_RPC_TRACE=1 tsmu fpd …                   summary table on exit, to stderr
+    TSMU_RPC_TRACE=/tmp/rpc.jsonl tsmu-workers    and a JSON line per call, appended
+
+Each call records its method, number of ids, requested fields, request and
+response bytes, wall time, and the caller: the innermost function outside
+the RPC clients, e.g. tsmu.workers.TransmissionVerify. Trace files from many
+processes can be summarized together with `tsmu rpc-trace FILES`.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import IO, Any, Final, Iterable
+
+TRACE_ENVIRONMENT_VARIABLE: Final[str] = "TSMU_RPC_TRACE"
+
+# Frames in these modules aren't callers, they're how the call is made
+_CLIENT_MODULE_PREFIXES: Final[tuple[str, ...]] = (
+    "transmissionrpc",
+    "tsmu.rpctrace",
+    "tsmu.aiorpc",
+    "tsmu.util",
+    "asyncio",
+    "concurrent",
+    "threading",
+)
+
+
+@dataclass
+class RpcCall:
+    method: str
+    ids: int | None  # None when for all torrents
+    fields: list[str]
+    request_bytes: int
+    response_bytes: int
+    seconds: float
+    caller: str
+    command: str
+    pid: int
+    timestamp: float
+
+
+def _Caller(depth: int = 2) -> str:
+    frame = sys._getframe(depth)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_CLIENT_MODULE_PREFIXES):
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def _Command(argv: list[str] | None = None) -> str:
+    """
+    >>> _Command(["/usr/bin/tsmu", "fpd", "--no-dry-run"])
+    'tsmu fpd'
+    """
+    argv = sys.argv if argv is None else argv
+    return " ".join([Path(argv[0]).name] + argv[1:2]) if argv else ""
+
+
+def _Describe(query: dict[str, Any]) -> tuple[str, int | None, list[str]]:
+    """
+    >>> _Describe({"method": "torrent-get", "arguments": {"fields": ["id"], "ids": [1, 2]}})
+    ('torrent-get', 2, ['id'])
+    """
+    arguments = query.get("arguments", {})
+    ids = arguments.get("ids")
+    count = None if ids is None else (len(ids) if isinstance(ids, list) else 1)
+    return query.get("method", ""), count, arguments.get("fields", [])
+
+
+class RpcTracer:
+    def __init__(self, trace_path: Path | None = None):
+        self.trace_path = trace_path
+        self.calls: list[RpcCall] = []
+        self.lock = threading.Lock()
+
+    def Record(self, query: bytes | str, response_bytes: int, seconds: float) -> None:
+        method, ids, fields = _Describe(json.loads(query))
+        call = RpcCall(
+            method,
+            ids,
+            fields,
+            len(query),
+            response_bytes,
+            seconds,
+            _Caller(3),
+            _Command(),
+            os.getpid(),
+            time.time(),
+        )
+        with self.lock:
+            self.calls.append(call)
+            if self.trace_path:
+                # One write per line, so lines from many processes don't interleave
+                with self.trace_path.open("a") as fp:
+                    fp.write(json.dumps(asdict(call)) + "\n")
+
+    def PrintSummary(self, fp: IO[str] = sys.stderr) -> None:
+        PrintSummary(self.calls, fp)
+
+
+def PrintSummary(calls: Iterable[RpcCall], fp: IO[str] = sys.stderr) -> None:
+    """Table of calls by caller and method, most time first."""
+    by_key: dict[tuple[str, str], list[RpcCall]] = {}
+    for c in calls:
+        by_key.setdefault((c.caller, c.method), []).append(c)
+    rows = sorted(by_key.items(), key=lambda kv: sum(c.seconds for c in kv[1]), reverse=True)
+
+    print(
+        f"{'caller':48} {'method':22} {'calls':>6} {'total s':>8} {'max s':>7}"
+        f" {'sent MB':>8} {'recv MB':>8} {'max recv MB':>11}",
+        file=fp,
+    )
+    for (caller, method), cs in rows:
+        print(
+            f"{caller[-48:]:48} {method:22} {len(cs):6}"
+            f" {sum(c.seconds for c in cs):8.2f} {max(c.seconds for c in cs):7.2f}"
+            f" {sum(c.request_bytes for c in cs) / 1e6:8.2f}"
+            f" {sum(c.response_bytes for c in cs) / 1e6:8.2f}"
+            f" {max(c.response_bytes for c in cs) / 1e6:11.2f}",
+            file=fp,
+        )
+
+
+def ReadTrace(path: Path) -> list[RpcCall]:
+    with path.open() as fp:
+        return [RpcCall(**json.loads(line)) for line in fp if line.strip()]
+
+
+_TRACER: RpcTracer | None = None
+_TRACER_LOCK = threading.Lock()
+
+
+def Tracer() -> RpcTracer | None:
+    """The process's tracer, if TSMU_RPC_TRACE is set; it prints a summary at exit."""
+    global _TRACER
+    setting = os.getenv(TRACE_ENVIRONMENT_VARIABLE)
+    if not setting or setting == "0":
+        return None
+    with _TRACER_LOCK:
+        if _TRACER is None:
+            _TRACER = RpcTracer(None if setting == "1" else Path(setting))
+            atexit.register(_TRACER.PrintSummary)
+    return _TRACER
+
+
+def NewTransmissionClient(*args, **kwargs):
+    """transmissionrpc.Client(*args, **kwargs), traced if TSMU_RPC_TRACE is set."""
+    import transmissionrpc
+
+    tracer = Tracer()
+    if tracer is None:
+        return transmissionrpc.Client(*args, **kwargs)
+
+    class TracedClient(transmissionrpc.Client):
+        def _http_query(self, query, timeout=None):
+            started_at = time.monotonic()
+            result = super()._http_query(query, timeout)
+            tracer.Record(query, len(result), time.monotonic() - started_at)
+            return result
+
+    return TracedClient(*args, **kwargs)
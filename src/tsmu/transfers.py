@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Copy torrent data from other copies in parallel, e.g. to repair incomplete
+torrents with data found by `tsmu copy-from`.
+
+TransferScheduler runs rsync for many jobs at once, but at most
+per_device copies reading from the same source (a host, or a local device)
+and at most per_device writing to the same destination device, so a single
+disk isn't thrashed by many streams. The aggregate bandwidth cap is shared
+by the copies running: a copy gets an even share of what's left by those
+already running when it starts, so all copies together stay under it.
+
+Jobs are journaled to a JSON file as they progress. rsync runs with
+--partial, so a scheduler started again with the same journal picks up
+where it left off: interrupted copies are restarted (and resume),
+finished copies go straight on to verification.
+
+Sources can be local paths, so two local directories can stand in for a
+remote host:
+
+    scheduler = TransferScheduler(Path("/tmp/transfers.json"))
+    scheduler.Add(TransferJob("abcd…", "/tmp/remote/Some.Torrent/", "/tmp/local/Some.Torrent/"))
+    scheduler.Run()
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import subprocess
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Final
+
+import xdg.BaseDirectory
+
+from tsmu.metrics import DeviceLabel
+
+logger = logging.getLogger(__name__)
+
+PENDING: Final[str] = "pending"
+COPYING: Final[str] = "copying"
+COPIED: Final[str] = "copied"
+DONE: Final[str] = "done"
+FAILED: Final[str] = "failed"
+
+
+@dataclass
+class TransferJob:
+    job_id: str  # Usually the torrent's infohash
+    source: str  # host:/path/ or /local/path/
+    destination: str
+    state: str = PENDING
+    attempts: int = 0
+
+    @property
+    def source_key(self) -> str:
+        """What the copy reads from: the remote host, or the local device.
+
+        >>> TransferJob("x", "fa.local:/archive/a/", "/tmp/a/").source_key
+        'fa.local'
+        """
+        host, sep, path = self.source.partition(":")
+        if sep and "/" not in host:
+            return host
+        return DeviceLabel(_ExistingAncestor(Path(self.source)))
+
+    @property
+    def destination_key(self) -> str:
+        return DeviceLabel(_ExistingAncestor(Path(self.destination)))
+
+
+def _ExistingAncestor(path: Path) -> Path:
+    """path, or its closest ancestor that exists, e.g. for a destination yet to be created."""
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+def DefaultJournalPath() -> Path:
+    return Path(xdg.BaseDirectory.save_data_path("tsmu")) / "transfers.json"
+
+
+def RsyncCommand(job: TransferJob, bwlimit: int | None = None) -> list[str]:
+    """
+    Files are compared by checksum, not size and mtime, so a corrupt file that
+    looks up to date is still copied again.
+
+    >>> RsyncCommand(TransferJob("x", "fa.local:/a b/", "/c/"), bwlimit=5000)
+    ['rsync', '-a', '-c', '--partial', '--protect-args', '--bwlimit=5000', 'fa.local:/a b/', '/c/']
+    """
+    cmd = ["rsync", "-a", "-c", "--partial", "--protect-args"]
+    if bwlimit:
+        cmd.append(f"--bwlimit={bwlimit}")
+    return cmd + [job.source, job.destination]
+
+
+class TransferScheduler:
+    def __init__(
+        self,
+        journal_path: Path | None = None,
+        per_device: int = 2,
+        max_parallel: int = 4,
+        bwlimit: int | None = None,
+        max_attempts: int = 3,
+        before_copy: Callable[[TransferJob], None] = lambda job: None,
+        after_copy: Callable[[TransferJob], None] = lambda job: None,
+        command: Callable[[TransferJob, int | None], list[str]] = RsyncCommand,
+        poll_interval: float = 0.5,
+    ):
+        """bwlimit is in KiB/s, for all copies together.
+
+        before_copy is called before a job's first copy attempt, e.g. to stop
+        its torrent, and again for a job resumed from the journal. after_copy is called once a copy has finished, e.g. to
+        verify and start the torrent.
+        """
+        self.journal_path = journal_path if journal_path else DefaultJournalPath()
+        self.per_device = per_device
+        self.max_parallel = max_parallel
+        self.bwlimit = bwlimit
+        self.max_attempts = max_attempts
+        self.before_copy = before_copy
+        self.after_copy = after_copy
+        self.command = command
+        self.poll_interval = poll_interval
+        self.jobs: dict[str, TransferJob] = {}
+        # Jobs before_copy was called for, including ones resumed from the journal
+        self._prepared: set[str] = set()
+        self._Load()
+
+    def _Load(self) -> None:
+        if not self.journal_path.exists():
+            return
+        for j in json.loads(self.journal_path.read_text()):
+            job = TransferJob(**j)
+            # We were interrupted mid-copy; rsync --partial resumes it
+            if job.state == COPYING:
+                job.state = PENDING
+            self.jobs[job.job_id] = job
+
+    def _Save(self) -> None:
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.journal_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps([dataclasses.asdict(j) for j in self.jobs.values()]))
+        os.replace(tmp_path, self.journal_path)
+
+    def Add(self, job: TransferJob) -> None:
+        """Add a job, unless one for the same job_id is still unfinished."""
+        existing = self.jobs.get(job.job_id)
+        if existing and existing.state not in (DONE, FAILED):
+            return
+        self.jobs[job.job_id] = job
+        self._Save()
+
+    def _CopyBandwidth(self, in_use: int, starting: int) -> int | None:
+        """KiB/s for each of starting copies, sharing what running copies don't use.
+
+        >>> scheduler = TransferScheduler(Path("/nonexistent/j.json"), bwlimit=10000)
+        >>> scheduler._CopyBandwidth(in_use=0, starting=1)
+        10000
+        >>> scheduler._CopyBandwidth(in_use=5000, starting=2)
+        2500
+        """
+        return max(1, (self.bwlimit - in_use) // starting) if self.bwlimit else None
+
+    def _FinishCopy(self, job: TransferJob, returncode: int) -> None:
+        if returncode == 0:
+            job.state = COPIED
+        elif job.attempts >= self.max_attempts:
+            logger.error(f"Giving up on {job.job_id} after {job.attempts} attempts")
+            job.state = FAILED
+        else:
+            logger.warning(f"Copy of {job.job_id} failed w/ {returncode}, will retry")
+            job.state = PENDING
+        self._Save()
+
+    def _AfterCopy(self, job: TransferJob) -> None:
+        try:
+            self.after_copy(job)
+            job.state = DONE
+        except Exception:
+            logger.exception(f"Unable to finish {job.job_id}")
+            job.state = FAILED
+        self._Save()
+
+    def Run(self) -> dict[str, int]:
+        """Run every unfinished job; returns the count of jobs in each state."""
+        running: dict[str, tuple[subprocess.Popen, str, str]] = {}
+        bandwidths: dict[str, int] = {}
+        busy_sources: dict[str, int] = {}
+        busy_destinations: dict[str, int] = {}
+
+        try:
+            while True:
+                # Anything copied by an earlier run, or just now, goes on to verification
+                for job in self.jobs.values():
+                    if job.state == COPIED:
+                        self._AfterCopy(job)
+
+                starting = []
+                for job in self.jobs.values():
+                    if len(running) + len(starting) >= self.max_parallel:
+                        break
+                    if job.state != PENDING:
+                        continue
+                    source_key, destination_key = job.source_key, job.destination_key
+                    if (
+                        busy_sources.get(source_key, 0) >= self.per_device
+                        or busy_destinations.get(destination_key, 0) >= self.per_device
+                    ):
+                        continue
+                    starting.append((job, source_key, destination_key))
+                    busy_sources[source_key] = busy_sources.get(source_key, 0) + 1
+                    busy_destinations[destination_key] = (
+                        busy_destinations.get(destination_key, 0) + 1
+                    )
+
+                for i, (job, source_key, destination_key) in enumerate(starting):
+                    if job.job_id not in self._prepared:
+                        self.before_copy(job)
+                        self._prepared.add(job.job_id)
+                    job.attempts += 1
+                    job.state = COPYING
+                    self._Save()
+                    Path(job.destination).mkdir(parents=True, exist_ok=True)
+                    bwlimit = self._CopyBandwidth(sum(bandwidths.values()), len(starting) - i)
+                    cmd = self.command(job, bwlimit)
+                    logger.info(f"Copying {job.job_id}: {' '.join(cmd)}")
+                    running[job.job_id] = (subprocess.Popen(cmd), source_key, destination_key)
+                    if bwlimit:
+                        bandwidths[job.job_id] = bwlimit
+
+                if not running:
+                    break
+
+                time.sleep(self.poll_interval)
+                for job_id, (process, source_key, destination_key) in list(running.items()):
+                    returncode = process.poll()
+                    if returncode is None:
+                        continue
+                    del running[job_id]
+                    bandwidths.pop(job_id, None)
+                    busy_sources[source_key] -= 1
+                    busy_destinations[destination_key] -= 1
+                    self._FinishCopy(self.jobs[job_id], returncode)
+        finally:
+            # e.g. before_copy raised, or we were interrupted; rsync resumes these next time
+            for process, _, _ in running.values():
+                process.terminate()
+            for process, _, _ in running.values():
+                process.wait()
+
+        counts: dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.state] = counts.get(job.state, 0) + 1
+        return counts
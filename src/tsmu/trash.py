@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Deferred deletion: move things to a trash directory now, delete them later.
+
+Deleting a big tree on an HDD, or a file with many extents, keeps the disk
+busy long enough to stall whatever else reads from it, e.g. seeding. Trash()
+is a rename(2) into a trash directory on the same volume, so it's atomic and
+instant, and the caller carries on. `tsmu trashd` empties trash directories
+in the background, within an I/O budget:
+
+    trashed = Trash(Path("/archive/torrents/02-baked/dupes/Some.Torrent"))
+    TrashEmptier([trashed.parent], bytes_per_second=256 * 1024 * 1024).Run()
+
+Big files are truncated in steps before they're unlinked, so their extents
+are freed a bit at a time rather than all at once. Files with other hardlinks,
+e.g. from `tsmu-dupes --link`, are only unlinked.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import stat
+import time
+from pathlib import Path
+from typing import Final, Iterable
+
+import xdg.BaseDirectory
+
+from tsmu.config import LoadConfiguration
+
+logger = logging.getLogger(__name__)
+
+TRASH_DIRECTORY_NAME: Final[str] = ".tsmu-trash"
+
+# Bytes freed per truncate() of a big file
+TRUNCATE_STEP: Final[int] = 1024 * 1024 * 1024
+
+
+def _ConfiguredVolumes() -> list[Path]:
+    return [Path(v).absolute() for v in LoadConfiguration().get("trash", {}).get("volumes", [])]
+
+
+def _MountPoint(path: Path) -> Path:
+    while not os.path.ismount(path):
+        path = path.parent
+    return path
+
+
+def TrashDirectory(path: Path) -> Path:
+    """The trash directory for path, on its volume so Trash() can rename into it.
+
+    That's at the top of the [trash] volumes entry path is in, else at the top
+    of its mount. Rather than at the top of the root filesystem, it's in
+    $XDG_DATA_HOME/tsmu.
+    """
+    path = path.absolute()
+    device = os.stat(path, follow_symlinks=False).st_dev
+    volumes = [
+        v
+        for v in _ConfiguredVolumes()
+        if path.is_relative_to(v) and v.exists() and os.stat(v).st_dev == device
+    ]
+    if volumes:
+        return max(volumes, key=lambda v: len(v.parts)) / TRASH_DIRECTORY_NAME
+
+    mount = _MountPoint(path)
+    if mount != Path("/"):
+        return mount / TRASH_DIRECTORY_NAME
+    data_dir = Path(xdg.BaseDirectory.save_data_path("tsmu"))
+    if os.stat(data_dir).st_dev != device:
+        raise ValueError(f'No trash directory for "{path}": add its volume to [trash] volumes')
+    return data_dir / "trash"
+
+
+def Trash(path: Path) -> Path:
+    """Move path to its volume's trash directory, returning where it went."""
+    trash_dir = TrashDirectory(path)
+    trash_dir.mkdir(exist_ok=True)
+    # Unique, and emptied oldest first
+    trashed = trash_dir / f"{time.time_ns()}-{path.name}"
+    os.rename(path, trashed)
+    logger.info(f'Trashed "{path}" to "{trashed}"')
+    return trashed
+
+
+def ConfiguredTrashDirectories() -> list[Path]:
+    """Trash directories of the volumes in [trash] volumes in tsmu.toml."""
+    return [v / TRASH_DIRECTORY_NAME for v in _ConfiguredVolumes()]
+
+
+class TrashEmptier:
+    """Delete everything in trash directories, at most bytes_per_second and unlinks_per_second."""
+
+    def __init__(
+        self,
+        trash_dirs: Iterable[Path],
+        bytes_per_second: int = 256 * 1024 * 1024,
+        unlinks_per_second: int = 200,
+        poll_interval: float = 30.0,
+    ):
+        self.trash_dirs = list(trash_dirs)
+        self.bytes_per_second = bytes_per_second
+        self.unlinks_per_second = unlinks_per_second
+        self.poll_interval = poll_interval
+        self._budget_started_at = time.monotonic()
+        self._budget_spent = 0.0  # in seconds
+
+    def _Spend(self, freed_bytes: int, unlinks: int = 0) -> None:
+        """Account for some deletion, sleeping if we're ahead of the budget."""
+        self._budget_spent += freed_bytes / self.bytes_per_second
+        self._budget_spent += unlinks / self.unlinks_per_second
+        ahead = self._budget_started_at + self._budget_spent - time.monotonic()
+        if ahead > 0:
+            time.sleep(ahead)
+        elif ahead < -1.0:
+            # Don't bank budget while idle, or we'd delete in a burst after
+            self._budget_started_at, self._budget_spent = time.monotonic(), 0.0
+
+    def _DeleteFile(self, path: str) -> int:
+        st = os.stat(path, follow_symlinks=False)
+        if st.st_nlink > 1:
+            # Only a link goes; truncating would empty the file's other links too
+            os.unlink(path)
+            self._Spend(0, unlinks=1)
+            return 0
+        if st.st_size > TRUNCATE_STEP and stat.S_ISREG(st.st_mode):
+            remaining = st.st_size
+            while remaining > TRUNCATE_STEP:
+                remaining -= TRUNCATE_STEP
+                os.truncate(path, remaining)
+                self._Spend(TRUNCATE_STEP)
+            self._Spend(remaining)
+        else:
+            self._Spend(st.st_size)
+        os.unlink(path)
+        self._Spend(0, unlinks=1)
+        return st.st_size
+
+    def _Delete(self, path: Path) -> int:
+        """Delete path, bottom up. Returns the bytes freed."""
+        if not path.is_dir() or path.is_symlink():
+            return self._DeleteFile(str(path))
+        freed = 0
+        for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+            for filename in filenames:
+                freed += self._DeleteFile(os.path.join(dirpath, filename))
+            for dirname in dirnames:
+                subdirectory = os.path.join(dirpath, dirname)
+                # os.walk doesn't descend into symlinks to directories, but lists them here
+                if os.path.islink(subdirectory):
+                    os.unlink(subdirectory)
+                else:
+                    os.rmdir(subdirectory)
+                self._Spend(0, unlinks=1)
+        os.rmdir(path)
+        return freed
+
+    def EmptyOnce(self) -> int:
+        """Delete what's in the trash now. Returns the bytes freed."""
+        freed = 0
+        for trash_dir in self.trash_dirs:
+            if not trash_dir.is_dir():
+                continue
+            for trashed in sorted(trash_dir.iterdir()):
+                try:
+                    freed += self._Delete(trashed)
+                except OSError as e:
+                    logger.error(f'Unable to delete "{trashed}": {e}')
+                    continue
+                logger.info(f'Deleted "{trashed}"')
+        return freed
+
+    def Run(self) -> None:
+        while True:
+            self.EmptyOnce()
+            time.sleep(self.poll_interval)
@@ -1,12 +1,25 @@
 #!/usr/bin/env python3
 
+from __future__ import annotations
+
+import errno
+import fcntl
+import itertools
 import json
+import os
+import shutil
+import subprocess
 import time
+from collections import defaultdict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Callable, Generator
+from typing import TYPE_CHECKING, Any, Callable, Final, Generator, Iterable
 
 import click
-import transmissionrpc
+import more_itertools
+
+if TYPE_CHECKING:
+    import transmissionrpc
 
 TransmissionId = str
 
@@ -38,15 +51,22 @@ def ParseRanges(s: str) -> Generator[TransmissionId, None, None]:
             yield str(i)
 
 
-def ConnectToTransmission() -> transmissionrpc.Client:
-    """Connect to transmission using current user's settings."""
+def LoadTransmissionSettings() -> dict[str, Any]:
+    """transmission-daemon's settings.json for the current user."""
     settings_file_path = (
         Path(click.get_app_dir("transmission-daemon"), "settings.json").expanduser().resolve()
     )
-    settings = json.load(open(settings_file_path))
+    return json.load(open(settings_file_path))
+
+
+def ConnectToTransmission() -> transmissionrpc.Client:
+    """Connect to transmission using current user's settings."""
+    from tsmu.rpctrace import NewTransmissionClient
+
+    settings = LoadTransmissionSettings()
 
     host, port, username, password = "localhost", settings["rpc-port"], None, None
-    tc = transmissionrpc.Client(host, port, username, password)
+    tc = NewTransmissionClient(host, port, username, password)
     tc.timeout = 90  # Increase timeout to 90s
     return tc
 
@@ -73,6 +93,59 @@ def IsInWarmDirectory(download_dir: Path) -> bool:
     return False
 
 
+def Backoff(
+    initial: float = 0.5, maximum: float = 5.0, factor: float = 1.5
+) -> Generator[float, None, None]:
+    """Delays for polling: start quick, slow down for long-running operations.
+
+    >>> list(itertools.islice(Backoff(1, 4, 2), 5))
+    [1, 2, 4, 4, 4]
+    """
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+
+def WaitForTorrentMove(
+    tid: TransmissionId,
+    location: Path,
+    tc: transmissionrpc.Client | None = None,
+    timeout: float = 6 * 60 * 60,
+    statusCb: Callable[str, Any] = lambda x: x,
+) -> bool:
+    """Wait until transmission has finished moving a torrent's data to location.
+
+    transmission-daemon moves the data in its event thread, and only updates
+    downloadDir when it's done; RPC calls may time out while it's busy.
+    """
+    from transmissionrpc import TransmissionError
+
+    tc = ConnectToTransmission() if not tc else tc
+    deadline = time.monotonic() + timeout
+    for delay in Backoff():
+        try:
+            # transmissionrpc needs hashString to find the torrent by its infohash
+            torrent = tc.get_torrent(
+                tid,
+                arguments=["id", "hashString", "name", "downloadDir", "error", "errorString"],
+            )
+        except TransmissionError as e:
+            statusCb(f"transmission-daemon busy, waiting. {e}")
+        else:
+            if Path(torrent.downloadDir) == Path(location):
+                return True
+            if torrent.error == 3:
+                statusCb(f'Torrent name="{torrent.name}" had local error={torrent.errorString}')
+                return False
+            statusCb(f'Waiting for name="{torrent.name}" to move to "{str(location)}"')
+        if time.monotonic() + delay > deadline:
+            statusCb(f'Timed out waiting for {tid=} to move to "{str(location)}"')
+            return False
+        time.sleep(delay)
+    return False
+
+
 def VerifyTorrent(
     tid: TransmissionId,
     tc: transmissionrpc.Client | None = None,
@@ -85,13 +158,14 @@ def VerifyTorrent(
     # if we haven't started verifying, don't try to start again
     if torrent.status != "check pending":
         tc.verify_torrent(tid)
+    delays = Backoff()
     while True:
         torrent = tc.get_torrent(tid)
         if torrent.status in ("checking", "check pending"):
             statusCb(
                 f'Waiting to check, or check in progress. status="{torrent.status}" progress={torrent.recheckProgress}'
             )
-            time.sleep(2)
+            time.sleep(next(delays))
             continue
 
         if torrent.error == 3:
@@ -107,3 +181,310 @@ def VerifyTorrent(
             f'Failed to verify name="{torrent.name}" hash="{torrent.hashString}", progress at {torrent.percentDone}'
         )
         return False
+
+
+def MoveTorrentsData(
+    moves: Iterable[tuple[TransmissionId, Path]],
+    tc: transmissionrpc.Client | None = None,
+    batch_size: int = 50,
+    pause: float = 1.0,
+    move: bool = True,
+    statusCb: Callable[str, Any] = lambda x: x,
+) -> int:
+    """Move the data of many torrents, using as few torrent-set-location calls as possible.
+
+    Torrents are grouped by their target directory, and each group is sent in batches of at
+    most batch_size ids per call. We sleep pause seconds between calls so a burst of moves
+    doesn't monopolize transmission-daemon's RPC thread. If not move, only point transmission
+    at data that's already in the new location.
+
+    Returns the number of torrent-set-location calls made.
+    """
+    tc = ConnectToTransmission() if not tc else tc
+
+    ids_by_location: dict[Path, list[TransmissionId]] = defaultdict(list)
+    for tid, location in moves:
+        ids_by_location[Path(location)].append(tid)
+
+    call_count = 0
+    for location, tids in ids_by_location.items():
+        for batch in more_itertools.chunked(tids, batch_size):
+            if call_count > 0 and pause > 0:
+                time.sleep(pause)
+            if move:
+                statusCb(f'Moving count={len(batch)} to="{str(location)}"')
+                tc.move_torrent_data(batch, str(location))
+            else:
+                statusCb(f'Locating count={len(batch)} at="{str(location)}"')
+                tc.locate_torrent_data(batch, str(location))
+            call_count += 1
+
+    return call_count
+
+
+def RenameTorrentsData(
+    moves: Iterable[tuple[TransmissionId, Path]],
+    tc: transmissionrpc.Client | None = None,
+    batch_size: int = 50,
+    pause: float = 1.0,
+    statusCb: Callable[str, Any] = lambda x: x,
+) -> int:
+    """Move the data of torrents with rename(2), for moves within a device.
+
+    transmission-daemon moves data file by file in its event thread, which can stall RPC for
+    torrents with many files. Instead we stop the torrents, rename their top-level file or
+    directory ourselves, point transmission at the new location, and start whatever was
+    running again. There's no recheck, so this takes the same time whatever the torrent's size.
+
+    Torrents that can't be renamed, e.g. across devices, or that transmission doesn't have, are
+    left where they are. Returns the number of torrents moved.
+    """
+    tc = ConnectToTransmission() if not tc else tc
+
+    moves = list(moves)
+    # Infohashes are case insensitive; transmission's are lowercase
+    location_by_id = {str(tid).lower(): Path(location) for tid, location in moves}
+    arguments = ["id", "hashString", "name", "downloadDir", "status"]
+    torrents = tc.get_torrents([tid for tid, _ in moves], arguments=arguments)
+
+    located: list[tuple[transmissionrpc.Torrent, Path]] = []
+    for t in torrents:
+        location = location_by_id.get(str(t.id), location_by_id.get(t.hashString.lower()))
+        if location is not None:
+            located.append((t, location))
+    found = {str(t.id) for t, _ in located} | {t.hashString.lower() for t, _ in located}
+    for tid in location_by_id.keys() - found:
+        statusCb(f'Unable to find torrent id="{tid}", not moving it')
+
+    running = [t.id for t, _ in located if t.status != "stopped"]
+    if running:
+        tc.stop_torrent(running)
+
+    renamed: list[tuple[TransmissionId, Path]] = []
+    try:
+        for t, location in located:
+            source, destination = Path(t.downloadDir) / t.name, location / t.name
+            if source == destination:
+                continue
+            try:
+                if destination.exists():
+                    raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(destination))
+                location.mkdir(parents=True, exist_ok=True)
+                os.rename(source, destination)
+            except OSError as e:
+                statusCb(f'Unable to rename name="{t.name}", {e}')
+                continue
+            renamed.append((t.id, location))
+
+        MoveTorrentsData(
+            renamed, tc=tc, batch_size=batch_size, pause=pause, move=False, statusCb=statusCb
+        )
+    finally:
+        if running:
+            tc.start_torrent(running)
+    return len(renamed)
+
+
+# Files per xxhsum invocation, keeps us well under ARG_MAX
+XXHSUM_MAX_FILES_PER_CALL = 1000
+
+
+@dataclass
+class XxhFile:
+    """A checksum file written by ComputeXxhFile, and what went into it."""
+
+    path: Path
+    file_count: int
+    byte_count: int
+
+
+def ComputeXxhFile(download_dir: Path, name: str) -> XxhFile:
+    """Checksum download_dir/name into download_dir/name.auto.xxh with xxhsum.
+
+    Paths in the checksum file are relative to download_dir, as if produced
+    with `find name -type f -exec xxhsum {} \\;`, but xxhsum is run once per
+    batch of files rather than once per file.
+    """
+    target = download_dir / name
+    if target.is_dir():
+        files, byte_count = [], 0
+        for dirpath, _, filenames in os.walk(target):
+            relative_dirpath = Path(dirpath).relative_to(download_dir)
+            for fn in sorted(filenames):
+                files.append(str(relative_dirpath / fn))
+                byte_count += os.stat(os.path.join(dirpath, fn)).st_size
+    else:
+        files, byte_count = [name], target.stat().st_size
+
+    xxh_path = download_dir / (name + ".auto.xxh")
+    with xxh_path.open("w") as fp:
+        for batch in more_itertools.chunked(files, XXHSUM_MAX_FILES_PER_CALL):
+            cmd = ["ionice", "-c", "3", "xxhsum"] + batch
+            subprocess.run(cmd, cwd=download_dir, stdout=fp, check=True)
+    return XxhFile(xxh_path, len(files), byte_count)
+
+
+def ParseXxhLine(line: str) -> tuple[str, str] | None:
+    """(checksum, path) from a line of xxhsum output, None if it isn't one.
+
+    >>> ParseXxhLine("ef46db3751d8e999  name/file.mkv\\n")
+    ('ef46db3751d8e999', 'name/file.mkv')
+    >>> ParseXxhLine("name/file.mkv: OK")
+    """
+    checksum, sep, path = line.rstrip("\n").partition("  ")
+    if not sep or not checksum or any(c not in "0123456789abcdef" for c in checksum):
+        return None
+    return checksum, path
+
+
+def ReadXxhFile(xxh_path: Path) -> dict[str, str]:
+    """path -> checksum, for every file in a checksum file."""
+    checksums = {}
+    with xxh_path.open() as fp:
+        for line in fp:
+            if parsed := ParseXxhLine(line):
+                checksums[parsed[1]] = parsed[0]
+    return checksums
+
+
+# xxhsum -H flag for a checksum of this many hex digits
+XXHSUM_ALGORITHM_FLAGS: Final[dict[int, str]] = {8: "-H0", 16: "-H1", 32: "-H2"}
+
+
+def HashFiles(cwd: Path, paths: Iterable[str], checksum_length: int = 16) -> dict[str, str]:
+    """Checksum paths, relative to cwd, with xxhsum; path -> checksum."""
+    checksums = {}
+    for batch in more_itertools.chunked(paths, XXHSUM_MAX_FILES_PER_CALL):
+        cmd = ["ionice", "-c", "3", "xxhsum", XXHSUM_ALGORITHM_FLAGS[checksum_length]] + batch
+        cp = subprocess.run(cmd, cwd=cwd, capture_output=True, universal_newlines=True)
+        for line in cp.stdout.splitlines():
+            if parsed := ParseXxhLine(line):
+                checksums[parsed[1]] = parsed[0]
+    return checksums
+
+
+# ioctl to share a file's extents (reflink) on btrfs, xfs et al.; see ioctl_ficlone(2)
+FICLONE: Final[int] = 0x40049409
+
+
+def ReflinkFile(src: Path, dst: Path) -> None:
+    """Make dst a reflink of src, sharing its extents. Raises OSError if unsupported."""
+    with src.open("rb") as src_fp, dst.open("wb") as dst_fp:
+        try:
+            fcntl.ioctl(dst_fp.fileno(), FICLONE, src_fp.fileno())
+        except OSError:
+            dst.unlink()
+            raise
+
+
+def CopyFileData(src: Path, dst: Path) -> str:
+    """Copy src to dst as cheaply as the filesystem allows.
+
+    Tries a reflink, which copies nothing; then copy_file_range, which copies
+    in the kernel (or server-side on NFS) without going through userspace;
+    then a plain copy. Returns which one worked.
+    """
+    with src.open("rb") as src_fp, dst.open("wb") as dst_fp:
+        try:
+            fcntl.ioctl(dst_fp.fileno(), FICLONE, src_fp.fileno())
+            method = "reflink"
+        except OSError:
+            try:
+                remaining = os.fstat(src_fp.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(src_fp.fileno(), dst_fp.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                method = "copy_file_range"
+            except OSError:
+                # e.g. EXDEV across filesystems on kernels before 5.3
+                src_fp.seek(0)
+                dst_fp.seek(0)
+                dst_fp.truncate()
+                shutil.copyfileobj(src_fp, dst_fp, 1024 * 1024)
+                method = "copy"
+    shutil.copystat(src, dst)
+    return method
+
+
+# Read/write size for verified copies; large, as these are mostly big media files
+COPY_BUFFER_SIZE: Final[int] = 8 * 1024 * 1024
+
+
+class ChecksumMismatchError(Exception):
+    """Data didn't match its checksum file."""
+
+
+def CopyFileVerified(src: Path, dst: Path, checksum: str) -> int:
+    """Copy src to dst, checksumming the data as it's read. Returns the bytes copied.
+
+    The data is piped to xxhsum as it's copied, so it's only read once. Raises
+    ChecksumMismatchError if it doesn't match checksum.
+    """
+    cmd = ["xxhsum", XXHSUM_ALGORITHM_FLAGS[len(checksum)], "-"]
+    xxhsum = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    buffer = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buffer)
+    copied = 0
+    try:
+        with src.open("rb") as src_fp, dst.open("wb") as dst_fp:
+            while n := src_fp.readinto(buffer):
+                dst_fp.write(view[:n])
+                xxhsum.stdin.write(view[:n])
+                copied += n
+            dst_fp.flush()
+            os.fsync(dst_fp.fileno())
+    finally:
+        stdout, _ = xxhsum.communicate()
+    actual = stdout.split()[0].decode() if stdout else ""
+    if actual != checksum:
+        raise ChecksumMismatchError(f"{src} has checksum {actual}, expected {checksum}")
+    shutil.copystat(src, dst)
+    return copied
+
+
+def CopyTreeVerified(download_dir: Path, name: str, dest_dir: Path, xxh_path: Path) -> int:
+    """Copy download_dir/name to dest_dir/name, verifying against xxh_path, e.g. name.auto.xxh.
+
+    Every file must be in the checksum file, so nothing is left behind unverified. On any
+    failure what was copied is removed, and the exception re-raised; an existing dest_dir/name
+    is never touched. Returns the bytes copied.
+    """
+    expected = ReadXxhFile(xxh_path)
+    source, dest = download_dir / name, dest_dir / name
+    if source.is_dir():
+        files, directories = [], []
+        for dirpath, dirnames, filenames in os.walk(source):
+            relative_dirpath = Path(dirpath).relative_to(download_dir)
+            directories += [relative_dirpath / dn for dn in dirnames]
+            files += [str(relative_dirpath / fn) for fn in filenames]
+    else:
+        files, directories = [name], []
+
+    unchecked = [f for f in files if f not in expected]
+    if unchecked:
+        raise ChecksumMismatchError(
+            f"{len(unchecked)} files not in {xxh_path}, e.g. {unchecked[0]}"
+        )
+
+    if os.path.lexists(dest):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(dest))
+    copied, created = 0, False
+    try:
+        if source.is_dir():
+            dest.mkdir(parents=True)
+        created = True
+        for d in directories:
+            (dest_dir / d).mkdir(parents=True, exist_ok=True)
+        for f in sorted(files):
+            copied += CopyFileVerified(download_dir / f, dest_dir / f, expected[f])
+        if source.is_dir():
+            shutil.copystat(source, dest)
+    except BaseException:
+        if created and dest.is_dir():
+            shutil.rmtree(dest)
+        elif created:
+            dest.unlink(missing_ok=True)
+        raise
+    return copied
@@ -1,49 +1,144 @@
 #!/usr/bin/env python3
 
 import datetime
+import logging
 import os
-import subprocess
+import shutil
+import threading
+import time
 from pathlib import Path
 
 import dramatiq
-import xdg.BaseDirectory
 from dramatiq.broker import Broker
-from dramatiq.brokers.redis import RedisBroker
+from dramatiq.middleware import Middleware
 
+import tsmu.broker
+import tsmu.metrics
+from tsmu.config import LoadConfiguration as LoadTsmuConfiguration
+from tsmu.metrics import METRICS, DeviceLabel
+from tsmu.trash import Trash
 from tsmu.util import (
     CheckIfDownloadDirIsCorrect,
+    ChecksumMismatchError,
+    ComputeXxhFile,
     ConnectToTransmission,
+    CopyTreeVerified,
     IsInWarmDirectory,
+    MoveTorrentsData,
+    RenameTorrentsData,
     TransmissionId,
     VerifyTorrent,
+    WaitForTorrentMove,
 )
 
-try:
-    import tomllib
-except ModuleNotFoundError:
-    import tomli as tomllib
-
-# REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
-REDIS_PASSWORD = None
+METRICS_CONFIG: dict = {}
+# [move] mode: "rename" to rename(2) data ourselves, "transmission" to have transmission move it
+MOVE_MODE: str = "rename"
 
 
 def LoadConfiguration() -> None:
-    global REDIS_PASSWORD
-    config_path = Path(xdg.BaseDirectory.load_first_config("tsmu")) / "tsmu.toml"
-    with config_path.open("rb") as fp:
-        parsed_toml = tomllib.load(fp)
-
-    REDIS_PASSWORD = parsed_toml["redis"]["password"]
+    global METRICS_CONFIG, MOVE_MODE
+    config = LoadTsmuConfiguration()
+    METRICS_CONFIG = config.get("metrics", {})
+    MOVE_MODE = config.get("move", {}).get("mode", MOVE_MODE)
 
 
 LoadConfiguration()
 
+logger = logging.getLogger(__name__)
+
+
+def _RunMetricsExposition() -> int:
+    """dramatiq fork serving metrics from all worker processes."""
+    tsmu.metrics.RunExposition(
+        Path(METRICS_CONFIG.get("directory", tsmu.metrics.DefaultMetricsDirectory())),
+        port=METRICS_CONFIG.get("port"),
+        textfile=Path(METRICS_CONFIG["textfile"]) if "textfile" in METRICS_CONFIG else None,
+        interval=METRICS_CONFIG.get("interval", tsmu.metrics.DEFAULT_INTERVAL),
+    )
+    return 0
+
+
+class MetricsMiddleware(Middleware):
+    """Record per-actor latency, failures, throughput by device and queue depth.
+
+    Each worker process periodically snapshots its metrics into a shared
+    directory; see tsmu.metrics for how they are exposed.
+    """
+
+    def __init__(self, directory: Path, interval: float = tsmu.metrics.DEFAULT_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.started_at: dict[str, float] = {}
+        self.stop_event = threading.Event()
+
+    @property
+    def forks(self):
+        return [_RunMetricsExposition]
+
+    def _RecordQueueDepths(self, broker: Broker) -> None:
+        client = getattr(broker, "client", None)
+        if client is None:
+            return
+        queue_names = sorted(broker.get_declared_queues() | broker.get_declared_delay_queues())
+        pipe = client.pipeline()
+        for queue_name in queue_names:
+            pipe.llen(broker._add_queue_prefix(queue_name))
+        for queue_name, depth in zip(queue_names, pipe.execute()):
+            METRICS.Set("tsmu_queue_messages", {"queue": queue_name}, depth)
+
+    def _SnapshotLoop(self, broker: Broker) -> None:
+        while not self.stop_event.wait(self.interval):
+            try:
+                self._RecordQueueDepths(broker)
+            except Exception:
+                logger.warning("Unable to get queue depths", exc_info=True)
+            tsmu.metrics.WriteSnapshot(self.directory)
+
+    def after_worker_boot(self, broker, worker):
+        threading.Thread(target=self._SnapshotLoop, args=(broker,), daemon=True).start()
+
+    def before_worker_shutdown(self, broker, worker):
+        self.stop_event.set()
+        tsmu.metrics.RemoveSnapshot(self.directory)
+
+    def before_process_message(self, broker, message):
+        self.started_at[message.message_id] = time.monotonic()
+
+    def after_skip_message(self, broker, message):
+        self.started_at.pop(message.message_id, None)
+
+    def after_process_message(self, broker, message, *, result=None, exception=None):
+        started_at = self.started_at.pop(message.message_id, None)
+        actor = message.actor_name
+        if started_at is not None:
+            METRICS.Observe(
+                "tsmu_actor_duration_seconds", {"actor": actor}, time.monotonic() - started_at
+            )
+        METRICS.Observe(
+            "tsmu_message_latency_seconds",
+            {"actor": actor},
+            max(0.0, time.time() - message.message_timestamp / 1000),
+        )
+        # All our actors take (tid, name, download_dir, …)
+        device = DeviceLabel(message.args[2]) if len(message.args) >= 3 else "unknown"
+        METRICS.Inc("tsmu_messages_total", {"actor": actor, "device": device})
+        if exception is not None:
+            METRICS.Inc(
+                "tsmu_failures_total", {"actor": actor, "exception": type(exception).__name__}
+            )
+
 
 def SetupBroker() -> Broker:
-    # See https://github.com/redis/redis-py/blob/f704281cf4c1f735c06a13946fcea42fa939e3a5/redis/client.py#L855 for connecton string syntax
-    rb = RedisBroker(url=f"unix://default:{REDIS_PASSWORD}@/run/redis/redis-server.sock?db=0")
-    dramatiq.set_broker(rb)
-    return rb
+    broker = tsmu.broker.SetupBroker()
+    if METRICS_CONFIG:
+        broker.add_middleware(
+            MetricsMiddleware(
+                Path(METRICS_CONFIG.get("directory", tsmu.metrics.DefaultMetricsDirectory())),
+                interval=METRICS_CONFIG.get("interval", tsmu.metrics.DEFAULT_INTERVAL),
+            )
+        )
+    return broker
 
 
 SetupBroker()
@@ -86,17 +181,16 @@ def ComputeXxh(tid: TransmissionId, name: str, download_dir: Path) -> None:
             TransmissionVerify.send(tid, name, download_dir)
         return
 
-    if target_dir.is_dir():
-        xxh_cmd = f"(cd {str(download_dir)} && ionice -c 3 find '{name}' -type f -exec xxhsum {{}} \; > {str(download_dir)}/'{name}'.auto.xxh)"
-    else:
-        xxh_cmd = f"(cd {str(download_dir)} && ionice -c 3 xxhsum '{name}' > '{name}'.auto.xxh)"
-
-    subprocess.run(xxh_cmd, shell=True, check=True)
+    xxh_file = ComputeXxhFile(download_dir, name)
+    device = DeviceLabel(download_dir)
+    METRICS.Inc("tsmu_hashed_files_total", {"device": device}, xxh_file.file_count)
+    METRICS.Inc("tsmu_hashed_bytes_total", {"device": device}, xxh_file.byte_count)
 
     MoveTorrent.send(tid, name, str(download_dir))
 
 
-@dramatiq.actor
+# Not retried: a retry after a cross-device copy would copy it again, into dupes
+@dramatiq.actor(time_limit=(6 * 60 * 60 * 100), max_retries=0)
 def MoveTorrent(tid: TransmissionId, name: str, download_dir: Path, is_dupe: bool = False) -> None:
     download_dir = Path(download_dir) if not isinstance(download_dir, Path) else download_dir
     should_move = not IsInWarmDirectory(download_dir)
@@ -140,12 +234,52 @@ def MoveTorrent(tid: TransmissionId, name: str, download_dir: Path, is_dupe: boo
             MoveTorrent.logger.info(
                 f'Moving {name=} from="{str(download_dir)}" to="{str(moved_download_path)}"'
             )
-            tc.move_torrent_data(tid, str(moved_download_path))
+            if MOVE_MODE == "rename":
+                if not RenameTorrentsData([(tid, moved_download_path)], tc=tc):
+                    MoveTorrent.logger.error(f"Unable to rename {name=}, leaving it in place")
+                    return
+            else:
+                # Just the one torrent; it's `tsmu move` that batches many into a call
+                MoveTorrentsData([(tid, moved_download_path)], tc=tc)
             try:
                 target_xxh.rename(moved_target_xxh)
             except FileNotFoundError:
                 MoveTorrent.logger.error("Unable to to move %s, ignoring", str(target_xxh))
         else:
-            MoveTorrent.logger.error("Move across devices not supported")
+            # transmission would copy, unverified, and leave a half-copy if interrupted
+            MoveTorrent.logger.info(
+                f'Copying {name=} across devices from="{str(download_dir)}"'
+                f' to="{str(moved_download_path)}"'
+            )
+            if not target_xxh.exists():
+                ComputeXxhFile(download_dir, name)
+            try:
+                copied = CopyTreeVerified(download_dir, name, moved_download_path, target_xxh)
+            except ChecksumMismatchError as e:
+                MoveTorrent.logger.error(f"Not moving {name=}, {e}. Reverifying")
+                TransmissionVerify.send(tid, name, str(download_dir))
+                return
+            except FileExistsError as e:
+                MoveTorrent.logger.error(f"Not moving {name=}, {e}")
+                return
+
+            try:
+                shutil.copy2(target_xxh, moved_target_xxh)
+                MoveTorrentsData([(tid, moved_download_path)], tc=tc, move=False)
+                if not WaitForTorrentMove(tid, moved_download_path, tc=tc, timeout=5 * 60):
+                    MoveTorrent.logger.error(f"{name=} wasn't relocated, leaving source in place")
+                    return
+
+                source = download_dir / name
+                Trash(source)
+                target_xxh.unlink()
+            except Exception:
+                MoveTorrent.logger.exception(
+                    f"Copied {name=} to {str(moved_download_path)}, but unable to finish moving it"
+                )
+                return
+            METRICS.Inc(
+                "tsmu_copied_bytes_total", {"device": DeviceLabel(moved_download_path)}, copied
+            )
 
     return
@@ -0,0 +1,34 @@
+import asyncio
+from pathlib import Path
+
+from tsmu.aiorpc import ReAddTorrents
+
+
+class FakeClient:
+    """Records how many torrents are removed but not yet re-added."""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.removed: set[str] = set()
+        self.most_removed = 0
+
+    async def TorrentRemove(self, torrent_hash):
+        self.removed.add(torrent_hash)
+        self.most_removed = max(self.most_removed, len(self.removed))
+        await asyncio.sleep(0.001)
+
+    async def TorrentAdd(self, torrent_file, download_dir=None):
+        await asyncio.sleep(0.001)
+        self.removed.discard(Path(torrent_file).stem)
+        return {}
+
+
+def test_readd_removes_at_most_concurrency_torrents_at_once():
+    client = FakeClient(concurrency=2)
+    readds = [(f"{i:040x}", Path(f"{i:040x}.torrent"), Path("/archive")) for i in range(20)]
+
+    results = asyncio.run(ReAddTorrents(client, readds))
+
+    assert results == [None] * 20
+    assert client.removed == set()
+    assert client.most_removed == 2
@@ -0,0 +1,39 @@
+import dramatiq
+
+from tsmu.broker import QUEUE_NAMES, FlushAll, SetupBroker
+
+
+def test_flush_all_removes_queued_messages(monkeypatch):
+    monkeypatch.setenv("TSMU_BROKER", "stub")
+    broker = SetupBroker()
+    broker.declare_queue("default")
+    broker.enqueue(dramatiq.Message("default", "ComputeXxh", ("hash", "Some.Torrent"), {}, {}))
+    broker.enqueue(
+        dramatiq.Message("default", "MoveTorrent", ("hash", "Some.Torrent"), {}, {}), delay=60000
+    )
+
+    FlushAll(broker)
+
+    assert broker.queues["default"].qsize() == 0
+    assert broker.queues["default.DQ"].qsize() == 0
+
+
+def test_flush_all_declares_queues_without_the_actors(monkeypatch):
+    monkeypatch.setenv("TSMU_BROKER", "stub")
+    # Like tsmu-workers flush, which doesn't import tsmu.workers
+    broker = SetupBroker()
+    assert broker.get_declared_queues() == set()
+
+    FlushAll(broker)
+
+    assert broker.get_declared_queues() == {"default", "default.DQ"}
+
+
+def test_queue_names_has_every_actors_queue(monkeypatch):
+    monkeypatch.setenv("TSMU_BROKER", "stub")
+    import tsmu.workers  # NOQA
+
+    broker = dramatiq.get_broker()
+    assert {broker.get_actor(a).queue_name for a in broker.get_declared_actors()} <= set(
+        QUEUE_NAMES
+    )
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from tsmu.cli.dupes import (
+    LINKED,
+    MISMATCH,
+    VERIFIED,
+    CheckCandidate,
+    DeviceLimits,
+    DupesJournal,
+    FindCandidate,
+    LinkIdenticalFiles,
+)
+from tsmu.util import HashFiles
+
+pytestmark = pytest.mark.skipif(not shutil.which("xxhsum"), reason="needs xxhsum")
+
+
+def MakeCopy(parent: Path, name: str, files: dict[str, bytes]) -> None:
+    for filename, data in files.items():
+        path = parent / name / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    checksums = HashFiles(parent, [f"{name}/{f}" for f in files])
+    (parent / f"{name}.auto.xxh").write_text("".join(f"{c}  {p}\n" for p, c in checksums.items()))
+
+
+def Check(root: Path, name: str) -> str:
+    entry = next(de for de in os.scandir(root / "dupes") if de.name == name)
+    candidate = FindCandidate(entry, root, link=False)
+    return CheckCandidate(candidate, False, DeviceLimits(2))
+
+
+def test_corrupt_file_is_repaired_from_other_copy(tmp_path):
+    files = {"movie.mkv": b"movie" * 1000, "movie.nfo": b"nfo"}
+    MakeCopy(tmp_path, "Some.Movie", files)
+    MakeCopy(tmp_path / "dupes", "Some.Movie", files)
+    (tmp_path / "dupes" / "Some.Movie" / "movie.mkv").write_bytes(b"corrupt")
+    own_xxh = (tmp_path / "dupes" / "Some.Movie.auto.xxh").read_text()
+
+    assert Check(tmp_path, "Some.Movie") == VERIFIED
+    assert (tmp_path / "dupes" / "Some.Movie" / "movie.mkv").read_bytes() == files["movie.mkv"]
+    assert (tmp_path / "dupes" / "Some.Movie.auto.xxh").read_text() == own_xxh
+
+
+def test_legitimately_different_file_isnt_overwritten(tmp_path):
+    MakeCopy(tmp_path, "Some.Movie", {"movie.mkv": b"movie", "movie.nfo": b"v1"})
+    MakeCopy(tmp_path / "dupes", "Some.Movie", {"movie.mkv": b"movie", "movie.nfo": b"v2"})
+    own_xxh = (tmp_path / "dupes" / "Some.Movie.auto.xxh").read_text()
+
+    assert Check(tmp_path, "Some.Movie") == MISMATCH
+    assert (tmp_path / "dupes" / "Some.Movie" / "movie.nfo").read_bytes() == b"v2"
+    assert (tmp_path / "dupes" / "Some.Movie.auto.xxh").read_text() == own_xxh
+
+
+def test_journal_states_are_per_mode(tmp_path):
+    journal_path = tmp_path / "dupes.json"
+    dupe = tmp_path / "dupes" / "Some.Movie"
+    DupesJournal(journal_path, "link").Set([dupe], LINKED)
+
+    assert DupesJournal(journal_path, "link").Get(dupe) == LINKED
+    assert DupesJournal(journal_path, "remove").Get(dupe) is None
+
+
+def test_journal_from_older_version_is_started_over(tmp_path):
+    journal_path = tmp_path / "dupes.json"
+    dupe = tmp_path / "dupes" / "Some.Movie"
+    journal_path.write_text(f'{{"{dupe}": "{MISMATCH}"}}')
+
+    assert DupesJournal(journal_path, "remove").Get(dupe) is None
+
+
+def test_identical_files_are_linked(tmp_path):
+    files = {"movie.mkv": b"movie" * 1000, "movie.nfo": b"nfo"}
+    MakeCopy(tmp_path, "Some.Movie", files)
+    MakeCopy(tmp_path / "dupes", "Some.Movie", files)
+
+    assert LinkIdenticalFiles(tmp_path / "dupes" / "Some.Movie", tmp_path / "Some.Movie") == (
+        2,
+        sum(len(data) for data in files.values()),
+    )
+    assert (tmp_path / "dupes" / "Some.Movie" / "movie.mkv").read_bytes() == files["movie.mkv"]
+
+
+@pytest.mark.skipif(
+    not os.path.isdir("/dev/shm")
+    or os.stat("/dev/shm").st_dev == os.stat(tempfile.gettempdir()).st_dev,
+    reason="needs /dev/shm on another filesystem",
+)
+def test_copies_on_different_filesystems_arent_linked(tmp_path, caplog):
+    files = {"movie.mkv": b"movie", "movie.nfo": b"nfo"}
+    MakeCopy(tmp_path, "Some.Movie", files)
+    with tempfile.TemporaryDirectory(dir="/dev/shm") as other:
+        MakeCopy(Path(other), "Some.Movie", files)
+
+        assert LinkIdenticalFiles(Path(other) / "Some.Movie", tmp_path / "Some.Movie") == (0, 0)
+    assert "different filesystems" in caplog.text
@@ -0,0 +1,95 @@
+import socket
+import threading
+
+import dramatiq
+import pytest
+import redis
+from dramatiq.brokers.redis import RedisBroker
+
+from tsmu.broker import EnqueueMany
+from tsmu.cli import transmission_done_client, transmission_done_dramatiq
+from tsmu.hookd import HookDaemon
+
+
+def Event(torrent_hash: str) -> dict[str, str]:
+    return {
+        "TR_TORRENT_HASH": torrent_hash,
+        "TR_TORRENT_NAME": "Some.Torrent",
+        "TR_TORRENT_DIR": "/archive/torrents/01-hot",
+    }
+
+
+def test_send_coalesces_a_batch(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("TSMU_BROKER", "stub")
+    from tsmu.workers import TransmissionVerify
+
+    broker = TransmissionVerify.broker
+    broker.flush_all()
+    daemon = HookDaemon(tmp_path / "hookd.sock")
+    batch = [daemon.Submit(Event(h)) for h in ("a" * 40, "b" * 40, "a" * 40)]
+    daemon.pending.put(None)
+
+    daemon._Send(daemon._NextBatch())
+
+    assert all(pe.ok and pe.done.is_set() for pe in batch)
+    assert broker.queues["default"].qsize() == 2
+
+
+def test_enqueue_many_is_one_round_trip(monkeypatch):
+    # Otherwise asked of Redis, once
+    monkeypatch.setattr(RedisBroker, "_max_unpack_size_val", 7999, raising=False)
+    client = redis.Redis(unix_socket_path="/nonexistent/redis.sock")
+    broker = RedisBroker(client=client, middleware=[])
+    executed, pipeline = [], client.pipeline
+
+    def Pipeline(**kwargs):
+        pipe = pipeline(**kwargs)
+        pipe.execute = lambda: executed.append(list(pipe.command_stack))
+        return pipe
+
+    client.pipeline = Pipeline
+    dispatch = broker.scripts["dispatch"]
+    messages = [dramatiq.Message("default", "TransmissionVerify", (h,), {}, {}) for h in "ab"]
+
+    EnqueueMany(broker, messages)
+
+    assert [len(commands) for commands in executed] == [2]
+    assert broker.scripts["dispatch"] is dispatch
+
+
+@pytest.fixture
+def fallbacks(monkeypatch):
+    for name, value in Event("a" * 40).items():
+        monkeypatch.setenv(name, value)
+    calls = []
+    monkeypatch.setattr(transmission_done_dramatiq, "main", lambda: calls.append(True))
+    return calls
+
+
+def test_client_falls_back_if_daemon_isnt_running(tmp_path, monkeypatch, fallbacks):
+    monkeypatch.setenv("TSMU_HOOKD_SOCKET", str(tmp_path / "hookd.sock"))
+    transmission_done_client.main()
+    assert fallbacks == [True]
+
+
+def test_client_doesnt_fall_back_if_daemon_fails(tmp_path, monkeypatch, fallbacks):
+    socket_path = tmp_path / "hookd.sock"
+    monkeypatch.setenv("TSMU_HOOKD_SOCKET", str(socket_path))
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    server.listen()
+
+    def Reply():
+        connection, _ = server.accept()
+        with connection:
+            connection.makefile("rb").readline()
+            connection.sendall(b"error\n")
+
+    thread = threading.Thread(target=Reply)
+    thread.start()
+    with pytest.raises(SystemExit):
+        transmission_done_client.main()
+    thread.join()
+    server.close()
+    assert fallbacks == []
@@ -0,0 +1,18 @@
+import json
+
+from tsmu.metastore import TorrentStore
+
+
+def test_checkout_by_name_keeps_torrents_of_the_same_name(tmp_path):
+    store = TorrentStore(tmp_path / "store")
+    for infohash in ("ab" * 20, "cd" * 20):
+        torrent_file = tmp_path / f"{infohash}.torrent"
+        torrent_file.write_bytes(infohash.encode())
+        store.Put({"hash": infohash, "name": "Some.Torrent", "torrentFile": str(torrent_file)})
+
+    paths = store.Checkout(["ab" * 20, "cd" * 20], tmp_path / "out", use_name=True)
+
+    assert [p.name for p in paths] == ["Some.Torrent.torrent", "Some.Torrent.cdcdcdcd.torrent"]
+    index = json.loads((tmp_path / "out" / "index.json").read_text())
+    for ti in index:
+        assert (tmp_path / "out" / ti["torrentFile"]).read_bytes() == ti["hash"].encode()
@@ -0,0 +1,25 @@
+import json
+
+from tsmu.metrics import Metrics, ReadSnapshots, RemoveSnapshot, WriteSnapshot
+
+
+def test_snapshots_of_exited_processes_are_ignored(tmp_path):
+    metrics = Metrics()
+    metrics.Inc("tsmu_messages_total", {"actor": "MoveTorrent", "device": "8:1"})
+    WriteSnapshot(tmp_path, metrics)
+    # Left by a worker that was killed, or whose pid has since been reused
+    stale = {"time": 0, "counters": [], "gauges": [], "histograms": []}
+    (tmp_path / "1.json").write_text(json.dumps(dict(stale, pid=1, pid_started="-1")))
+    (tmp_path / "999999999.json").write_text(json.dumps(dict(stale, pid=999999999)))
+
+    snapshots = ReadSnapshots(tmp_path)
+
+    assert len(snapshots) == 1 and snapshots[0]["counters"]
+    assert [p.name for p in tmp_path.iterdir()] == [f"{snapshots[0]['pid']}.json"]
+
+
+def test_snapshot_is_removed_on_exit(tmp_path):
+    WriteSnapshot(tmp_path, Metrics())
+    RemoveSnapshot(tmp_path)
+    assert ReadSnapshots(tmp_path) == []
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,110 @@
+import shutil
+import subprocess
+
+import pytest
+from click.testing import CliRunner
+
+import tsmu.transfers
+from tsmu.bench.fakedaemon import FakeTorrent, FakeTransmissionDaemon
+from tsmu.cli.tsmu import cli
+from tsmu.fileindex import FilenameIndex
+from tsmu.transfers import COPYING, TransferJob, TransferScheduler
+
+
+@pytest.mark.skipif(not shutil.which("rsync"), reason="needs rsync")
+def test_copy_from_local_directory(tmp_path, monkeypatch):
+    remote, local = tmp_path / "remote", tmp_path / "local"
+    (remote / "Some.Torrent" / "sub").mkdir(parents=True)
+    (remote / "Some.Torrent" / "a.mkv").write_bytes(b"a" * 1000)
+    (remote / "Some.Torrent" / "sub" / "b.nfo").write_bytes(b"b")
+    (local / "Some.Torrent").mkdir(parents=True)
+    (local / "Some.Torrent" / "a.mkv").write_bytes(b"a" * 10)
+    index_path = tmp_path / "remote.index"
+    with index_path.open("wb") as fp:
+        FilenameIndex.Build([remote]).Write(fp)
+
+    daemon = FakeTransmissionDaemon(
+        [FakeTorrent(1, "ab" * 20, "Some.Torrent", str(local), 1001, percentDone=0.01)]
+    )
+    daemon.Start()
+    try:
+        daemon.WriteSettings(tmp_path / "config")
+        monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+        monkeypatch.setattr(tsmu.transfers, "DefaultJournalPath", lambda: tmp_path / "j.json")
+        result = CliRunner().invoke(
+            cli,
+            ["copy-from", "--location", str(remote), "--index", f"={index_path}", "--no-dry-run"],
+        )
+    finally:
+        daemon.Stop()
+
+    assert result.exit_code == 0, result.output
+    assert "done=1" in result.output
+    assert (local / "Some.Torrent" / "a.mkv").read_bytes() == b"a" * 1000
+    assert (local / "Some.Torrent" / "sub" / "b.nfo").read_bytes() == b"b"
+    assert daemon.state.calls["torrent-stop"] == 1
+    assert daemon.state.calls["torrent-verify"] == 1
+    assert daemon.state.calls["torrent-start"] == 1
+
+
+def test_copies_are_stopped_when_before_copy_fails(tmp_path, monkeypatch):
+    started = []
+
+    class RecordingPopen(subprocess.Popen):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            started.append(self)
+
+    def BeforeCopy(job: TransferJob) -> None:
+        if job.job_id == "b":
+            raise RuntimeError("can't stop torrent")
+
+    monkeypatch.setattr(subprocess, "Popen", RecordingPopen)
+    scheduler = TransferScheduler(
+        tmp_path / "j.json",
+        before_copy=BeforeCopy,
+        command=lambda job, bwlimit: ["sleep", "60"],
+    )
+    scheduler.Add(TransferJob("a", str(tmp_path / "remote" / "a"), str(tmp_path / "local" / "a")))
+    scheduler.Add(TransferJob("b", str(tmp_path / "remote" / "b"), str(tmp_path / "local" / "b")))
+
+    with pytest.raises(RuntimeError):
+        scheduler.Run()
+    assert len(started) == 1
+    assert started[0].returncode is not None
+
+
+def test_bandwidth_is_shared_by_running_copies(tmp_path):
+    bwlimits = []
+
+    def Command(job: TransferJob, bwlimit: int | None) -> list[str]:
+        bwlimits.append(bwlimit)
+        return ["true"]
+
+    scheduler = TransferScheduler(
+        tmp_path / "j.json", max_parallel=4, bwlimit=10000, command=Command, poll_interval=0
+    )
+    scheduler.Add(TransferJob("a", str(tmp_path / "remote" / "a"), str(tmp_path / "local" / "a")))
+    assert scheduler.Run() == {"done": 1}
+    scheduler.Add(TransferJob("b", str(tmp_path / "remote" / "b"), str(tmp_path / "local" / "b")))
+    scheduler.Add(TransferJob("c", str(tmp_path / "remote" / "c"), str(tmp_path / "local" / "c")))
+    assert scheduler.Run() == {"done": 3}
+    assert bwlimits == [10000, 5000, 5000]
+
+
+def test_before_copy_runs_for_resumed_jobs(tmp_path):
+    scheduler = TransferScheduler(tmp_path / "j.json")
+    scheduler.Add(TransferJob("a", str(tmp_path / "remote" / "a"), str(tmp_path / "local" / "a")))
+    # As if we were interrupted mid-copy
+    scheduler.jobs["a"].state, scheduler.jobs["a"].attempts = COPYING, 1
+    scheduler._Save()
+    prepared = []
+
+    scheduler = TransferScheduler(
+        tmp_path / "j.json",
+        before_copy=lambda job: prepared.append(job.job_id),
+        command=lambda job, bwlimit: ["true"],
+        poll_interval=0,
+    )
+    assert scheduler.Run() == {"done": 1}
+    assert prepared == ["a"]
@@ -0,0 +1,37 @@
+import importlib
+import json
+import shutil
+import sys
+
+import pytest
+
+from tsmu.bench.fakedaemon import FakeTorrent, FakeTransmissionDaemon
+
+
+@pytest.mark.skipif(not shutil.which("xxhsum"), reason="needs xxhsum")
+def test_hook_moves_verifies_and_hashes(tmp_path, monkeypatch):
+    hot = tmp_path / "torrents" / "01-hot"
+    (hot / "Some.Torrent").mkdir(parents=True)
+    (hot / "Some.Torrent" / "a.mkv").write_bytes(b"a" * 1000)
+    daemon = FakeTransmissionDaemon([FakeTorrent(1, "ab" * 20, "Some.Torrent", str(hot), 1000)])
+    daemon.Start()
+    daemon.WriteSettings(tmp_path / "config")
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("TR_TORRENT_DIR", str(hot))
+    monkeypatch.setenv("TR_TORRENT_HASH", "ab" * 20)
+    monkeypatch.setenv("TR_TORRENT_ID", "1")
+    monkeypatch.setenv("TR_TORRENT_NAME", "Some.Torrent")
+    # The environment is read when the hook is imported
+    monkeypatch.delitem(sys.modules, "tsmu.cli.transmission_done_standalone", raising=False)
+    try:
+        importlib.import_module("tsmu.cli.transmission_done_standalone").main()
+    finally:
+        daemon.Stop()
+
+    log = json.loads((tmp_path / "transmission-done.log.json").read_text())
+    assert "error" not in log
+    baked = hot.parent / "02-baked"
+    assert daemon.state.torrents[1].downloadDir == str(next(baked.iterdir()))
+    assert (next(baked.iterdir()) / "Some.Torrent" / "a.mkv").exists()
+    assert log["xxh"] == str(next(baked.iterdir()) / "Some.Torrent.auto.xxh")
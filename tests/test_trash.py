@@ -0,0 +1,63 @@
+import os
+from pathlib import Path
+
+import pytest
+
+import tsmu.trash
+from tsmu.trash import TRASH_DIRECTORY_NAME, Trash, TrashDirectory, TrashEmptier
+
+
+@pytest.fixture
+def volume(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        tsmu.trash, "LoadConfiguration", lambda: {"trash": {"volumes": [str(tmp_path)]}}
+    )
+    monkeypatch.setattr(tsmu.trash, "TRUNCATE_STEP", 1024 * 1024)
+    return tmp_path
+
+
+def test_trash_directory_is_the_configured_volume(volume):
+    path = volume / "torrents" / "Some.Torrent"
+    path.mkdir(parents=True)
+    assert TrashDirectory(path) == volume / TRASH_DIRECTORY_NAME
+
+
+def test_trash_directory_isnt_the_filesystem_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(tsmu.trash, "LoadConfiguration", lambda: {})
+    monkeypatch.setattr(tsmu.trash, "_MountPoint", lambda path: Path("/"))
+    data_dir = tmp_path / "data" / "tsmu"
+    data_dir.mkdir(parents=True)
+    monkeypatch.setattr(tsmu.trash.xdg.BaseDirectory, "save_data_path", lambda name: str(data_dir))
+    assert TrashDirectory(tmp_path) == data_dir / "trash"
+
+
+def test_hardlinked_files_keep_their_data(volume):
+    torrent = volume / "dupes" / "Some.Torrent"
+    torrent.mkdir(parents=True)
+    data = os.urandom(3 * 1024 * 1024)
+    (torrent / "big.mkv").write_bytes(data)
+    (torrent / "small.nfo").write_bytes(b"nfo")
+    library = volume / "library"
+    library.mkdir()
+    os.link(torrent / "big.mkv", library / "big.mkv")
+    os.link(torrent / "small.nfo", library / "small.nfo")
+
+    trashed = Trash(torrent)
+    freed = TrashEmptier([trashed.parent], bytes_per_second=1024**3).EmptyOnce()
+
+    assert not trashed.exists()
+    assert freed == 0
+    assert (library / "big.mkv").read_bytes() == data
+    assert (library / "small.nfo").read_bytes() == b"nfo"
+
+
+def test_big_files_are_deleted(volume):
+    torrent = volume / "Some.Torrent"
+    torrent.mkdir()
+    (torrent / "big.mkv").write_bytes(os.urandom(3 * 1024 * 1024 + 1))
+
+    trashed = Trash(torrent)
+    freed = TrashEmptier([trashed.parent], bytes_per_second=1024**3).EmptyOnce()
+
+    assert not trashed.exists()
+    assert freed == 3 * 1024 * 1024 + 1
@@ -0,0 +1,124 @@
+import shutil
+from pathlib import Path
+
+import pytest
+import transmissionrpc
+
+import tsmu.util
+from tsmu.bench.fakedaemon import STATUS_SEED, FakeTorrent, FakeTransmissionDaemon
+from tsmu.util import (
+    ChecksumMismatchError,
+    CopyTreeVerified,
+    HashFiles,
+    RenameTorrentsData,
+    WaitForTorrentMove,
+)
+
+needs_xxhsum = pytest.mark.skipif(not shutil.which("xxhsum"), reason="needs xxhsum")
+
+
+@pytest.fixture
+def torrent(tmp_path) -> tuple[Path, Path]:
+    """A torrent in tmp_path/hot, and its checksum file."""
+    download_dir = tmp_path / "hot"
+    files = {"Some.Torrent/a.mkv": b"a" * 100_000, "Some.Torrent/sub/b.nfo": b"b"}
+    for path, data in files.items():
+        (download_dir / path).parent.mkdir(parents=True, exist_ok=True)
+        (download_dir / path).write_bytes(data)
+    checksums = HashFiles(download_dir, files)
+    xxh_path = download_dir / "Some.Torrent.auto.xxh"
+    xxh_path.write_text("".join(f"{c}  {p}\n" for p, c in checksums.items()))
+    return download_dir, xxh_path
+
+
+@needs_xxhsum
+def test_copy(tmp_path, torrent):
+    download_dir, xxh_path = torrent
+    copied = CopyTreeVerified(download_dir, "Some.Torrent", tmp_path / "baked", xxh_path)
+    assert copied == 100_001
+    assert (tmp_path / "baked" / "Some.Torrent" / "sub" / "b.nfo").read_bytes() == b"b"
+
+
+@needs_xxhsum
+def test_mismatch_removes_the_copy(tmp_path, torrent):
+    download_dir, xxh_path = torrent
+    (download_dir / "Some.Torrent" / "sub" / "b.nfo").write_bytes(b"corrupt")
+    with pytest.raises(ChecksumMismatchError):
+        CopyTreeVerified(download_dir, "Some.Torrent", tmp_path / "baked", xxh_path)
+    assert not (tmp_path / "baked" / "Some.Torrent").exists()
+    assert (download_dir / "Some.Torrent" / "a.mkv").exists()
+
+
+@needs_xxhsum
+def test_interrupted_copy_removes_the_copy(tmp_path, torrent, monkeypatch):
+    download_dir, xxh_path = torrent
+    copy_file_verified = tsmu.util.CopyFileVerified
+    calls = []
+
+    def InterruptedCopy(src, dst, checksum):
+        calls.append(src)
+        if len(calls) > 1:
+            raise KeyboardInterrupt
+        return copy_file_verified(src, dst, checksum)
+
+    monkeypatch.setattr(tsmu.util, "CopyFileVerified", InterruptedCopy)
+    with pytest.raises(KeyboardInterrupt):
+        CopyTreeVerified(download_dir, "Some.Torrent", tmp_path / "baked", xxh_path)
+    assert not (tmp_path / "baked" / "Some.Torrent").exists()
+
+
+@needs_xxhsum
+def test_existing_destination_is_left_alone(tmp_path, torrent):
+    download_dir, xxh_path = torrent
+    existing = tmp_path / "baked" / "Some.Torrent" / "a.mkv"
+    existing.parent.mkdir(parents=True)
+    existing.write_bytes(b"existing")
+    with pytest.raises(FileExistsError):
+        CopyTreeVerified(download_dir, "Some.Torrent", tmp_path / "baked", xxh_path)
+    assert existing.read_bytes() == b"existing"
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    """A fake transmission-daemon seeding Some.Torrent from tmp_path/01-hot."""
+    hot = tmp_path / "01-hot"
+    (hot / "Some.Torrent").mkdir(parents=True)
+    (hot / "Some.Torrent" / "a.mkv").write_bytes(b"a")
+    daemon = FakeTransmissionDaemon([FakeTorrent(1, "ab" * 20, "Some.Torrent", str(hot), 1)])
+    daemon.Start()
+    yield daemon
+    daemon.Stop()
+
+
+def test_wait_for_move_by_infohash(tmp_path, daemon):
+    tc = transmissionrpc.Client("localhost", daemon.port)
+    tc.move_torrent_data("ab" * 20, str(tmp_path / "02-baked"))
+
+    assert WaitForTorrentMove("ab" * 20, tmp_path / "02-baked", tc=tc, timeout=5)
+
+
+def test_rename(tmp_path, daemon):
+    baked, messages = tmp_path / "02-baked", []
+    tc = transmissionrpc.Client("localhost", daemon.port)
+    # Uppercase, as pasted from elsewhere, and a torrent transmission doesn't have
+    moves = [("AB" * 20, baked), ("ff" * 20, baked)]
+
+    assert RenameTorrentsData(moves, tc=tc, pause=0, statusCb=messages.append) == 1
+
+    assert (baked / "Some.Torrent" / "a.mkv").read_bytes() == b"a"
+    assert not (tmp_path / "01-hot" / "Some.Torrent").exists()
+    t = daemon.state.torrents[1]
+    assert (t.downloadDir, t.status) == (str(baked), STATUS_SEED)
+    assert daemon.state.calls["torrent-set-location"] == 1
+    assert any("ff" * 20 in m for m in messages)
+
+
+def test_rename_restarts_torrents_on_failure(tmp_path, daemon, monkeypatch):
+    def FailingMoveTorrentsData(*args, **kwargs):
+        raise transmissionrpc.TransmissionError("Request failed.")
+
+    monkeypatch.setattr(tsmu.util, "MoveTorrentsData", FailingMoveTorrentsData)
+    tc = transmissionrpc.Client("localhost", daemon.port)
+    with pytest.raises(transmissionrpc.TransmissionError):
+        RenameTorrentsData([("1", tmp_path / "02-baked")], tc=tc, pause=0)
+    assert daemon.state.torrents[1].status == STATUS_SEED